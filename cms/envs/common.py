@@ -265,6 +265,19 @@ XBLOCK_SELECT_FUNCTION = prefer_xmodules
 ############################ Modulestore Configuration ################################
 MODULESTORE_BRANCH = 'draft-preferred'
 
+# Local on-disk cache of assets too large for the Django cache, served by
+# contentserver.middleware.StaticContentServer. None disables it; otherwise a
+# dict like {'DIRECTORY': '/var/cache/edx/assets', 'MAX_SIZE': <bytes>}
+STATIC_CONTENT_DISK_CACHE = None
+
+# Cache-Control headers sent with course assets, for locked assets (which only
+# enrolled users may see) and unlocked ones. Responses also carry an ETag, so
+# clients can revalidate cheaply once these expire.
+STATIC_CONTENT_CACHE_CONTROL = {
+    'locked': 'private, no-cache',
+    'unlocked': 'public, max-age=300',
+}
+
 ############################ DJANGO_BUILTINS ################################
 # Change DEBUG/TEMPLATE_DEBUG in your environment settings files, not here
 DEBUG = False
@@ -0,0 +1,312 @@
+"""
+A local on-disk cache of course assets, for assets too large to keep in the
+Django cache.
+
+Each version of an asset is stored in its own file, named after a hash of the
+asset's location and last_modified_at, so updated assets are never served
+stale and old versions are simply evicted. The least recently used files are
+evicted once the cache grows past its maximum size.
+
+An asset that isn't cached yet is streamed from the DB as usual, and copied
+to its file as it's streamed.
+
+Configure it with the STATIC_CONTENT_DISK_CACHE setting, e.g.
+
+    STATIC_CONTENT_DISK_CACHE = {
+        'DIRECTORY': '/var/cache/edx/assets',
+        'MAX_SIZE': 10 * 1024 ** 3,  # bytes
+    }
+"""
+import errno
+import hashlib
+import logging
+import os
+import time
+
+from django.conf import settings
+
+from xmodule.contentstore.content import StaticContentStream
+
+log = logging.getLogger(__name__)
+
+# Suffix of the files being written, which aren't served or evicted
+TEMP_FILE_SUFFIX = '.tmp'
+
+# How long, in seconds, a file being written can go unwritten to before it's
+# taken to have been abandoned
+ABANDONED_COPY_TIME = 10 * 60
+
+# How often, in seconds, to rescan the cache directory for files other
+# processes have written, even if this process hasn't filled it
+SCAN_INTERVAL = 60
+
+
+class CachedFileContent(StaticContentStream):
+    """
+    A StaticContentStream read from a file, which closes the file once its
+    data has been streamed, or the response streaming it is closed.
+    """
+    def stream_data(self):
+        try:
+            for chunk in super(CachedFileContent, self).stream_data():
+                yield chunk
+        finally:
+            self.close()
+
+    def stream_data_in_range(self, first_byte, last_byte):
+        try:
+            for chunk in super(CachedFileContent, self).stream_data_in_range(first_byte, last_byte):
+                yield chunk
+        finally:
+            self.close()
+
+
+class FillingContent(StaticContentStream):
+    """
+    A StaticContentStream that streams `content` from the DB and, as it
+    does, copies it to `temp_file`, the file `path` + TEMP_FILE_SUFFIX, which
+    becomes the asset's file `path` in the AssetDiskCache `disk_cache` once
+    it's complete.
+
+    Copying stops if only a range of the data is streamed, or if writing
+    the copy fails; the data is still streamed.
+    """
+    def __init__(self, disk_cache, path, temp_file, content):
+        super(FillingContent, self).__init__(
+            content.location, content.name, content.content_type, content._stream,  # pylint: disable=protected-access
+            last_modified_at=content.last_modified_at, thumbnail_location=content.thumbnail_location,
+            import_path=content.import_path, length=content.length, locked=content.locked,
+            content_digest=content.content_digest
+        )
+        self._disk_cache = disk_cache
+        self._path = path
+        self._temp_file = temp_file
+        self._temp_path = path + TEMP_FILE_SUFFIX
+
+    def stream_data(self):
+        try:
+            for chunk in super(FillingContent, self).stream_data():
+                if self._temp_file is not None:
+                    try:
+                        self._temp_file.write(chunk)
+                    except (IOError, OSError):
+                        log.exception(u"Could not cache %s on disk", unicode(self.location))
+                        self._abandon_copy()
+                yield chunk
+            self._finish_copy()
+        finally:
+            self.close()
+
+    def stream_data_in_range(self, first_byte, last_byte):
+        self._abandon_copy()
+        try:
+            for chunk in super(FillingContent, self).stream_data_in_range(first_byte, last_byte):
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        self._abandon_copy()
+        super(FillingContent, self).close()
+
+    def _finish_copy(self):
+        """
+        Move the complete copy into place.
+        """
+        if self._temp_file is None:
+            return
+        temp_file, self._temp_file = self._temp_file, None
+        try:
+            temp_file.close()
+            os.rename(self._temp_path, self._path)
+        except (IOError, OSError):
+            log.exception(u"Could not cache %s on disk", unicode(self.location))
+            _remove(self._temp_path)
+            return
+        self._disk_cache._add(self._path, self.length)  # pylint: disable=protected-access
+
+    def _abandon_copy(self):
+        """
+        Stop copying, and remove the partial copy.
+        """
+        if self._temp_file is None:
+            return
+        temp_file, self._temp_file = self._temp_file, None
+        try:
+            temp_file.close()
+        except (IOError, OSError):
+            pass
+        _remove(self._temp_path)
+
+
+def _remove(path):
+    """
+    Remove the file `path`, if it's still there.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class AssetDiskCache(object):
+    """
+    A size-bounded directory of asset files.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        # the size of the cache as of the last scan, plus what's been written since
+        self._size = None
+        self._scanned_at = None
+
+    def _path(self, content):
+        """
+        Return the path of the file for this version of `content`.
+        """
+        key = u'{}:{}'.format(content.location, content.last_modified_at.isoformat())
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, content):
+        """
+        Return a CachedFileContent of `content` read from its file, or None
+        if this version of it isn't cached.
+        """
+        path = self._path(content)
+        try:
+            stream = open(path, 'rb')
+        except IOError:
+            return None
+        # mark the file as recently used, for eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return self._open(content, stream)
+
+    def fill(self, content):
+        """
+        Return a StaticContentStream of `content`, a StaticContentStream from
+        the DB, that copies it to its file as it's streamed, so the first
+        request for an asset doesn't wait for the copy.
+
+        Only one process copies each version of an asset at a time; while it
+        does, `content` is returned as it is, and streamed from the DB.
+        """
+        if content.length > self.max_size:
+            return content
+
+        path = self._path(content)
+        temp_path = path + TEMP_FILE_SUFFIX
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            temp_file = self._create_temp_file(temp_path)
+        except (IOError, OSError):
+            log.exception(u"Could not cache %s on disk", unicode(content.location))
+            return content
+        if temp_file is None:
+            return content
+
+        return FillingContent(self, path, temp_file, content)
+
+    @staticmethod
+    def _create_temp_file(temp_path):
+        """
+        Create and open the file `temp_path` that an asset is copied to, and
+        return it, or None if another process is already copying the asset.
+        """
+        try:
+            handle = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0644)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+            # Copies are written to as they're streamed, so one that hasn't
+            # been written to for a while was abandoned by a process that died.
+            try:
+                if time.time() - os.path.getmtime(temp_path) < ABANDONED_COPY_TIME:
+                    return None
+                os.remove(temp_path)
+            except OSError:
+                # finished or removed by another process in the meantime
+                return None
+            return AssetDiskCache._create_temp_file(temp_path)
+        return os.fdopen(handle, 'wb')
+
+    def _add(self, path, size):
+        """
+        Record that the file `path`, of `size` bytes, has been added to the
+        cache, evicting other files if need be.
+        """
+        if self._size is not None:
+            self._size += size
+        if (
+            self._size is None or self._size > self.max_size or
+            time.time() - self._scanned_at > SCAN_INTERVAL
+        ):
+            self._evict(keep=path)
+
+    @staticmethod
+    def _open(content, stream):
+        """
+        Return a CachedFileContent of `content` that reads from `stream`.
+        """
+        return CachedFileContent(
+            content.location, content.name, content.content_type, stream,
+            last_modified_at=content.last_modified_at, thumbnail_location=content.thumbnail_location,
+            import_path=content.import_path, length=content.length, locked=content.locked,
+            content_digest=content.content_digest
+        )
+
+    def _evict(self, keep):
+        """
+        Remove the least recently used files, other than the file `keep`,
+        until the cache is no larger than max_size.
+
+        This scans the whole directory, so it's only done when the cache may
+        have outgrown max_size.
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(TEMP_FILE_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+        for __, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+
+        self._size = total_size
+        self._scanned_at = time.time()
+
+
+_ASSET_DISK_CACHE = None
+
+
+def get_asset_disk_cache():
+    """
+    Return the AssetDiskCache configured by STATIC_CONTENT_DISK_CACHE, or
+    None if there isn't one.
+    """
+    global _ASSET_DISK_CACHE  # pylint: disable=global-statement
+    config = getattr(settings, 'STATIC_CONTENT_DISK_CACHE', None)
+    if not config:
+        return None
+    if _ASSET_DISK_CACHE is None or _ASSET_DISK_CACHE.directory != config['DIRECTORY']:
+        _ASSET_DISK_CACHE = AssetDiskCache(config['DIRECTORY'], config['MAX_SIZE'])
+    return _ASSET_DISK_CACHE
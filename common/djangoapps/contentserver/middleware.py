@@ -2,19 +2,23 @@
 Middleware to serve assets.
 """
 
+import calendar
 import logging
 
+from django.conf import settings
 from django.http import (
     HttpResponse, HttpResponseNotModified, HttpResponseForbidden
 )
+from django.utils.http import http_date, parse_http_date_safe
 from student.models import CourseEnrollment
 
 from xmodule.assetstore.assetmgr import AssetManager
-from xmodule.contentstore.content import StaticContent, XASSET_LOCATION_TAG
+from xmodule.contentstore.content import StaticContent, StaticContentStream, XASSET_LOCATION_TAG
 from xmodule.modulestore import InvalidLocationError
 from opaque_keys import InvalidKeyError
 from opaque_keys.edx.locator import AssetLocator
 from cache_toolbox.core import get_cached_content, set_cached_content
+from contentserver.disk_cache import get_asset_disk_cache
 from xmodule.exceptions import NotFoundError
 
 # TODO: Soon as we have a reasonable way to serialize/deserialize AssetKeys, we need
@@ -56,6 +60,9 @@ class StaticContentServer(object):
                         # since we've queried as a stream, let's read in the stream into memory to set in cache
                         content = content.copy_to_in_mem()
                         set_cached_content(content)
+                    else:
+                        # larger assets are read from a local copy, if there's a disk cache
+                        content = self._get_disk_cached_content(content)
             else:
                 # NOP here, but we may wish to add a "cache-hit" counter in the future
                 pass
@@ -63,27 +70,26 @@ class StaticContentServer(object):
             # Check that user has access to content
             if getattr(content, "locked", False):
                 if not hasattr(request, "user") or not request.user.is_authenticated():
+                    self._close(content)
                     return HttpResponseForbidden('Unauthorized')
                 if not request.user.is_staff:
                     if getattr(loc, 'deprecated', False) and not CourseEnrollment.is_enrolled_by_partial(
                         request.user, loc.course_key
                     ):
+                        self._close(content)
                         return HttpResponseForbidden('Unauthorized')
                     if not getattr(loc, 'deprecated', False) and not CourseEnrollment.is_enrolled(
                         request.user, loc.course_key
                     ):
+                        self._close(content)
                         return HttpResponseForbidden('Unauthorized')
 
-            # convert over the DB persistent last modified timestamp to a HTTP compatible
-            # timestamp, so we can simply compare the strings
-            last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
-
-            # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            # see if the client has cached this content, if so then just return a 304 (Not Modified)
+            if self._is_not_modified(request, content):
+                self._close(content)
+                response = HttpResponseNotModified()
+                self._set_cache_headers(response, content)
+                return response
 
             # *** File streaming within a byte range ***
             # If a Range is provided, parse Range attribute of the request
@@ -93,10 +99,6 @@ class StaticContentServer(object):
             # http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.35
             response = None
             if request.META.get('HTTP_RANGE'):
-                # Data from cache (StaticContent) has no easy byte management, so we use the DB instead (StaticContentStream)
-                if type(content) == StaticContent:
-                    content = AssetManager.find(loc, as_stream=True)
-
                 header_value = request.META['HTTP_RANGE']
                 try:
                     unit, ranges = parse_range_header(header_value, content.length)
@@ -131,6 +133,7 @@ class StaticContentServer(object):
                             log.warning(
                                 u"Cannot satisfy ranges in Range header: %s for content: %s", header_value, unicode(loc)
                             )
+                            self._close(content)
                             return HttpResponse(status=416)  # Requested Range Not Satisfiable
 
             # If Range header is absent or syntactically invalid return a full content response.
@@ -141,10 +144,85 @@ class StaticContentServer(object):
             # "Accept-Ranges: bytes" tells the user that only "bytes" ranges are allowed
             response['Accept-Ranges'] = 'bytes'
             response['Content-Type'] = content.content_type
-            response['Last-Modified'] = last_modified_at_str
+            self._set_cache_headers(response, content)
 
             return response
 
+    @staticmethod
+    def _close(content):
+        """
+        Close the stream of `content`, if it has one, when no response is going to read it.
+        """
+        if isinstance(content, StaticContentStream):
+            content.close()
+
+    @staticmethod
+    def _etag(content):
+        """
+        Return the ETag of `content`, or None if its contentstore didn't record a hash of it.
+        """
+        content_digest = getattr(content, 'content_digest', None)
+        if content_digest is None:
+            return None
+        return '"{}"'.format(content_digest)
+
+    def _is_not_modified(self, request, content):
+        """
+        Return whether the client's copy of `content` is current, according to the
+        If-None-Match or (in its absence) If-Modified-Since header of the request.
+        """
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            etag = self._etag(content)
+            if etag is None:
+                return False
+            if_none_match = [
+                # weak comparison, as this is only used for GETs
+                tag.strip().replace('W/', '', 1)
+                for tag in request.META['HTTP_IF_NONE_MATCH'].split(',')
+            ]
+            return etag in if_none_match or '*' in if_none_match
+
+        if 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
+            # we used to send Last-Modified in this format, and clients send back what they were sent
+            if if_modified_since == content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT"):
+                return True
+            if_modified_since = parse_http_date_safe(if_modified_since)
+            if if_modified_since is not None:
+                return calendar.timegm(content.last_modified_at.utctimetuple()) <= if_modified_since
+
+        return False
+
+    def _set_cache_headers(self, response, content):
+        """
+        Set the Last-Modified, ETag and Cache-Control headers for `content` on `response`.
+        """
+        response['Last-Modified'] = http_date(calendar.timegm(content.last_modified_at.utctimetuple()))
+        etag = self._etag(content)
+        if etag is not None:
+            response['ETag'] = etag
+        cache_control = settings.STATIC_CONTENT_CACHE_CONTROL.get(
+            'locked' if getattr(content, 'locked', False) else 'unlocked'
+        )
+        if cache_control:
+            response['Cache-Control'] = cache_control
+
+    def _get_disk_cached_content(self, content):
+        """
+        Return `content`, a StaticContentStream from the DB, read from the local disk cache
+        instead if there is one, or copied there as it's streamed if it isn't cached yet.
+        """
+        disk_cache = get_asset_disk_cache()
+        if disk_cache is None or content.length > disk_cache.max_size:
+            return content
+
+        cached_content = disk_cache.get(content)
+        if cached_content is None:
+            # serve it from the DB, copying it to the disk cache on the way
+            return disk_cache.fill(content)
+        content.close()
+        return cached_content
+
 
 def parse_range_header(header_value, content_length):
     """
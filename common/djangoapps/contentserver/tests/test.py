@@ -4,9 +4,17 @@ Tests for StaticContentServer
 import copy
 import ddt
 import logging
+import os
+import shutil
+import tempfile
+import time
 import unittest
+from datetime import datetime
+from StringIO import StringIO
 from uuid import uuid4
 
+from mock import patch
+
 from django.conf import settings
 from django.test.client import Client
 from django.test.utils import override_settings
@@ -17,7 +25,9 @@ from opaque_keys.edx.locations import SlashSeparatedCourseKey
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from xmodule.modulestore.xml_importer import import_from_xml
 
+from contentserver.disk_cache import AssetDiskCache, ABANDONED_COPY_TIME
 from contentserver.middleware import parse_range_header
+from xmodule.contentstore.content import StaticContentStream
 from student.models import CourseEnrollment
 
 log = logging.getLogger(__name__)
@@ -109,6 +119,50 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200)
 
+    def test_etag(self):
+        """
+        Test that assets are sent with an ETag, and that sending it back gets a 304 Not Modified.
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp['ETag']
+        self.assertEqual(etag, '"{}"'.format(self.contentstore.get_attr(self.unlocked_asset, 'md5')))
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"stale", W/{}'.format(etag))
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_if_modified_since(self):
+        """
+        Test that If-Modified-Since is compared by date, not by string.
+        """
+        resp = self.client.get(self.url_unlocked)
+        last_modified = resp['Last-Modified']
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 1970 00:00:00 GMT')
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(STATIC_CONTENT_CACHE_CONTROL={'locked': 'private, no-cache', 'unlocked': 'public, max-age=60'})
+    def test_cache_control(self):
+        """
+        Test that locked and unlocked assets get their own Cache-Control policies.
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertEqual(resp['Cache-Control'], 'public, max-age=60')
+
+        self.client.login(username=self.staff_usr, password=self.staff_pwd)
+        resp = self.client.get(self.url_locked)
+        self.assertEqual(resp['Cache-Control'], 'private, no-cache')
+
     def test_range_request_full_file(self):
         """
         Test that a range request from byte 0 to last,
@@ -235,3 +289,119 @@ class ParseRangeHeaderTestCase(unittest.TestCase):
         self.assertRaisesRegexp(
             exception_class, exception_message_regex, parse_range_header, header_value, self.content_length
         )
+
+
+class AssetDiskCacheTestCase(unittest.TestCase):
+    """
+    Tests for AssetDiskCache.
+    """
+    def setUp(self):
+        super(AssetDiskCacheTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.course_key = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+
+    def make_content(self, name, data, last_modified_at=datetime(2014, 1, 1)):
+        """
+        Return a StaticContentStream of `data`.
+        """
+        return StaticContentStream(
+            self.course_key.make_asset_key('asset', name), name, 'application/pdf', StringIO(data),
+            last_modified_at=last_modified_at, length=len(data)
+        )
+
+    def cache_content(self, disk_cache, name, data):
+        """
+        Stream a StaticContentStream of `data` through `disk_cache`, so that it's cached.
+        """
+        self.assertEqual(''.join(disk_cache.fill(self.make_content(name, data)).stream_data()), data)
+
+    def test_fill_and_get(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        self.assertIsNone(disk_cache.get(self.make_content('handout.pdf', 'abcdef')))
+
+        self.cache_content(disk_cache, 'handout.pdf', 'abcdef')
+
+        content = disk_cache.get(self.make_content('handout.pdf', ''))
+        self.assertEqual(''.join(content.stream_data_in_range(1, 3)), 'bcd')
+        self.assertEqual(content.length, 6)
+
+    def test_cached_once_streamed(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        data = disk_cache.fill(self.make_content('handout.pdf', 'abcdef')).stream_data()
+        next(data)
+        # The asset is streamed as it's copied, and only cached once the copy is complete
+        self.assertIsNone(disk_cache.get(self.make_content('handout.pdf', '')))
+        list(data)
+        self.assertIsNotNone(disk_cache.get(self.make_content('handout.pdf', '')))
+
+    def test_partly_streamed_not_cached(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        data = disk_cache.fill(self.make_content('handout.pdf', 'abcdef')).stream_data()
+        next(data)
+        # the response closes its content's iterator when it's done with it
+        data.close()
+        self.assertIsNone(disk_cache.get(self.make_content('handout.pdf', '')))
+        self.assertEqual(os.listdir(self.directory), [])
+
+        content = disk_cache.fill(self.make_content('handout.pdf', 'abcdef'))
+        self.assertEqual(''.join(content.stream_data_in_range(1, 3)), 'bcd')
+        self.assertIsNone(disk_cache.get(self.make_content('handout.pdf', '')))
+
+    def test_one_copy_at_a_time(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        first = disk_cache.fill(self.make_content('handout.pdf', 'abcdef'))
+        # While the asset is being copied, other requests for it just stream it
+        second_content = self.make_content('handout.pdf', 'abcdef')
+        self.assertIs(disk_cache.fill(second_content), second_content)
+
+        ''.join(first.stream_data())
+        self.assertIsNotNone(disk_cache.get(self.make_content('handout.pdf', '')))
+
+    def test_abandoned_copy_replaced(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        disk_cache.fill(self.make_content('handout.pdf', 'abcdef'))
+        with patch('contentserver.disk_cache.time.time', return_value=time.time() + ABANDONED_COPY_TIME + 1):
+            self.cache_content(disk_cache, 'handout.pdf', 'abcdef')
+        self.assertIsNotNone(disk_cache.get(self.make_content('handout.pdf', '')))
+
+    def test_new_version_not_cached(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        self.cache_content(disk_cache, 'handout.pdf', 'abcdef')
+        self.assertIsNone(disk_cache.get(self.make_content('handout.pdf', '', last_modified_at=datetime(2014, 1, 2))))
+
+    def test_eviction(self):
+        disk_cache = AssetDiskCache(self.directory, 10)
+        self.cache_content(disk_cache, 'first.pdf', 'abcdef')
+        self.cache_content(disk_cache, 'second.pdf', 'abcdef')
+        # The cache can't hold both assets, so the least recently used one is evicted
+        self.assertIsNone(disk_cache.get(self.make_content('first.pdf', '')))
+        self.assertIsNotNone(disk_cache.get(self.make_content('second.pdf', '')))
+
+    def test_file_closed_after_streaming(self):
+        disk_cache = AssetDiskCache(self.directory, 100)
+        self.cache_content(disk_cache, 'handout.pdf', 'abcdef')
+
+        content = disk_cache.get(self.make_content('handout.pdf', ''))
+        ''.join(content.stream_data())
+        self.assertTrue(content._stream.closed)  # pylint: disable=protected-access
+
+        content = disk_cache.get(self.make_content('handout.pdf', ''))
+        data = content.stream_data_in_range(0, 2)
+        next(data)
+        data.close()
+        self.assertTrue(content._stream.closed)  # pylint: disable=protected-access
+
+    def test_scans_only_when_full(self):
+        disk_cache = AssetDiskCache(self.directory, 10)
+        with patch('contentserver.disk_cache.os.listdir', wraps=os.listdir) as mock_listdir:
+            self.cache_content(disk_cache, 'first.pdf', 'abc')
+            self.cache_content(disk_cache, 'second.pdf', 'abc')
+            self.assertEqual(mock_listdir.call_count, 1)
+            self.cache_content(disk_cache, 'third.pdf', 'abcdef')
+            self.assertEqual(mock_listdir.call_count, 2)
+
+    def test_too_large(self):
+        disk_cache = AssetDiskCache(self.directory, 5)
+        content = self.make_content('handout.pdf', 'abcdef')
+        self.assertIs(disk_cache.fill(content), content)
@@ -1,5 +1,7 @@
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 from staticfiles.storage import staticfiles_storage
 from staticfiles import finders
@@ -11,6 +13,13 @@ from xmodule.contentstore.content import StaticContent
 
 log = logging.getLogger(__name__)
 
+# The most static urls of Mongo-backed courses to remember the resolved urls of
+STATIC_URL_CACHE_SIZE = 10000
+
+_url_replace_patterns = {}
+_resolved_static_urls = OrderedDict()
+_resolved_static_urls_lock = threading.Lock()
+
 
 def _url_replace_regex(prefix):
     """
@@ -28,6 +37,17 @@ def _url_replace_regex(prefix):
         """.format(prefix=prefix)
 
 
+def _url_replace_pattern(prefix):
+    """
+    Return the compiled _url_replace_regex for prefix, compiling it only the
+    first time it's needed.
+    """
+    pattern = _url_replace_patterns.get(prefix)
+    if pattern is None:
+        pattern = _url_replace_patterns[prefix] = re.compile(_url_replace_regex(prefix))
+    return pattern
+
+
 def try_staticfiles_lookup(path):
     """
     Try to lookup a path in staticfiles_storage.  If it fails, return
@@ -69,7 +89,7 @@ def replace_jump_to_id_urls(text, course_id, jump_to_id_base_url):
         rest = match.group('rest')
         return "".join([quote, jump_to_id_base_url + rest, quote])
 
-    return re.sub(_url_replace_regex('/jump_to_id/'), replace_jump_to_id_url, text)
+    return _url_replace_pattern('/jump_to_id/').sub(replace_jump_to_id_url, text)
 
 
 def replace_course_urls(text, course_key):
@@ -89,7 +109,7 @@ def replace_course_urls(text, course_key):
         rest = match.group('rest')
         return "".join([quote, '/courses/' + course_id + '/', rest, quote])
 
-    return re.sub(_url_replace_regex('/course/'), replace_course_url, text)
+    return _url_replace_pattern('/course/').sub(replace_course_url, text)
 
 
 def process_static_urls(text, replacement_function, data_dir=None):
@@ -108,14 +128,10 @@ def process_static_urls(text, replacement_function, data_dir=None):
         rest = match.group('rest')
         return replacement_function(original, prefix, quote, rest)
 
-    return re.sub(
-        _url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
-            static_url=settings.STATIC_URL,
-            data_dir=data_dir
-        )),
-        wrap_part_extraction,
-        text
-    )
+    return _url_replace_pattern(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
+        static_url=settings.STATIC_URL,
+        data_dir=data_dir
+    )).sub(wrap_part_extraction, text)
 
 
 def make_static_urls_absolute(request, html):
@@ -135,6 +151,54 @@ def make_static_urls_absolute(request, html):
     )
 
 
+def clear_resolved_static_urls():
+    """
+    Forget the remembered urls of the static files of Mongo-backed courses, e.g.
+    between tests that resolve them differently.
+    """
+    with _resolved_static_urls_lock:
+        _resolved_static_urls.clear()
+
+
+def _resolve_course_static_url(rest, course_id):
+    """
+    Return the url of the static file rest referenced in the Mongo-backed course course_id:
+    its url in the static file pipeline if it's there, and otherwise its url in the contentstore.
+
+    Neither of those change while the process runs, so the most recently used urls are
+    remembered rather than checking the static file storage every time.
+    """
+    key = (course_id, rest)
+    with _resolved_static_urls_lock:
+        url = _resolved_static_urls.pop(key, None)
+        if url is not None:
+            # (re-)insert the url as the most recently used
+            _resolved_static_urls[key] = url
+            return url
+
+    # first look in the static file pipeline and see if we are trying to reference
+    # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
+    exists_in_staticfiles_storage = False
+    try:
+        exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
+    except Exception as err:
+        log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+            rest, str(err)))
+
+    if exists_in_staticfiles_storage:
+        url = staticfiles_storage.url(rest)
+    else:
+        # if not, then assume it's courseware specific content and then look in the
+        # Mongo-backed database
+        url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
+
+    with _resolved_static_urls_lock:
+        _resolved_static_urls[key] = url
+        while len(_resolved_static_urls) > STATIC_URL_CACHE_SIZE:
+            _resolved_static_urls.popitem(last=False)
+    return url
+
+
 def replace_static_urls(text, data_directory=None, course_id=None, static_asset_path=''):
     """
     Replace /static/$stuff urls either with their correct url as generated by collectstatic,
@@ -147,6 +211,8 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
     course_id: The course identifier used to distinguish static content for this course in studio
     static_asset_path: Path for static assets, which overrides data_directory and course_namespace, if nonempty
     """
+    # whether the course is Mongo-backed, looked up the first time a url needs it
+    is_mongo_course = []
 
     def replace_static_url(original, prefix, quote, rest):
         """
@@ -161,25 +227,8 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
         if settings.DEBUG and finders.find(rest, True):
             return original
         # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
-        elif (not static_asset_path) \
-                and course_id \
-                and modulestore().get_modulestore_type(course_id) != ModuleStoreEnum.Type.xml:
-            # first look in the static file pipeline and see if we are trying to reference
-            # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
-
-            exists_in_staticfiles_storage = False
-            try:
-                exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-
-            if exists_in_staticfiles_storage:
-                url = staticfiles_storage.url(rest)
-            else:
-                # if not, then assume it's courseware specific content and then look in the
-                # Mongo-backed database
-                url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
+        elif (not static_asset_path) and course_id and _is_mongo_course():
+            url = _resolve_course_static_url(rest, course_id)
         # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
         else:
             course_path = "/".join((static_asset_path or data_directory, rest))
@@ -197,4 +246,12 @@ def replace_static_urls(text, data_directory=None, course_id=None, static_asset_
 
         return "".join([quote, url, quote])
 
+    def _is_mongo_course():
+        """
+        Return whether course_id is stored in a Mongo-backed modulestore.
+        """
+        if not is_mongo_course:
+            is_mongo_course.append(modulestore().get_modulestore_type(course_id) != ModuleStoreEnum.Type.xml)
+        return is_mongo_course[0]
+
     return process_static_urls(text, replace_static_url, data_dir=static_asset_path or data_directory)
@@ -1,7 +1,8 @@
 import re
 
-from nose.tools import assert_equals, assert_true, assert_false  # pylint: disable=no-name-in-module
+from nose.tools import assert_equals, assert_true, assert_false, with_setup  # pylint: disable=no-name-in-module
 from static_replace import (
+    clear_resolved_static_urls,
     replace_static_urls,
     replace_course_urls,
     _url_replace_regex,
@@ -83,6 +84,7 @@ def test_storage_url_not_exists(mock_storage):
     mock_storage.url.called_once_with('file.png')
 
 
+@with_setup(clear_resolved_static_urls, clear_resolved_static_urls)
 @patch('static_replace.StaticContent')
 @patch('static_replace.modulestore')
 def test_mongo_filestore(mock_modulestore, mock_static_content):
@@ -127,6 +129,7 @@ def test_raw_static_check():
     assert_equals(path, replace_static_urls(path, text))
 
 
+@with_setup(clear_resolved_static_urls, clear_resolved_static_urls)
 @patch('static_replace.staticfiles_storage')
 @patch('static_replace.modulestore')
 def test_static_url_with_query(mock_modulestore, mock_storage):
@@ -143,6 +146,26 @@ def test_static_url_with_query(mock_modulestore, mock_storage):
     assert_equals(post_text, replace_static_urls(pre_text, DATA_DIRECTORY, COURSE_KEY))
 
 
+@with_setup(clear_resolved_static_urls, clear_resolved_static_urls)
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_mongo_course_urls_cached(mock_modulestore, mock_storage):
+    """
+    Make sure that the urls of a Mongo-backed course's static files are only resolved once
+    """
+    mock_storage.exists.return_value = False
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    course_key = SlashSeparatedCourseKey('org', 'cached_course', 'run')
+    text = '"/static/image.png" "/static/image.png"'
+
+    expected = '"/c4x/org/cached_course/asset/image.png" "/c4x/org/cached_course/asset/image.png"'
+    assert_equals(expected, replace_static_urls(text, DATA_DIRECTORY, course_id=course_key))
+    assert_equals(expected, replace_static_urls(text, DATA_DIRECTORY, course_id=course_key))
+    mock_storage.exists.assert_called_once_with('image.png')
+    # The course's modulestore is looked up once per call, not once per url
+    assert_equals(mock_modulestore.return_value.get_modulestore_type.call_count, 2)
+
+
 def test_regex():
     yes = ('"/static/foo.png"',
            '"/static/foo.png"',
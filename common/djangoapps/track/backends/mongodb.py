@@ -9,6 +9,7 @@ from pymongo import MongoClient
 from pymongo.errors import PyMongoError
 
 from track.backends import BaseBackend
+from track.batching import BatchingQueue
 
 
 log = logging.getLogger(__name__)
@@ -95,3 +96,50 @@ class MongoBackend(BaseBackend):
             # during the next event.
             msg = 'Error inserting to MongoDB event tracker backend'
             log.exception(msg)
+
+    def send_batch(self, events):
+        """Insert a list of events in to the Mongo collection at once"""
+        # PyMongoErrors are left to the caller, which knows how many events were lost
+        self.collection.insert(events, manipulate=False, continue_on_error=True)
+
+
+class BufferedMongoBackend(MongoBackend):
+    """
+    MongoDB event tracker backend that queues events in memory, and inserts
+    them in batches from a background thread, so that sending an event never
+    waits on MongoDB.
+
+    It queues events itself, so don't also give it a pipeline QUEUE_SIZE
+    (see track.tracker); use MongoBackend with a QUEUE_SIZE instead.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Connect to a MongoDB.
+
+        Takes the parameters of MongoBackend, and:
+
+          - `max_queue_size`: the most events to queue; events sent while
+            the queue is full are dropped
+          - `batch_size`: the most events to insert at once
+          - `flush_interval`: the most seconds an event waits for its batch
+            to fill up before it's inserted
+
+        """
+        max_queue_size = kwargs.pop('max_queue_size', 10000)
+        batch_size = kwargs.pop('batch_size', 100)
+        flush_interval = kwargs.pop('flush_interval', 1.0)
+
+        super(BufferedMongoBackend, self).__init__(**kwargs)
+
+        self.queue = BatchingQueue(
+            'mongodb',
+            self.send_batch,
+            max_size=max_queue_size,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+        )
+
+    def send(self, event):
+        """Queue the event to be inserted in to the Mongo collection"""
+        self.queue.put(event)
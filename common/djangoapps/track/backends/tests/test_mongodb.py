@@ -6,7 +6,7 @@ from mock import patch
 
 from django.test import TestCase
 
-from track.backends.mongodb import MongoBackend
+from track.backends.mongodb import MongoBackend, BufferedMongoBackend
 
 
 class TestMongoBackend(TestCase):
@@ -38,3 +38,29 @@ class TestMongoBackend(TestCase):
 
         self.assertEqual(events[0], first_argument(calls[0]))
         self.assertEqual(events[1], first_argument(calls[1]))
+
+
+class TestBufferedMongoBackend(TestCase):
+    def setUp(self):
+        self.mongo_patcher = patch('track.backends.mongodb.MongoClient')
+        self.addCleanup(self.mongo_patcher.stop)
+        self.mongo_patcher.start()
+
+        self.backend = BufferedMongoBackend(flush_interval=0.01)
+
+    def test_buffered_mongo_backend(self):
+        events = [{'test': 1}, {'test': 2}]
+
+        self.backend.send(events[0])
+        self.backend.send(events[1])
+        self.backend.queue.close()
+
+        # Check that the events were inserted in batches rather than
+        # one at a time
+
+        inserted = []
+        for _, args, _ in self.backend.collection.insert.mock_calls:
+            self.assertIsInstance(args[0], list)
+            inserted.extend(args[0])
+
+        self.assertEqual(events, inserted)
@@ -0,0 +1,158 @@
+"""
+Bounded in-memory queues of tracking events, sent on in batches by a
+background thread so that request threads never wait on an event store.
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+from Queue import Queue, Empty, Full
+
+from dogapi import dog_stats_api
+
+
+log = logging.getLogger(__name__)
+
+# The queues to close when the process exits. They're held weakly, so that
+# queues that are thrown away, such as those of replaced tracking backends,
+# can be garbage collected once closed.
+_QUEUES = weakref.WeakSet()
+
+
+@atexit.register
+def _close_queues():
+    """
+    Send whatever is still queued in the open queues.
+    """
+    for queue in list(_QUEUES):
+        queue.close()
+
+
+class BatchingQueue(object):
+    """
+    A bounded queue of events that a background thread hands to `send_batch`
+    in lists of at most `batch_size` events.
+
+    Events are sent once a batch is full or `flush_interval` seconds after
+    the first event of the batch was queued, whichever comes first. Events
+    queued while the queue holds `max_size` events are dropped rather than
+    making the caller wait. Whatever is still queued when the process exits
+    is sent before it does.
+    """
+
+    def __init__(self, name, send_batch, max_size=10000, batch_size=100, flush_interval=1.0):
+        self.name = name
+        self.send_batch = send_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._queue = Queue(max_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+
+        _QUEUES.add(self)
+
+    def put(self, event):
+        """
+        Queue `event` to be sent, and return whether it was queued.
+        """
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(event)
+        except Full:
+            self.dropped += 1
+            dog_stats_api.increment('track.queue.dropped', tags=[u'queue:{}'.format(self.name)])
+            return False
+        return True
+
+    def flush(self):
+        """
+        Send everything that's queued from the calling thread.
+        """
+        while True:
+            batch = self._get_batch(block=False)
+            if not batch:
+                return
+            self._send(batch)
+
+    def close(self):
+        """
+        Stop the background thread, and send whatever it hadn't sent yet.
+        """
+        _QUEUES.discard(self)
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(self.flush_interval * 2)
+        self.flush()
+
+    def _ensure_thread(self):
+        """
+        Start the background thread, unless it's already running in this
+        process. Threads don't survive a fork, so forked workers each start
+        their own.
+        """
+        if self._pid == os.getpid() or self._stopping.is_set():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name=u'track-queue-{}'.format(self.name))
+                self._thread.daemon = True
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        """
+        Send batches of events until the queue is closed.
+        """
+        while not self._stopping.is_set():
+            batch = self._get_batch(block=True)
+            if batch:
+                self._send(batch)
+
+    def _get_batch(self, block):
+        """
+        Return the next batch of queued events, which may be empty. If `block`,
+        wait up to flush_interval for the first event, and then until the
+        batch is full or flush_interval has passed since that first event.
+        """
+        batch = []
+        try:
+            batch.append(self._queue.get(block, self.flush_interval))
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.time()
+                if block and timeout > 0:
+                    batch.append(self._queue.get(True, timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+        except Empty:
+            pass
+        return batch
+
+    def _send(self, batch):
+        """
+        Hand `batch` to send_batch, recording how it went.
+        """
+        tags = [u'queue:{}'.format(self.name)]
+        try:
+            with dog_stats_api.timer('track.queue.send_batch', tags=tags):
+                self.send_batch(batch)
+        except Exception:  # pylint: disable=broad-except
+            # the events are lost, but the queue has to keep going
+            self.failed += len(batch)
+            dog_stats_api.increment('track.queue.failed', value=len(batch), tags=tags)
+            log.exception(u"Error sending a batch of %d events from tracking queue %s", len(batch), self.name)
+        else:
+            self.sent += len(batch)
+            dog_stats_api.increment('track.queue.sent', value=len(batch), tags=tags)
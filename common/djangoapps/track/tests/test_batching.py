@@ -0,0 +1,72 @@
+"""Tests for track.batching"""
+
+from __future__ import absolute_import
+
+import time
+
+from django.test import TestCase
+from mock import Mock, patch
+
+from track.batching import BatchingQueue
+
+
+@patch('track.batching.BatchingQueue._ensure_thread', Mock())
+class TestBatchingQueue(TestCase):
+    """Test the BatchingQueue, without its background thread."""
+
+    def setUp(self):
+        self.batches = []
+        self.queue = BatchingQueue('test', self.batches.append, max_size=5, batch_size=2, flush_interval=0.01)
+
+    def test_flush_in_batches(self):
+        for event in range(5):
+            self.assertTrue(self.queue.put({'event': event}))
+
+        self.queue.flush()
+
+        self.assertEqual(
+            self.batches,
+            [[{'event': 0}, {'event': 1}], [{'event': 2}, {'event': 3}], [{'event': 4}]]
+        )
+        self.assertEqual(self.queue.sent, 5)
+
+    def test_drop_when_full(self):
+        for event in range(5):
+            self.queue.put({'event': event})
+
+        self.assertFalse(self.queue.put({'event': 5}))
+        self.assertEqual(self.queue.dropped, 1)
+
+    def test_failed_batch(self):
+        self.queue.send_batch = Mock(side_effect=Exception)
+        self.queue.put({'event': 0})
+
+        self.queue.flush()
+
+        self.assertEqual(self.queue.failed, 1)
+        self.assertEqual(self.queue.sent, 0)
+
+    def test_close_flushes(self):
+        self.queue.put({'event': 0})
+
+        self.queue.close()
+
+        self.assertEqual(self.batches, [[{'event': 0}]])
+
+
+class TestBatchingQueueThread(TestCase):
+    """Test that the BatchingQueue's background thread sends events."""
+
+    def test_background_send(self):
+        batches = []
+        queue = BatchingQueue('test', batches.append, flush_interval=0.01)
+
+        self.addCleanup(queue.close)
+
+        queue.put({'event': 0})
+
+        # close() would send the event itself, so wait for the thread to send it
+        deadline = time.time() + 5
+        while not batches and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(batches, [[{'event': 0}]])
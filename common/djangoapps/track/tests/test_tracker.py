@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+from mock import patch
 
 import track.tracker as tracker
 from track.backends import BaseBackend
@@ -24,6 +25,28 @@ MULTI_SETTINGS = {
     }
 }
 
+SAMPLED_SETTINGS = {
+    'default': {
+        'ENGINE': 'track.tests.test_tracker.DummyBackend',
+        'PIPELINE': {
+            'SAMPLING': {
+                'play_video': 0.5
+            }
+        }
+    }
+}
+
+QUEUED_SETTINGS = {
+    'default': {
+        'ENGINE': 'track.tests.test_tracker.DummyBackend',
+        'PIPELINE': {
+            'QUEUE_SIZE': 10,
+            'BATCH_SIZE': 2,
+            'FLUSH_INTERVAL': 0.01
+        }
+    }
+}
+
 
 class TestTrackerInstantiation(TestCase):
     """Test that a helper function can instantiate backends from their name."""
@@ -97,6 +120,32 @@ class TestTrackerDjangoInstantiation(TestCase):
 
         self.assertEqual(len(backends), 1)
 
+    @override_settings(TRACKING_BACKENDS=SAMPLED_SETTINGS)
+    def test_django_sampling_settings(self):
+        """Test that events are sampled by event type."""
+
+        backend = self._reload_backends()['default']
+
+        with patch('track.tracker.random.random', side_effect=[0.2, 0.7]):
+            tracker.send({'event_type': 'play_video'})
+            tracker.send({'event_type': 'play_video'})
+        tracker.send({'event_type': 'problem_check'})
+
+        self.assertEqual(backend.count, 2)
+
+    @override_settings(TRACKING_BACKENDS=QUEUED_SETTINGS)
+    def test_django_queued_settings(self):
+        """Test that events can be queued and sent in batches."""
+
+        backend = self._reload_backends()['default']
+
+        event_count = 5
+        for _ in xrange(event_count):
+            tracker.send({})
+        tracker.pipelines['default'].queue.close()
+
+        self.assertEqual(backend.count, event_count)
+
     def _reload_backends(self):
         # pylint: disable=protected-access
 
@@ -12,13 +12,35 @@ below::
               'host': ... ,
               'port': ... ,
               ...
+          },
+          'PIPELINE': {
+              'SAMPLING': {
+                  'play_video': 0.1,
+                  ...
+              },
+              'QUEUE_SIZE': 10000,
+              'BATCH_SIZE': 100,
+              'FLUSH_INTERVAL': 1.0,
           }
       }
   }
 
+Events go through a pipeline on their way to each backend. Events whose
+event_type has a SAMPLING rate are only sent that fraction of the time. With
+a QUEUE_SIZE, events are queued and sent in batches of up to BATCH_SIZE by a
+background thread, at least every FLUSH_INTERVAL seconds, so that a slow
+backend doesn't slow down requests; without one, they're sent as they come.
+
+Queue events in one place only: a queued pipeline hands its batches straight
+to the backend's send_batch, so a backend that queues events itself, such as
+BufferedMongoBackend, should be given no QUEUE_SIZE, and a backend given a
+QUEUE_SIZE should be one that sends its events as they come, such as
+MongoBackend.
+
 """
 
 import inspect
+import random
 from importlib import import_module
 
 from dogapi import dog_stats_api
@@ -26,12 +48,63 @@ from dogapi import dog_stats_api
 from django.conf import settings
 
 from track.backends import BaseBackend
+from track.batching import BatchingQueue
 
 
 __all__ = ['send']
 
 
 backends = {}
+pipelines = {}
+
+
+class BackendPipeline(object):
+    """
+    The stage between `send` and a backend, which samples events and, if
+    configured to, queues them to be sent in batches.
+
+    """
+    def __init__(self, name, backend, sampling=None, queue_size=None, batch_size=100, flush_interval=1.0):
+        self.name = name
+        self.backend = backend
+        self.sampling = sampling or {}
+
+        self.queue = None
+        if queue_size:
+            self.queue = BatchingQueue(
+                name,
+                self.send_batch,
+                max_size=queue_size,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+            )
+
+    def send(self, event):
+        """Send the event to the backend, unless it's sampled out."""
+        event_type = event.get('event_type')
+        rate = self.sampling.get(event_type)
+        if rate is not None and random.random() >= rate:
+            dog_stats_api.increment(
+                'track.send.sampled_out',
+                tags=[u'backend:{0}'.format(self.name), u'event_type:{0}'.format(event_type)]
+            )
+            return
+
+        if self.queue is not None:
+            self.queue.put(event)
+        else:
+            with dog_stats_api.timer('track.send.backend.{0}'.format(self.name)):
+                self.backend.send(event)
+
+    def send_batch(self, events):
+        """Send a list of queued events to the backend."""
+        with dog_stats_api.timer('track.send.backend.{0}'.format(self.name)):
+            self.backend.send_batch(events)
+
+    def close(self):
+        """Send whatever is still queued, and stop the queue's thread."""
+        if self.queue is not None:
+            self.queue.close()
 
 
 def _initialize_backends_from_django_settings():
@@ -40,7 +113,10 @@ def _initialize_backends_from_django_settings():
     configuration in django settings
 
     """
+    for pipeline in pipelines.itervalues():
+        pipeline.close()
     backends.clear()
+    pipelines.clear()
 
     config = getattr(settings, 'TRACKING_BACKENDS', {})
 
@@ -50,6 +126,7 @@ def _initialize_backends_from_django_settings():
             engine = values['ENGINE']
             options = values.get('OPTIONS', {})
             backends[name] = _instantiate_backend_from_name(engine, options)
+            pipelines[name] = _instantiate_pipeline(name, backends[name], values.get('PIPELINE', {}))
 
 
 def _instantiate_backend_from_name(name, options):
@@ -83,17 +160,33 @@ def _instantiate_backend_from_name(name, options):
     return backend
 
 
+def _instantiate_pipeline(name, backend, config):
+    """
+    Instantiate the pipeline of an event tracker backend from its PIPELINE
+    configuration.
+
+    """
+    return BackendPipeline(
+        name,
+        backend,
+        sampling=config.get('SAMPLING'),
+        queue_size=config.get('QUEUE_SIZE'),
+        batch_size=config.get('BATCH_SIZE', 100),
+        flush_interval=config.get('FLUSH_INTERVAL', 1.0),
+    )
+
+
 @dog_stats_api.timed('track.send')
 def send(event):
     """
-    Send an event object to all the initialized backends.
+    Send an event object to all the initialized backends, through their
+    pipelines.
 
     """
     dog_stats_api.increment('track.send.count')
 
-    for name, backend in backends.iteritems():
-        with dog_stats_api.timer('track.send.backend.{0}'.format(name)):
-            backend.send(event)
+    for pipeline in pipelines.itervalues():
+        pipeline.send(event)
 
 
 _initialize_backends_from_django_settings()
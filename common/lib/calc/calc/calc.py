@@ -7,6 +7,9 @@ Uses pyparsing to parse. Main function as of now is evaluator().
 import math
 import operator
 import numbers
+import threading
+from collections import OrderedDict
+
 import numpy
 import scipy.constants
 import functions
@@ -258,6 +261,209 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     return math_interpreter.reduce_tree(evaluate_actions)
 
 
+def compile_evaluator(variable_names, functions, math_expr, case_sensitive=False):
+    """
+    Compile an expression into a function of a dictionary of variables.
+
+    Calling the function with `variables` returns the same as
+    `evaluator(variables, functions, math_expr, case_sensitive)`, but the
+    expression is only parsed and checked once, so it is much cheaper to
+    evaluate the same expression for many sets of values.
+
+    -`variable_names` are the names of the variables the dictionaries passed
+     to the function will have values for.
+    -Undefined variables and functions raise UndefinedVariable here, rather
+     than when the function is called.
+    """
+    # No need to go further.
+    if math_expr.strip() == "":
+        return lambda variables: float('nan')
+
+    math_interpreter = ParseAugmenter(math_expr, case_sensitive)
+    math_interpreter.parse_algebra()
+
+    all_variables, all_functions = add_defaults(dict.fromkeys(variable_names), functions, case_sensitive)
+    math_interpreter.check_variables(all_variables, all_functions)
+
+    if case_sensitive:
+        casify = lambda x: x
+    else:
+        casify = lambda x: x.lower()  # Lowercase for case insens.
+    passed_variables = set(casify(name) for name in variable_names)
+
+    evaluate_actions = {
+        'atom': eval_atom,
+        'power': eval_power,
+        'parallel': eval_parallel,
+        'product': eval_product,
+        'sum': eval_sum
+    }
+
+    def compile_node(node):
+        """
+        Return a function of the (casified) variables that evaluates the node.
+
+        Numbers, default variables and the function each function node calls
+        are looked up now, so calls only do the arithmetic.
+        """
+        if not isinstance(node, ParseResults):
+            # Then it is a terminal node, i.e. an operator.
+            return lambda variables: node
+
+        node_name = node.getName()
+        if node_name == 'number':
+            value = eval_number(node)
+            return lambda variables: value
+        if node_name == 'variable':
+            name = casify(node[0])
+            if name in passed_variables:
+                return lambda variables: variables[name]
+            value = all_variables[name]
+            return lambda variables: value
+        if node_name == 'function':
+            function = all_functions[casify(node[0])]
+            argument = compile_node(node[1])
+            return lambda variables: function(argument(variables))
+        if node_name not in evaluate_actions:  # pragma: no cover
+            raise Exception(u"Unknown branch name '{}'".format(node_name))
+
+        action = evaluate_actions[node_name]
+        kids = [compile_node(k) for k in node]
+        return lambda variables: action([kid(variables) for kid in kids])
+
+    compiled = compile_node(math_interpreter.tree)
+    if case_sensitive:
+        return compiled
+    return lambda variables: compiled(lower_dict(variables))
+
+
+def _build_grammar():
+    """
+    Build the pyparsing grammar of algebraic expressions.
+
+    The grammar parses a whole string into a tree of `ParseResults` with
+    proper groupings to reflect parenthesis and order of operations.
+    """
+    # 0.33 or 7 or .34 or 16.
+    number_part = Word(nums)
+    inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
+    # pyparsing allows spaces between tokens--`Combine` prevents that.
+    inner_number = Combine(inner_number)
+
+    # SI suffixes and percent.
+    number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
+
+    # 0.33k or 17
+    plus_minus = Literal('+') | Literal('-')
+    number = Group(
+        Optional(plus_minus) +
+        inner_number +
+        Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
+        Optional(number_suffix)
+    )
+    number = number("number")
+
+    # Predefine recursive variables.
+    expr = Forward()
+
+    # Handle variables passed in. They must start with letters/underscores
+    # and may contain numbers afterward.
+    inner_varname = Word(alphas + "_", alphanums + "_")
+    varname = Group(inner_varname)("variable")
+
+    # Same thing for functions.
+    function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
+
+    atom = number | function | varname | "(" + expr + ")"
+    atom = Group(atom)("atom")
+
+    # Do the following in the correct order to preserve order of operation.
+    pow_term = atom + ZeroOrMore("^" + atom)
+    pow_term = Group(pow_term)("power")
+
+    par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
+    par_term = Group(par_term)("parallel")
+
+    prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
+    prod_term = Group(prod_term)("product")
+
+    sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
+    sum_term = Group(sum_term)("sum")
+
+    # Finish the recursion.
+    expr << sum_term  # pylint: disable=pointless-statement
+    grammar = expr + stringEnd
+    grammar.streamline()
+    return grammar
+
+
+_GRAMMAR = None
+_GRAMMAR_LOCK = threading.Lock()
+
+
+def _get_grammar():
+    """
+    Return the grammar, building it the first time it's needed.
+    """
+    global _GRAMMAR  # pylint: disable=global-statement
+    if _GRAMMAR is None:
+        with _GRAMMAR_LOCK:
+            if _GRAMMAR is None:
+                _GRAMMAR = _build_grammar()
+    return _GRAMMAR
+
+
+def _names_used(tree):
+    """
+    Return the sets of variable names and function names used in `tree`.
+    """
+    variables_used = set()
+    functions_used = set()
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if not isinstance(node, ParseResults):
+            continue
+        node_name = node.getName()
+        if node_name == 'variable':
+            variables_used.add(node[0])
+        elif node_name == 'function':
+            functions_used.add(node[0])
+        nodes.extend(node)
+    return variables_used, functions_used
+
+
+# The number of parsed expressions to keep, most recently used first
+PARSE_CACHE_SIZE = 1000
+
+_PARSE_CACHE = OrderedDict()
+_PARSE_CACHE_LOCK = threading.Lock()
+
+
+def _parse(math_expr, case_sensitive):
+    """
+    Return the parse tree of `math_expr` with the sets of variable names and
+    function names it uses, from the cache when it was parsed recently.
+
+    Parse trees are only ever read, so cached trees are shared between
+    callers; the sets are copied.
+    """
+    key = (math_expr, case_sensitive)
+    with _PARSE_CACHE_LOCK:
+        parsed = _PARSE_CACHE.pop(key, None)
+        if parsed is not None:
+            _PARSE_CACHE[key] = parsed
+    if parsed is None:
+        tree = _get_grammar().parseString(math_expr)[0]
+        parsed = (tree,) + _names_used(tree)
+        with _PARSE_CACHE_LOCK:
+            _PARSE_CACHE[key] = parsed
+            while len(_PARSE_CACHE) > PARSE_CACHE_SIZE:
+                _PARSE_CACHE.popitem(last=False)
+    tree, variables_used, functions_used = parsed
+    return tree, set(variables_used), set(functions_used)
+
+
 class ParseAugmenter(object):
     """
     Holds the data for a particular parse.
@@ -278,23 +484,6 @@ class ParseAugmenter(object):
         self.variables_used = set()
         self.functions_used = set()
 
-        def vpa(tokens):
-            """
-            When a variable is recognized, store it in `variables_used`.
-            """
-            varname = tokens[0][0]
-            self.variables_used.add(varname)
-
-        def fpa(tokens):
-            """
-            When a function is recognized, store it in `functions_used`.
-            """
-            varname = tokens[0][0]
-            self.functions_used.add(varname)
-
-        self.variable_parse_action = vpa
-        self.function_parse_action = fpa
-
     def parse_algebra(self):
         """
         Parse an algebraic expression into a tree.
@@ -302,62 +491,14 @@ class ParseAugmenter(object):
         Store a `pyparsing.ParseResult` in `self.tree` with proper groupings to
         reflect parenthesis and order of operations. Leave all operators in the
         tree and do not parse any strings of numbers into their float versions.
+        Store the names of the variables and functions it uses in
+        `self.variables_used` and `self.functions_used`.
 
         Adding the groups and result names makes the `repr()` of the result
         really gross. For debugging, use something like
           print OBJ.tree.asXML()
         """
-        # 0.33 or 7 or .34 or 16.
-        number_part = Word(nums)
-        inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
-        # pyparsing allows spaces between tokens--`Combine` prevents that.
-        inner_number = Combine(inner_number)
-
-        # SI suffixes and percent.
-        number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
-
-        # 0.33k or 17
-        plus_minus = Literal('+') | Literal('-')
-        number = Group(
-            Optional(plus_minus) +
-            inner_number +
-            Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
-            Optional(number_suffix)
-        )
-        number = number("number")
-
-        # Predefine recursive variables.
-        expr = Forward()
-
-        # Handle variables passed in. They must start with letters/underscores
-        # and may contain numbers afterward.
-        inner_varname = Word(alphas + "_", alphanums + "_")
-        varname = Group(inner_varname)("variable")
-        varname.setParseAction(self.variable_parse_action)
-
-        # Same thing for functions.
-        function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
-        function.setParseAction(self.function_parse_action)
-
-        atom = number | function | varname | "(" + expr + ")"
-        atom = Group(atom)("atom")
-
-        # Do the following in the correct order to preserve order of operation.
-        pow_term = atom + ZeroOrMore("^" + atom)
-        pow_term = Group(pow_term)("power")
-
-        par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
-        par_term = Group(par_term)("parallel")
-
-        prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
-        prod_term = Group(prod_term)("product")
-
-        sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
-        sum_term = Group(sum_term)("sum")
-
-        # Finish the recursion.
-        expr << sum_term  # pylint: disable=pointless-statement
-        self.tree = (expr + stringEnd).parseString(self.math_expr)[0]
+        self.tree, self.variables_used, self.functions_used = _parse(self.math_expr, self.case_sensitive)
 
     def reduce_tree(self, handle_actions, terminal_converter=None):
         """
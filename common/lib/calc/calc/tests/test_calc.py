@@ -559,3 +559,95 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+
+class CompileEvaluatorTest(unittest.TestCase):
+    """
+    Run tests for calc.compile_evaluator
+    """
+    def test_same_as_evaluator(self):
+        """
+        Compiled expressions evaluate to what evaluator returns
+        """
+        functions = {'f': lambda x: 2 * x}
+        expressions = [
+            '', '2.5k', '-x^2^0.5 + 3*y/x', 'x||y', 'x||0', 'sin(pi*x) + f(Y)', 'fact(3)/e', 'q*T*i',
+        ]
+        for math_expr in expressions:
+            evaluate = calc.compile_evaluator(['x', 'y'], functions, math_expr)
+            for variables in ({'x': 1.5, 'y': 2.0}, {'x': 4.0, 'y': -0.5}):
+                expected = calc.evaluator(variables, functions, math_expr)
+                if numpy.isnan(expected):
+                    self.assertTrue(numpy.isnan(evaluate(variables)))
+                else:
+                    self.assertEqual(evaluate(variables), expected)
+
+    def test_case_sensitive(self):
+        """
+        Variables and functions follow case_sensitive as in evaluator
+        """
+        functions = {'f': lambda x: x, 'F': lambda x: x + 1}
+        evaluate = calc.compile_evaluator(['x', 'X'], functions, 'F(X) - f(x)', case_sensitive=True)
+        self.assertEqual(evaluate({'x': 1, 'X': 5}), 5)
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'X'):
+            calc.compile_evaluator(['x'], {}, 'X', case_sensitive=True)
+
+    def test_undefined_when_compiled(self):
+        """
+        Undefined variables are reported before any values are passed
+        """
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'r2'):
+            calc.compile_evaluator(['r1'], {}, "r1+r2")
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'g'):
+            calc.compile_evaluator([], {}, "g(2)")
+
+    def test_errors_when_evaluated(self):
+        """
+        Errors that depend on the values are raised when evaluating
+        """
+        evaluate = calc.compile_evaluator(['x'], {}, '1/x')
+        self.assertEqual(evaluate({'x': 4.0}), 0.25)
+        with self.assertRaises(ZeroDivisionError):
+            evaluate({'x': 0})
+        evaluate = calc.compile_evaluator(['x'], {}, 'fact(x)')
+        with self.assertRaises(ValueError):
+            evaluate({'x': 1.5})
+
+
+class ParseAugmenterTest(unittest.TestCase):
+    """
+    Tests of parsing expressions with calc.ParseAugmenter
+    """
+    def test_names_used(self):
+        """
+        The variables and functions of nested expressions are all found
+        """
+        parse = calc.ParseAugmenter('x + f(y * g(2)) ^ sin(z)')
+        parse.parse_algebra()
+        self.assertEqual(parse.variables_used, set(['x', 'y', 'z']))
+        self.assertEqual(parse.functions_used, set(['f', 'g', 'sin']))
+
+    def test_parsed_trees_cached(self):
+        """
+        Parsing an expression again reuses its tree, but not its sets of names
+        """
+        first = calc.ParseAugmenter('3 * x + y', case_sensitive=True)
+        first.parse_algebra()
+        second = calc.ParseAugmenter('3 * x + y', case_sensitive=True)
+        second.parse_algebra()
+        self.assertIs(first.tree, second.tree)
+        second.variables_used.add('z')
+        self.assertEqual(first.variables_used, set(['x', 'y']))
+
+        # Each expression is still evaluated with its own variables
+        self.assertEqual(calc.evaluator({'x': 1, 'y': 2}, {}, '3 * x + y', case_sensitive=True), 5)
+        self.assertEqual(calc.evaluator({'x': 2, 'y': 1}, {}, '3 * x + y', case_sensitive=True), 7)
+
+    def test_parse_cache_is_bounded(self):
+        """
+        The least recently parsed expressions are evicted from the cache
+        """
+        for index in range(calc.PARSE_CACHE_SIZE + 10):
+            calc.ParseAugmenter('x + {}'.format(index)).parse_algebra()
+        self.assertEqual(len(calc._PARSE_CACHE), calc.PARSE_CACHE_SIZE)  # pylint: disable=protected-access
+        self.assertNotIn(('x + 0', False), calc._PARSE_CACHE)  # pylint: disable=protected-access
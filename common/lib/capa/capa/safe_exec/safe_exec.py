@@ -3,10 +3,15 @@
 from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
+from codejail.jail_code import is_configured
 from . import lazymod
+from .sandbox_pool import SandboxPool
 from dogapi import dog_stats_api
 
+from collections import OrderedDict
+import copy
 import hashlib
+import threading
 
 # Establish the Python environment for Capa.
 # Capa assumes float-friendly division always.
@@ -46,6 +51,18 @@ for name, modname in ASSUMED_IMPORTS:
 
 LAZY_IMPORTS = "".join(LAZY_IMPORTS)
 
+# The pool of warm sandboxes to run code in, if there is one.
+SANDBOX_POOL = None
+
+
+def configure_sandbox_pool(size, max_runs):
+    """
+    Run sandboxed code in a pool of at most `size` warm sandboxes, which have
+    imported the ASSUMED_IMPORTS already and are recycled after `max_runs` runs.
+    """
+    global SANDBOX_POOL  # pylint: disable=global-statement
+    SANDBOX_POOL = SandboxPool(size, max_runs, preload=[modname for __, modname in ASSUMED_IMPORTS])
+
 
 def update_hash(hasher, obj):
     """
@@ -70,6 +87,88 @@ def update_hash(hasher, obj):
         hasher.update(repr(obj))
 
 
+# The types of globals that `cache_key` can hash without making them JSON-safe first.
+SIMPLE_TYPES = (type(None), bool, int, long, float, str, unicode)
+
+
+def cache_key(code, globals_dict, random_seed, python_path=None, extra_files=None):
+    """
+    Return the key to cache the result of running `code` with `globals_dict`,
+    `random_seed`, `python_path` and `extra_files` under. The contents of the
+    extra files are part of the key, so changing a course's python_lib.zip
+    changes the keys of its scripts.
+
+    Usually the globals are just a few strings and numbers, like the seed and the
+    anonymous student id, and those are hashed as they are. Anything else is made
+    JSON-safe and hashed with `update_hash`.
+    """
+    md5er = hashlib.md5()
+    md5er.update(repr(code))
+    md5er.update(repr(python_path))
+    for name, contents in extra_files or ():
+        md5er.update(repr(name))
+        md5er.update(hashlib.md5(contents).hexdigest())
+    if all(type(key) in SIMPLE_TYPES and type(value) in SIMPLE_TYPES for key, value in globals_dict.iteritems()):
+        md5er.update(repr(sorted(globals_dict.iteritems())))
+        return "safe_exec.%r.s%s" % (random_seed, md5er.hexdigest())
+    update_hash(md5er, json_safe(globals_dict))
+    return "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
+
+
+class LocalCache(object):
+    """
+    A cache of safe_exec results that keeps the most recently used `max_size`
+    results in this process, in front of a shared `cache` such as memcached.
+
+    Results are copied in and out of the local tier, so callers can't change
+    each other's results.
+    """
+    def __init__(self, cache, max_size=1000):
+        self.cache = cache
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the result cached under `key`, or None.
+        """
+        with self._lock:
+            result = self._results.pop(key, None)
+            if result is not None:
+                self._results[key] = result
+        if result is not None:
+            dog_stats_api.increment('capa.safe_exec.cache', tags=['tier:local', 'result:hit'])
+            return copy.deepcopy(result)
+
+        with dog_stats_api.timer('capa.safe_exec.cache.shared_get_time'):
+            result = self.cache.get(key)
+        if result is None:
+            dog_stats_api.increment('capa.safe_exec.cache', tags=['tier:shared', 'result:miss'])
+            return None
+        dog_stats_api.increment('capa.safe_exec.cache', tags=['tier:shared', 'result:hit'])
+        self._set_local(key, result)
+        return result
+
+    def set(self, key, value):
+        """
+        Cache `value` under `key`, here and in the shared cache.
+        """
+        self._set_local(key, value)
+        self.cache.set(key, value)
+
+    def _set_local(self, key, value):
+        """
+        Keep a copy of `value` in the local tier, evicting the least recently used results.
+        """
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._results.pop(key, None)
+            self._results[key] = value
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+
 @dog_stats_api.timed('capa.safe_exec.time')
 def safe_exec(
     code,
@@ -99,7 +198,8 @@ def safe_exec(
 
     `cache` is an object with .get(key) and .set(key, value) methods.  It will be used
     to cache the execution, taking into account the code, the values of the globals,
-    and the random seed.
+    and the random seed.  Wrap it in a `LocalCache` to also keep recent results in
+    this process.
 
     `slug` is an arbitrary string, a description that's meaningful to the
     caller, that will be used in log messages.
@@ -109,11 +209,7 @@ def safe_exec(
     """
     # Check the cache for a previous result.
     if cache:
-        safe_globals = json_safe(globals_dict)
-        md5er = hashlib.md5()
-        md5er.update(repr(code))
-        update_hash(md5er, safe_globals)
-        key = "safe_exec.%r.%s" % (random_seed, md5er.hexdigest())
+        key = cache_key(code, globals_dict, random_seed, python_path, extra_files)
         cached = cache.get(key)
         if cached is not None:
             # We have a cached result.  The result is a pair: the exception
@@ -130,6 +226,8 @@ def safe_exec(
     # Decide which code executor to use.
     if unsafely:
         exec_fn = codejail_not_safe_exec
+    elif SANDBOX_POOL is not None and is_configured("python"):
+        exec_fn = SANDBOX_POOL.safe_exec
     else:
         exec_fn = codejail_safe_exec
 
@@ -0,0 +1,394 @@
+"""
+A pool of warm sandboxes for running Capa's Python code.
+
+Starting a sandboxed interpreter, and importing numpy and friends in it, takes
+far longer than most problem scripts do. Each sandbox here is a long-lived
+sandboxed interpreter that has already imported the modules in
+ASSUMED_IMPORTS. For each script it forks a fresh child in its own process
+group, which runs the script and exits. Like codejail, the child can't start
+processes or write files, and its whole process group is killed after every
+run, so scripts never see each other's state. The sandbox itself never runs
+untrusted code.
+
+Sandboxes are started with the command and user codejail is configured with,
+and are recycled after `max_runs` scripts. Anything that goes wrong with a
+sandbox, as opposed to with the script, falls back to running the script
+through codejail.
+"""
+
+import base64
+import json
+import logging
+import os
+import os.path
+import select
+import struct
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from codejail import jail_code
+from codejail.safe_exec import safe_exec as codejail_safe_exec
+from codejail.safe_exec import json_safe, SafeExecException
+from dogapi import dog_stats_api
+
+log = logging.getLogger(__name__)
+
+# The code each sandbox runs. It reads requests from stdin, runs each of them
+# in a forked child, and writes the results to stdout. Messages are JSON, each
+# preceded by its length.
+SANDBOX_CODE = r"""
+import base64, json, os, resource, select, shutil, signal, struct, sys, tempfile, time, traceback
+
+for name in %(preload)r:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+
+# Keep the channel to the host to ourselves: scripts get /dev/null.
+host_in = os.dup(0)
+host_out = os.dup(1)
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 0)
+os.dup2(devnull, 1)
+
+
+def read_exactly(fd, size):
+    data = ''
+    while len(data) < size:
+        chunk = os.read(fd, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def run_script(request, tmpdir):
+    if request['cpu']:
+        resource.setrlimit(resource.RLIMIT_CPU, (request['cpu'], request['cpu']))
+    if request['vmem']:
+        resource.setrlimit(resource.RLIMIT_AS, (request['vmem'], request['vmem']))
+    os.chdir(tmpdir)
+    for name, contents in request['files']:
+        dirname = os.path.dirname(name)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(name, 'wb') as f:
+            f.write(base64.b64decode(contents))
+    # Like codejail: no new processes, and no more writing files.
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    sys.path[:0] = [os.path.join(tmpdir, path) for path in request['python_path']]
+
+    g = request['globals']
+    exec compile(request['code'], '<jailed code>', 'exec') in g
+
+    cleaned = {}
+    for key, value in g.iteritems():
+        if key == '__builtins__':
+            continue
+        try:
+            json.dumps(value)
+        except Exception:
+            continue
+        cleaned[key] = value
+    return cleaned
+
+
+while True:
+    header = read_exactly(host_in, 4)
+    if header is None:
+        break
+    request = json.loads(read_exactly(host_in, struct.unpack('>I', header)[0]))
+
+    tmpdir = tempfile.mkdtemp(prefix='codejail-')
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # A process group of its own, so anything it starts is killed along with it.
+        os.setsid()
+        os.close(read_end)
+        os.close(host_in)
+        os.close(host_out)
+        try:
+            result = {'globals': run_script(request, tmpdir)}
+        except BaseException:
+            result = {'error': traceback.format_exc()}
+        data = json.dumps(result)
+        data = struct.pack('>I', len(data)) + data
+        while data:
+            data = data[os.write(write_end, data):]
+        os._exit(0)
+
+    os.close(write_end)
+    # Read the child's result. Processes it started may hold the pipe open too,
+    # so stop as soon as the whole result is in rather than waiting for EOF.
+    data = ''
+    deadline = time.time() + request['realtime']
+    while len(data) < 4 or len(data) < 4 + struct.unpack('>I', data[:4])[0]:
+        timeout = deadline - time.time()
+        if timeout <= 0 or not select.select([read_end], [], [], timeout)[0]:
+            data = None
+            break
+        chunk = os.read(read_end, 65536)
+        if not chunk:
+            data = ''
+            break
+        data += chunk
+    os.close(read_end)
+    # Kill whatever is left of the script's process group before reaping the
+    # child, while its pid can't have been reused.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    __, status = os.waitpid(pid, 0)
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if data is None:
+        result = {'error': 'Timed out'}
+    elif not data:
+        result = {'error': 'Killed by signal %%d' %% os.WTERMSIG(status)}
+    else:
+        result = json.loads(data[4:])
+    data = json.dumps(result)
+    data = struct.pack('>I', len(data)) + data
+    while data:
+        data = data[os.write(host_out, data):]
+"""
+
+# How much longer than a script's own time limit to wait for its sandbox to answer
+SANDBOX_GRACE_TIME = 5
+
+
+class SandboxError(Exception):
+    """
+    A sandbox failed, or the pool had no sandbox to spare.
+    """
+    pass
+
+
+class Sandbox(object):
+    """
+    A sandboxed interpreter that runs scripts in forked children.
+
+    `command` is the command line of the Python interpreter to run, by default
+    the one codejail is configured with, as codejail's sandbox user.
+    """
+    def __init__(self, command=None, preload=()):
+        if command is None:
+            python = jail_code.COMMANDS['python']
+            command = []
+            if python.get('user'):
+                command.extend(['sudo', '-u', python['user']])
+            command.extend(python['cmdline_start'])
+        self.runs = 0
+        self._devnull = open(os.devnull, 'wb')
+        self._process = subprocess.Popen(
+            command + ['-c', SANDBOX_CODE % {'preload': list(preload)}],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._devnull, close_fds=True,
+        )
+
+    @property
+    def alive(self):
+        """
+        Whether the sandbox can still run scripts.
+        """
+        return self._process.poll() is None
+
+    def run(self, code, globals_dict, python_path=None, extra_files=None, slug=None):
+        """
+        Run `code` with `globals_dict` like codejail's safe_exec does.
+
+        Raise SafeExecException if the code raises an exception, and
+        SandboxError if the sandbox fails.
+        """
+        limits = getattr(jail_code, 'LIMITS', {})
+        cpu = limits.get('CPU') or 0
+        request = {
+            'code': code,
+            'globals': json_safe(globals_dict),
+            'files': _sandbox_files(python_path, extra_files),
+            'python_path': [os.path.basename(path) for path in python_path or ()],
+            'cpu': cpu,
+            'vmem': limits.get('VMEM') or 0,
+            'realtime': limits.get('REALTIME') or max(cpu * 3, 1),
+        }
+        self.runs += 1
+        try:
+            self._send(request)
+            result = self._receive(request['realtime'] + SANDBOX_GRACE_TIME)
+        except (IOError, OSError, ValueError) as err:
+            self.close()
+            raise SandboxError(u"Sandbox failed running {}: {}".format(slug, err))
+
+        if 'error' in result:
+            raise SafeExecException("Couldn't execute jailed code: {}".format(result['error']))
+        globals_dict.update(result['globals'])
+
+    def close(self):
+        """
+        Stop the sandbox.
+        """
+        if self.alive:
+            self._process.kill()
+            self._process.wait()
+        self._devnull.close()
+
+    def _send(self, message):
+        """
+        Write `message` to the sandbox.
+        """
+        data = json.dumps(message)
+        self._process.stdin.write(struct.pack('>I', len(data)) + data)
+        self._process.stdin.flush()
+
+    def _receive(self, timeout):
+        """
+        Read the next message from the sandbox, waiting at most `timeout` seconds.
+        """
+        deadline = time.time() + timeout
+        header = self._read(4, deadline)
+        return json.loads(self._read(struct.unpack('>I', header)[0], deadline))
+
+    def _read(self, size, deadline):
+        """
+        Read `size` bytes from the sandbox before `deadline`.
+        """
+        stdout = self._process.stdout.fileno()
+        data = ''
+        while len(data) < size:
+            timeout = deadline - time.time()
+            if timeout <= 0 or not select.select([stdout], [], [], timeout)[0]:
+                raise IOError("Timed out waiting for the sandbox")
+            chunk = os.read(stdout, size - len(data))
+            if not chunk:
+                raise IOError("The sandbox exited")
+            data += chunk
+        return data
+
+
+def _sandbox_files(python_path, extra_files):
+    """
+    Return the (name, base64 contents) pairs of the files a script needs in
+    its directory: `extra_files`, and the files and directories on
+    `python_path` that aren't among them.
+    """
+    files = [(name, base64.b64encode(contents)) for name, contents in extra_files or ()]
+    extra_names = set(name for name, __ in files)
+    for path in python_path or ():
+        if path in extra_names:
+            continue
+        if os.path.isdir(path):
+            base = os.path.dirname(path.rstrip('/'))
+            for dirpath, __, filenames in os.walk(path):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    with open(full_path, 'rb') as source:
+                        files.append((os.path.relpath(full_path, base), base64.b64encode(source.read())))
+        elif os.path.isfile(path):
+            with open(path, 'rb') as source:
+                files.append((os.path.basename(path), base64.b64encode(source.read())))
+    return files
+
+
+class SandboxPool(object):
+    """
+    At most `size` sandboxes, each recycled after running `max_runs` scripts.
+
+    Sandboxes are started when they are first needed, separately in each
+    process, since a forked process can't share its parent's.
+    """
+    def __init__(self, size=4, max_runs=100, command=None, preload=()):
+        self.size = size
+        self.max_runs = max_runs
+        self.command = command
+        self.preload = preload
+
+        self._idle = []
+        self._count = 0
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def sandbox(self, timeout=None):
+        """
+        Lend a sandbox from the pool, waiting at most `timeout` seconds for one
+        to be free, and take it back afterwards.
+        """
+        sandbox = self._get(timeout)
+        try:
+            yield sandbox
+        finally:
+            self._put(sandbox)
+
+    def safe_exec(self, code, globals_dict, python_path=None, extra_files=None, slug=None):
+        """
+        Run `code` in one of the pool's sandboxes, or through codejail if that
+        doesn't work out. Takes the same arguments as codejail's safe_exec.
+
+        Scripts don't wait for a sandbox when they're all busy; they run
+        through codejail, as they would without the pool.
+        """
+        try:
+            with self.sandbox(timeout=0) as sandbox:
+                sandbox.run(code, globals_dict, python_path=python_path, extra_files=extra_files, slug=slug)
+        except SandboxError:
+            log.warning(u"Running %s through codejail, not a warm sandbox", slug, exc_info=True)
+            dog_stats_api.increment('capa.safe_exec.sandbox_pool.fallback')
+            codejail_safe_exec(code, globals_dict, python_path=python_path, extra_files=extra_files, slug=slug)
+        else:
+            dog_stats_api.increment('capa.safe_exec.sandbox_pool.run')
+
+    def close(self):
+        """
+        Stop the sandboxes that aren't in use.
+        """
+        with self._condition:
+            for sandbox in self._idle:
+                sandbox.close()
+            self._count -= len(self._idle)
+            self._idle = []
+
+    def _get(self, timeout):
+        """
+        Return an idle sandbox, or a new one if the pool isn't full.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            if self._pid != os.getpid():
+                # The sandboxes belong to the parent process
+                self._idle = []
+                self._count = 0
+                self._pid = os.getpid()
+            while not self._idle and self._count >= self.size:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise SandboxError("No sandbox is free")
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._count += 1
+        try:
+            return Sandbox(self.command, self.preload)
+        except (IOError, OSError) as err:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise SandboxError(u"Couldn't start a sandbox: {}".format(err))
+
+    def _put(self, sandbox):
+        """
+        Take `sandbox` back, stopping it if it's done enough runs.
+        """
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            if sandbox.alive and sandbox.runs < self.max_runs:
+                self._idle.append(sandbox)
+            else:
+                sandbox.close()
+                self._count -= 1
+            self._condition.notify()
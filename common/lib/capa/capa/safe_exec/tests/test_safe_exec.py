@@ -9,7 +9,8 @@ import unittest
 
 from nose.plugins.skip import SkipTest
 
-from capa.safe_exec import safe_exec, update_hash
+from capa.safe_exec import safe_exec, update_hash, LocalCache
+from capa.safe_exec.safe_exec import cache_key
 from codejail.safe_exec import SafeExecException
 from codejail.jail_code import is_configured
 
@@ -177,6 +178,82 @@ class TestSafeExecCaching(unittest.TestCase):
                 self.fail("Tried executing code with non-ASCII unicode: {0}".format(code))
 
 
+class TestLocalCache(unittest.TestCase):
+    """Test the in-process tier of safe_exec caching."""
+
+    def test_local_hit(self):
+        shared = {}
+        cache = LocalCache(DictCache(shared))
+        g = {}
+        safe_exec("a = int(math.pi)", g, cache=cache)
+        self.assertEqual(len(shared), 1)
+
+        # Later runs are answered locally, without asking the shared cache.
+        shared[shared.keys()[0]] = (None, {'a': 17})
+        g = {}
+        safe_exec("a = int(math.pi)", g, cache=cache)
+        self.assertEqual(g['a'], 3)
+
+    def test_shared_hit(self):
+        shared = {}
+        safe_exec("a = int(math.pi)", {}, cache=DictCache(shared))
+        shared[shared.keys()[0]] = (None, {'a': 17})
+
+        # Another process finds the result in the shared cache.
+        g = {}
+        safe_exec("a = int(math.pi)", g, cache=LocalCache(DictCache(shared)))
+        self.assertEqual(g['a'], 17)
+
+    def test_results_are_copied(self):
+        cache = LocalCache(DictCache({}))
+        cache.set('key', (None, {'a': [1]}))
+        cache.get('key')[1]['a'].append(2)
+        self.assertEqual(cache.get('key'), (None, {'a': [1]}))
+
+    def test_lru_eviction(self):
+        cache = LocalCache(DictCache({}), max_size=2)
+        cache.set('a', (None, {}))
+        cache.set('b', (None, {}))
+        # Reading 'a' makes 'b' the least recently used
+        cache.get('a')
+        cache.set('c', (None, {}))
+
+        cache.cache = DictCache({})
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+
+class TestCacheKey(unittest.TestCase):
+    """Test the keys safe_exec results are cached under."""
+
+    def test_simple_globals(self):
+        key = cache_key("a = seed", {'seed': 1, 'anonymous_student_id': 'x'}, 1)
+        self.assertEqual(key, cache_key("a = seed", {'anonymous_student_id': 'x', 'seed': 1}, 1))
+        self.assertNotEqual(key, cache_key("a = seed", {'seed': 2, 'anonymous_student_id': 'x'}, 1))
+        self.assertNotEqual(key, cache_key("a = seed", {'seed': 1, 'anonymous_student_id': 'x'}, 2))
+        self.assertNotEqual(key, cache_key("a = seed + 1", {'seed': 1, 'anonymous_student_id': 'x'}, 1))
+
+    def test_extra_files(self):
+        key = cache_key("a = 1", {}, 1, ["python_lib.zip"], [("python_lib.zip", "zip v1")])
+        self.assertEqual(key, cache_key("a = 1", {}, 1, ["python_lib.zip"], [("python_lib.zip", "zip v1")]))
+        self.assertNotEqual(key, cache_key("a = 1", {}, 1, ["python_lib.zip"], [("python_lib.zip", "zip v2")]))
+        self.assertNotEqual(key, cache_key("a = 1", {}, 1))
+
+    def test_nested_globals(self):
+        d1 = {k: 1 for k in "abcdefghijklmnopqrstuvwxyz"}
+        d2 = dict(d1)
+        for i in xrange(10000):
+            d2[i] = 1
+        for i in xrange(10000):
+            del d2[i]
+        self.assertNotEqual(d1.keys(), d2.keys())
+
+        key = cache_key("a = 1", {'submission': [d1]}, 1)
+        self.assertEqual(key, cache_key("a = 1", {'submission': [d2]}, 1))
+        self.assertNotEqual(key, cache_key("a = 1", {'submission': [d1, d2]}, 1))
+
+
 class TestUpdateHash(unittest.TestCase):
     """Test the safe_exec.update_hash function to be sure it canonicalizes properly."""
 
@@ -0,0 +1,116 @@
+"""Test sandbox_pool.py"""
+
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+
+from mock import patch
+
+from capa.safe_exec.sandbox_pool import SandboxPool, SandboxError
+from codejail.safe_exec import SafeExecException
+
+# Run the sandboxes with this interpreter, so the tests don't need codejail set up.
+COMMAND = [sys.executable, '-E', '-B']
+
+
+class TestSandboxPool(unittest.TestCase):
+    def setUp(self):
+        super(TestSandboxPool, self).setUp()
+        self.pool = SandboxPool(size=1, max_runs=2, command=COMMAND, preload=['math'])
+        self.addCleanup(self.pool.close)
+
+    def test_run(self):
+        g = {'x': 2}
+        with self.pool.sandbox() as sandbox:
+            sandbox.run("import math\ny = x * int(math.pi)", g)
+        self.assertEqual(g['y'], 6)
+
+    def test_extra_files(self):
+        g = {}
+        with self.pool.sandbox() as sandbox:
+            sandbox.run(
+                "import mymodule\na = mymodule.a\nb = open('data.txt').read()", g,
+                python_path=['mylib'], extra_files=[('mylib/mymodule.py', 'a = 17\n'), ('data.txt', 'data')]
+            )
+        self.assertEqual(g['a'], 17)
+        self.assertEqual(g['b'], 'data')
+
+    def test_raising_exceptions(self):
+        with self.pool.sandbox() as sandbox:
+            with self.assertRaises(SafeExecException) as cm:
+                sandbox.run("1/0", {})
+            self.assertIn("ZeroDivisionError", cm.exception.message)
+
+            # The sandbox is still usable
+            g = {}
+            sandbox.run("a = 1", g)
+            self.assertEqual(g['a'], 1)
+
+    def test_runs_dont_share_state(self):
+        g = {}
+        with self.pool.sandbox() as sandbox:
+            sandbox.run("import math\nmath.pi = 3", {})
+            sandbox.run("import math\npi = math.pi", g)
+        self.assertNotEqual(g['pi'], 3)
+
+    def test_no_processes_outlive_a_run(self):
+        marker = os.path.join(tempfile.mkdtemp(), 'marker')
+        self.addCleanup(shutil.rmtree, os.path.dirname(marker))
+        code = textwrap.dedent("""\
+            import os, time
+            try:
+                pid = os.fork()
+            except OSError:
+                pid = -1
+            if pid == 0:
+                time.sleep(1)
+                open(%r, 'w').close()
+                os._exit(0)
+        """) % marker
+        with self.pool.sandbox() as sandbox:
+            try:
+                sandbox.run(code, {})
+            except SafeExecException:
+                pass
+        # The fork was refused, or killed along with the script
+        time.sleep(1.5)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_output_is_ignored(self):
+        g = {}
+        with self.pool.sandbox() as sandbox:
+            sandbox.run("import sys\nprint 'hello'\nsys.stdout.write('x' * 10)\na = 1", g)
+            sandbox.run("b = 2", g)
+        self.assertEqual((g['a'], g['b']), (1, 2))
+
+    def test_recycling(self):
+        with self.pool.sandbox() as sandbox:
+            sandbox.run("a = 1", {})
+            sandbox.run("a = 1", {})
+        # The sandbox had done its runs, so the next one is a new one
+        with self.pool.sandbox() as new_sandbox:
+            self.assertIsNot(new_sandbox, sandbox)
+            self.assertFalse(sandbox.alive)
+
+    def test_size_limit(self):
+        with self.pool.sandbox():
+            with self.assertRaises(SandboxError):
+                with self.pool.sandbox(timeout=0):
+                    pass
+
+    def test_falls_back_to_codejail(self):
+        with patch('capa.safe_exec.sandbox_pool.codejail_safe_exec') as mock_safe_exec:
+            with self.pool.sandbox():
+                # The only sandbox is busy
+                self.pool.safe_exec("a = 1", {})
+            self.assertTrue(mock_safe_exec.called)
+
+            mock_safe_exec.reset_mock()
+            g = {}
+            self.pool.safe_exec("a = 1", g)
+            self.assertFalse(mock_safe_exec.called)
+            self.assertEqual(g['a'], 1)
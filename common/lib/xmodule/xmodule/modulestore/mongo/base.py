@@ -15,7 +15,6 @@ structure:
 import pymongo
 import sys
 import logging
-import copy
 import re
 from uuid import uuid4
 
@@ -453,9 +452,16 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
                  i18n_service=None,
                  fs_service=None,
                  retry_wait_time=0.1,
+                 incremental_inheritance_refresh=False,
+                 prefetch_course_descendents=False,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param incremental_inheritance_refresh: whether updating an item only recomputes the part of the
+            cached metadata inheritance tree below it, rather than the whole tree. Concurrent updates to
+            one course can then leave the cached tree stale until the next full refresh.
+        :param prefetch_course_descendents: whether loading a course with all its descendents (depth=None)
+            fetches every item in the course in one query, rather than one query per level of the course.
         """
 
         super(MongoModuleStore, self).__init__(contentstore=contentstore, **kwargs)
@@ -507,6 +513,8 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
         self.fs_service = fs_service
 
         self._course_run_cache = {}
+        self.incremental_inheritance_refresh = incremental_inheritance_refresh
+        self.prefetch_course_descendents = prefetch_course_descendents
 
     def close_connections(self):
         """
@@ -569,20 +577,20 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             return location.replace(revision=MongoRevisionKey.draft)
         return location.replace(revision=MongoRevisionKey.published)
 
-    def _compute_metadata_inheritance_tree(self, course_id):
-        '''
-        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
-        '''
-        # get all collections in the course, this query should not return any leaf nodes
+    def _find_inheritance_records(self, course_id, **query_fields):
+        """
+        Return a dict mapping the url of each container in the course which matches `query_fields`
+        to its children and inheritable metadata, merging the draft and published versions of each
+        container, and the url of the course if it matched.
+        """
         # note this is a bit ugly as when we add new categories of containers, we have to add it here
-
-        course_id = self.fill_in_run(course_id)
         query = SON([
             ('_id.tag', 'i4x'),
             ('_id.org', course_id.org),
             ('_id.course', course_id.course),
             ('_id.category', {'$in': BLOCK_TYPES_WITH_CHILDREN})
         ])
+        query.update(query_fields)
         # we just want the Location, children, and inheritable metadata
         record_filter = {'_id': 1, 'definition.children': 1}
 
@@ -617,31 +625,107 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             if location.category == 'course':
                 root = location_url
 
-        # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
+        return results_by_url, root
 
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
+    @classmethod
+    def _inherit_metadata_down(cls, results_by_url, url, my_metadata, metadata_to_inherit):
+        """
+        Record in metadata_to_inherit what each descendant of the container at url inherits, given
+        the container's own metadata merged with what it inherits (my_metadata).
+
+        Containers without any inheritable metadata of their own share their parent's dict rather
+        than copying it, so the dicts in the tree must not be changed once it's computed.
+        """
+        # go through all the children and recurse, but only if we have
+        # in the result set. Remember results will not contain leaf nodes
+        for child in results_by_url[url].get('definition', {}).get('children', []):
+            if child in results_by_url:
+                child_metadata = results_by_url[child].get('metadata', {})
+                if child_metadata:
+                    new_child_metadata = dict(my_metadata)
+                    new_child_metadata.update(child_metadata)
                 else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata
+                    new_child_metadata = my_metadata
+                metadata_to_inherit[child] = new_child_metadata
+                cls._inherit_metadata_down(results_by_url, child, new_child_metadata, metadata_to_inherit)
+            else:
+                # this is likely a leaf node, so let's record what metadata we need to inherit
+                metadata_to_inherit[child] = my_metadata
 
+    def _compute_metadata_inheritance_tree(self, course_id):
+        '''
+        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+        '''
+        # get all collections in the course, this query should not return any leaf nodes
+        course_id = self.fill_in_run(course_id)
+        results_by_url, root = self._find_inheritance_records(course_id)
+
+        # now traverse the tree and compute down the inherited metadata
+        metadata_to_inherit = {}
         if root is not None:
-            _compute_inherited_metadata(root)
+            self._inherit_metadata_down(
+                results_by_url, root, results_by_url[root].get('metadata', {}), metadata_to_inherit
+            )
+
+        return metadata_to_inherit
+
+    def _compute_metadata_inheritance_subtree(self, location, tree):
+        """
+        Return a copy of the metadata inheritance tree of location's course with the entries for
+        the container at location and its descendants recomputed, or None if the whole tree
+        needs recomputing.
+
+        Only the containers in the subtree are queried, one query per level of the subtree.
+        """
+        course_id = self.fill_in_run(location.course_key)
+        location = as_published(location)
+        url = unicode(location)
+        if location.category == 'course' or url not in tree:
+            # new containers, and changes to the course's own metadata, affect the whole tree
+            return None
 
+        # find what the container inherits from its parent
+        parent = self._get_raw_parent_location(location, ModuleStoreEnum.RevisionOption.draft_preferred)
+        if parent is None:
+            return None
+        parent_url = unicode(as_published(parent))
+        if parent_url in tree:
+            inherited_metadata = tree[parent_url]
+        elif parent.category == 'course':
+            # the course isn't in the tree, so get its metadata directly
+            course_records, __ = self._find_inheritance_records(course_id, **{'_id.name': parent.name})
+            if parent_url not in course_records:
+                return None
+            inherited_metadata = course_records[parent_url].get('metadata', {})
+        else:
+            return None
+
+        # get the containers in the subtree a level at a time
+        results_by_url = {}
+        level = {url}
+        while level:
+            records, __ = self._find_inheritance_records(
+                course_id,
+                **{'_id.name': {'$in': list({
+                    course_id.make_usage_key_from_deprecated_string(level_url).name for level_url in level
+                })}}
+            )
+            records = {record_url: record for record_url, record in records.iteritems() if record_url in level}
+            results_by_url.update(records)
+            level = {
+                child
+                for record in records.itervalues()
+                for child in record.get('definition', {}).get('children', [])
+                if child not in results_by_url
+            }
+        if url not in results_by_url:
+            return None
+
+        my_metadata = dict(inherited_metadata)
+        my_metadata.update(results_by_url[url].get('metadata', {}))
+        metadata_to_inherit = dict(tree)
+        metadata_to_inherit[url] = my_metadata
+        self._inherit_metadata_down(results_by_url, url, my_metadata, metadata_to_inherit)
         return metadata_to_inherit
 
     def _get_cached_metadata_inheritance_tree(self, course_id, force_refresh=False):
@@ -676,6 +760,14 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
         # now populate a request_cache, if available. NOTE, we are outside of the
         # scope of the above if: statement so that after a memcache hit, it'll get
         # put into the request_cache
+        self._set_request_cached_metadata_inheritance_tree(course_id, tree)
+
+        return tree
+
+    def _set_request_cached_metadata_inheritance_tree(self, course_id, tree):
+        """
+        Put the metadata inheritance tree of the course in the request cache, if available.
+        """
         if self.request_cache is not None:
             # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
             # defined
@@ -683,20 +775,36 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
                 self.request_cache.data['metadata_inheritance'] = {}
             self.request_cache.data['metadata_inheritance'][unicode(course_id)] = tree
 
-        return tree
-
-    def refresh_cached_metadata_inheritance_tree(self, course_id, runtime=None):
+    def refresh_cached_metadata_inheritance_tree(self, course_id, runtime=None, location=None):
         """
         Refresh the cached metadata inheritance tree for the org/course combination
         for location
 
         If given a runtime, it replaces the cached_metadata in that runtime. NOTE: failure to provide
         a runtime may mean that some objects report old values for inherited data.
+
+        If incremental_inheritance_refresh is on and given the location of the only item whose
+        metadata or children changed, only the part of the cached tree below that item is
+        recomputed.
         """
         course_id = course_id.for_branch(None)
         if not self._is_in_bulk_operation(course_id):
-            # below is done for side effects when runtime is None
-            cached_metadata = self._get_cached_metadata_inheritance_tree(course_id, force_refresh=True)
+            cached_metadata = None
+            if self.incremental_inheritance_refresh and location is not None:
+                if location.category not in BLOCK_TYPES_WITH_CHILDREN:
+                    # the tree only depends on the metadata and children of containers
+                    return
+                cached_metadata = self._compute_metadata_inheritance_subtree(
+                    location, self._get_cached_metadata_inheritance_tree(course_id)
+                )
+                if cached_metadata is not None:
+                    if self.metadata_inheritance_cache_subsystem is not None:
+                        self.metadata_inheritance_cache_subsystem.set(unicode(course_id), cached_metadata)
+                    self._set_request_cached_metadata_inheritance_tree(course_id, cached_metadata)
+
+            if cached_metadata is None:
+                # below is done for side effects when runtime is None
+                cached_metadata = self._get_cached_metadata_inheritance_tree(course_id, force_refresh=True)
             if runtime:
                 runtime.cached_metadata = cached_metadata
 
@@ -720,18 +828,58 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
         }
         return list(self.collection.find(query))
 
+    @autoretry_read()
+    def _query_course_for_cache_children(self, course_key):
+        """
+        Return a dict mapping the url of each item in the course to its payload, fetched in a
+        single query, for prefetching the descendents of a course
+        """
+        query = self._course_key_to_son(course_key)
+        query['_id.revision'] = MongoRevisionKey.published
+        return {
+            unicode(Location._from_deprecated_son(item['_id'], course_key.run)): item
+            for item in self.collection.find(query)
+        }
+
+    def _prefetch_children(self, course_key, items):
+        """
+        Returns a dictionary mapping Location -> item data for items and all their descendents,
+        like _cache_children with a depth of None, but loading every item in the course in one
+        query and finding the descendents in memory.
+        """
+        items_by_url = self._query_course_for_cache_children(course_key)
+        data = {}
+        seen = set()
+        to_process = list(items)
+        while to_process:
+            item = to_process.pop()
+            self._clean_item_data(item)
+            data[Location._from_deprecated_son(item['location'], course_key.run)] = item
+            for child in item.get('definition', {}).get('children', []):
+                if child in items_by_url and child not in seen:
+                    seen.add(child)
+                    to_process.append(items_by_url[child])
+        return data
+
     def _cache_children(self, course_key, items, depth=0):
         """
         Returns a dictionary mapping Location -> item data, populated with json data
         for all descendents of items up to the specified depth.
         (0 = no descendents, 1 = children, 2 = grandchildren, etc)
         If depth is None, will load all the children.
-        This will make a number of queries that is linear in the depth.
+        This will make a number of queries that is linear in the depth, unless
+        prefetch_course_descendents is on and all of a course's descendents are wanted,
+        in which case it makes one.
         """
+        course_key = self.fill_in_run(course_key)
+        if (
+            depth is None and self.prefetch_course_descendents and
+            any(item['_id']['category'] == 'course' for item in items)
+        ):
+            return self._prefetch_children(course_key, items)
 
         data = {}
         to_process = list(items)
-        course_key = self.fill_in_run(course_key)
         while to_process and depth is None or depth >= 0:
             children = []
             for item in to_process:
@@ -1257,7 +1405,9 @@ class MongoModuleStore(ModuleStoreDraftAndPublished, ModuleStoreWriteBase, Mongo
             xblock._edit_info = payload['edit_info']
 
             # recompute (and update) the metadata inheritance tree which is cached
-            self.refresh_cached_metadata_inheritance_tree(xblock.scope_ids.usage_id.course_key, xblock.runtime)
+            self.refresh_cached_metadata_inheritance_tree(
+                xblock.scope_ids.usage_id.course_key, xblock.runtime, xblock.scope_ids.usage_id
+            )
             # fire signal that we've written to DB
         except ItemNotFoundError:
             if not allow_not_found:
@@ -787,6 +787,27 @@ class DraftModuleStore(MongoModuleStore):
 
         return queried_children
 
+    def _query_course_for_cache_children(self, course_key):
+        if self.get_branch_setting() != ModuleStoreEnum.Branch.draft_preferred:
+            return super(DraftModuleStore, self)._query_course_for_cache_children(course_key)
+
+        # get both the non-draft and draft content in a single round-trip
+        items_by_url = {}
+        drafts_by_url = {}
+        for item in self.collection.find(self._course_key_to_son(course_key)):
+            location = Location._from_deprecated_son(item["_id"], course_key.run)
+            if location.revision == MongoRevisionKey.draft:
+                drafts_by_url[unicode(as_published(location))] = item
+            else:
+                items_by_url[unicode(location)] = item
+
+        # as in _query_children_for_cache_children, drafts only replace the non-drafts that exist
+        for draft_url, draft in drafts_by_url.iteritems():
+            if draft_url in items_by_url:
+                items_by_url[draft_url] = draft
+
+        return items_by_url
+
     def has_published_version(self, xblock):
         """
         Returns True if this xblock has an existing published version regardless of whether the
@@ -2,6 +2,7 @@
 General utilities
 """
 
+import re
 from collections import namedtuple
 from contracts import contract, check
 from opaque_keys.edx.locator import BlockUsageLocator
@@ -21,3 +22,130 @@ class BlockKey(namedtuple('BlockKey', 'type id')):
 
 
 CourseEnvelope = namedtuple('CourseEnvelope', 'course_key structure')
+
+
+class StructureIndex(object):
+    """
+    Lookup tables over the blocks of a structure, each built the first time
+    it's needed.
+
+    A StructureIndex must only be used with a structure that won't change any
+    more: the tables are built from whichever copy of the structure is passed
+    to the first lookup that needs them.
+    """
+    # Table entries for the blocks whose value can't be looked up directly,
+    # and for every block with a value at all
+    UNHASHABLE = object()
+    ANY = object()
+
+    def __init__(self):
+        self._parents = None
+        self._block_types = None
+        self._block_ids = None
+        self._settings = {}
+
+    def parent(self, structure, block_key):
+        """
+        Return the BlockKey of the parent of `block_key` in `structure`, or
+        None if it has no parent.
+        """
+        if self._parents is None:
+            parents = {}
+            for parent_key, block in structure['blocks'].iteritems():
+                for child in block['fields'].get('children', []):
+                    parents[BlockKey(*child)] = parent_key
+            self._parents = parents
+        return self._parents.get(block_key)
+
+    def blocks_with_id(self, structure, block_id):
+        """
+        Return the BlockKeys of the blocks in `structure` whose block_id is
+        `block_id`.
+        """
+        if self._block_ids is None:
+            self._block_ids = self._build_table(structure, lambda block_key, block: [self.ANY, block_key.id])
+        return self._block_ids.get(block_id, [])
+
+    def candidates(self, structure, qualifiers, settings):
+        """
+        Return the BlockKeys of a subset of the blocks in `structure` that
+        includes every block that could match `qualifiers` and `settings`, as
+        interpreted by get_items, or None if no table narrows the search.
+        Callers must still check each candidate against the criteria.
+        """
+        if 'block_type' in qualifiers:
+            if self._block_types is None:
+                self._block_types = self._build_table(structure, lambda block_key, block: [self.ANY, block_key.type])
+            return self._lookup(self._block_types, qualifiers['block_type'])
+
+        best = None
+        for field_name, criteria in settings.iteritems():
+            if field_name not in self._settings:
+                self._settings[field_name] = self._build_table(structure, _setting_values(field_name))
+            block_keys = self._lookup(self._settings[field_name], criteria)
+            if best is None or len(block_keys) < len(best):
+                best = block_keys
+        return best
+
+    @staticmethod
+    def _build_table(structure, values):
+        """
+        Return a dict mapping each of the values returned by
+        `values(block_key, block)` for the blocks in `structure` to the keys
+        of the blocks with that value.
+        """
+        table = {}
+        for block_key, block in structure['blocks'].iteritems():
+            for value in set(values(block_key, block)):
+                table.setdefault(value, []).append(block_key)
+        return table
+
+    def _lookup(self, table, criteria):
+        """
+        Return the keys of the blocks in `table` that could match `criteria`,
+        which follows the rules of ModuleStoreRead._value_matches.
+        """
+        if isinstance(criteria, dict) and '$in' in criteria:
+            block_keys = set()
+            for test_val in criteria['$in']:
+                block_keys.update(self._lookup(table, test_val))
+            return list(block_keys)
+        if _is_hashable(criteria) and not callable(criteria) and not isinstance(criteria, re._pattern_type):  # pylint: disable=protected-access
+            block_keys = table.get(criteria, [])
+            if self.UNHASHABLE in table:
+                block_keys = list(set(block_keys).union(table[self.UNHASHABLE]))
+            return block_keys
+        return table.get(self.ANY, [])
+
+
+def _is_hashable(value):
+    """
+    Return whether `value` can be used as a dict key.
+    """
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _setting_values(field_name):
+    """
+    Return a function which returns the values under which a block should be
+    found in the lookup table of the settings field `field_name`. Blocks
+    whose field holds a list are found under each of its elements, as
+    get_items matches any one of them.
+    """
+    def values(block_key, block):  # pylint: disable=unused-argument
+        """
+        The values of `block` for the lookup table.
+        """
+        if field_name not in block['fields']:
+            return []
+        value = block['fields'][field_name]
+        elements = value if isinstance(value, list) else [value]
+        return [StructureIndex.ANY] + [
+            element if _is_hashable(element) else StructureIndex.UNHASHABLE
+            for element in elements
+        ]
+    return values
@@ -1,7 +1,9 @@
 """
 Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
 """
+import cPickle as pickle
 import re
+import threading
 from mongodb_proxy import autoretry_read, MongoProxy
 import pymongo
 import time
@@ -9,6 +11,7 @@ import time
 # Import this just to export it
 from pymongo.errors import DuplicateKeyError  # pylint: disable=unused-import
 
+from collections import OrderedDict
 from contracts import check
 from functools import wraps
 from pymongo.errors import AutoReconnect
@@ -69,17 +72,99 @@ def structure_to_mongo(structure):
     return new_structure
 
 
+class StructureCache(object):
+    """
+    A cache of structures, keyed by structure id.
+
+    Structures are never changed once they've been written, so entries never
+    have to be invalidated. They're kept pickled, both so that every `get`
+    returns a new copy that the caller is free to modify, and so that they can
+    also be stored in a shared cache (such as memcached) and used by other
+    processes.
+
+    The most recently used `max_size` structures are kept in this process. If
+    `cache_subsystem` (a Django cache) is given, it's used as a second tier.
+    """
+    DEFAULT_MAX_SIZE = 50
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, cache_subsystem=None):
+        self.max_size = max_size
+        self.cache_subsystem = cache_subsystem
+        self._pickled_structures = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(key):
+        """
+        Return the key for the structure with id `key` in the cache subsystem.
+        """
+        return u'split_mongo.structure.{}'.format(key)
+
+    def get(self, key):
+        """
+        Return a copy of the structure with id `key`, or None if it isn't cached.
+        """
+        with self._lock:
+            pickled_structure = self._pickled_structures.pop(key, None)
+            if pickled_structure is not None:
+                # Re-insert the entry to mark it as the most recently used
+                self._pickled_structures[key] = pickled_structure
+
+        if pickled_structure is None and self.cache_subsystem is not None:
+            pickled_structure = self.cache_subsystem.get(self._cache_key(key))
+            if pickled_structure is not None:
+                self._store_locally(key, pickled_structure)
+
+        if pickled_structure is None:
+            return None
+        return pickle.loads(pickled_structure)
+
+    def set(self, key, structure):
+        """
+        Cache `structure` (which must already have been converted by
+        `structure_from_mongo`) as the structure with id `key`.
+        """
+        pickled_structure = pickle.dumps(structure, pickle.HIGHEST_PROTOCOL)
+        self._store_locally(key, pickled_structure)
+        if self.cache_subsystem is not None:
+            self.cache_subsystem.set(self._cache_key(key), pickled_structure)
+
+    def delete(self, key):
+        """
+        Discard the structure with id `key` from the cache.
+        """
+        with self._lock:
+            self._pickled_structures.pop(key, None)
+        if self.cache_subsystem is not None:
+            self.cache_subsystem.delete(self._cache_key(key))
+
+    def _store_locally(self, key, pickled_structure):
+        """
+        Add `pickled_structure` to the in-process tier, evicting the least
+        recently used structures to keep it under `max_size`.
+        """
+        with self._lock:
+            self._pickled_structures.pop(key, None)
+            self._pickled_structures[key] = pickled_structure
+            while len(self._pickled_structures) > self.max_size:
+                self._pickled_structures.popitem(last=False)
+
+
 class MongoConnection(object):
     """
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
         self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
-        asset_collection=None, retry_wait_time=0.1, **kwargs
+        asset_collection=None, retry_wait_time=0.1, structure_cache=None, **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        structure_cache: A StructureCache for the structures read by get_structure,
+            or None to read them from the database every time
         """
+        self.structure_cache = structure_cache
         self.database = MongoProxy(
             pymongo.database.Database(
                 pymongo.MongoClient(
@@ -121,7 +206,15 @@ class MongoConnection(object):
         """
         Get the structure from the persistence mechanism whose id is the given key
         """
-        return structure_from_mongo(self.structures.find_one({'_id': key}))
+        if self.structure_cache is not None:
+            structure = self.structure_cache.get(key)
+            if structure is not None:
+                return structure
+
+        structure = structure_from_mongo(self.structures.find_one({'_id': key}))
+        if self.structure_cache is not None:
+            self.structure_cache.set(key, structure)
+        return structure
 
     @autoretry_read()
     def find_structures_by_id(self, ids):
@@ -172,6 +265,9 @@ class MongoConnection(object):
         """
         Insert a new structure into the database.
         """
+        if self.structure_cache is not None:
+            # Structures shouldn't be rewritten, but don't serve a stale copy if one is
+            self.structure_cache.delete(structure['_id'])
         self.structures.insert(structure_to_mongo(structure))
 
     def get_course_index(self, key, ignore_case=False):
@@ -75,10 +75,10 @@ from xmodule.modulestore import (
 
 from ..exceptions import ItemNotFoundError
 from .caching_descriptor_system import CachingDescriptorSystem
-from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection, DuplicateKeyError
-from xmodule.modulestore.split_mongo import BlockKey, CourseEnvelope
+from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection, StructureCache, DuplicateKeyError
+from xmodule.modulestore.split_mongo import BlockKey, CourseEnvelope, StructureIndex
 from xmodule.error_module import ErrorDescriptor
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from types import NoneType
 from xmodule.assetstore import AssetMetadata
 
@@ -569,25 +569,39 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
     # It won't recompute the value on operations such as update_course_index (e.g., to revert to a prev
     # version) but those functions will have an optional arg for setting these.
     SEARCH_TARGET_DICT = ['wiki_slug']
+    # The number of structures whose StructureIndexes are kept
+    STRUCTURE_INDEX_CACHE_SIZE = 50
 
     def __init__(self, contentstore, doc_store_config, fs_root, render_template,
                  default_class=None,
                  error_tracker=null_error_tracker,
                  i18n_service=None, fs_service=None,
-                 services=None, **kwargs):
+                 services=None, structure_cache_size=0, structure_cache_subsystem=None, **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_size: the number of structures to keep in this process's StructureCache
+        :param structure_cache_subsystem: an optional cache (e.g., a Django cache) in which to share
+            structures between processes. If neither this nor structure_cache_size is set, structures
+            aren't cached.
         """
 
         super(SplitMongoModuleStore, self).__init__(contentstore, **kwargs)
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        if structure_cache_size or structure_cache_subsystem is not None:
+            structure_cache = StructureCache(structure_cache_size, structure_cache_subsystem)
+        else:
+            structure_cache = None
+        self.db_connection = MongoConnection(structure_cache=structure_cache, **doc_store_config)
         self.db = self.db_connection.database
 
         # Code review question: How should I expire entries?
         # _add_cache could use a lru mechanism to control the cache size?
         self.thread_cache = threading.local()
 
+        # structure id -> StructureIndex, for the most recently used structures
+        self._structure_indexes = OrderedDict()
+        self._structure_indexes_lock = threading.Lock()
+
         if default_class is not None:
             module_path, __, class_name = default_class.rpartition('.')
             class_ = getattr(import_module(module_path), class_name)
@@ -977,35 +991,48 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             return []
 
         course = self._lookup_course(course_locator)
-        items = []
+        structure_index = self._get_structure_index(course_locator, course.structure)
         qualifiers = qualifiers.copy() if qualifiers else {}  # copy the qualifiers (destructively manipulated here)
 
-        def _block_matches_all(block_json):
+        def _matching_blocks(block_keys):
             """
-            Check that the block matches all the criteria
+            Return the keys of the blocks in `block_keys` that match all the criteria
             """
             # do the checks which don't require loading any additional data
-            if (
-                self._block_matches(block_json, qualifiers) and
-                self._block_matches(block_json.get('fields', {}), settings)
-            ):
-                if content:
-                    definition_block = self.get_definition(course_locator, block_json['definition'])
-                    return self._block_matches(definition_block.get('fields', {}), content)
-                else:
-                    return True
+            block_keys = [
+                block_key for block_key in block_keys
+                if self._block_matches(course.structure['blocks'][block_key], qualifiers) and
+                self._block_matches(course.structure['blocks'][block_key].get('fields', {}), settings)
+            ]
+            if content and block_keys:
+                # fetch the definitions of all the remaining blocks at once
+                definitions = {
+                    definition['_id']: definition
+                    for definition in self.get_definitions(
+                        course_locator,
+                        [course.structure['blocks'][block_key]['definition'] for block_key in block_keys]
+                    )
+                }
+                block_keys = [
+                    block_key for block_key in block_keys
+                    if self._block_matches(
+                        definitions[course.structure['blocks'][block_key]['definition']].get('fields', {}),
+                        content
+                    )
+                ]
+            return block_keys
 
         if settings is None:
             settings = {}
         if 'name' in qualifiers:
             # odd case where we don't search just confirm
             block_name = qualifiers.pop('name')
-            block_ids = []
-            for block_id, block in course.structure['blocks'].iteritems():
-                if block_name == block_id.id and _block_matches_all(block):
-                    block_ids.append(block_id)
+            if structure_index is not None:
+                block_ids = structure_index.blocks_with_id(course.structure, block_name)
+            else:
+                block_ids = [block_id for block_id in course.structure['blocks'] if block_name == block_id.id]
 
-            return self._load_items(course, block_ids, lazy=True, **kwargs)
+            return self._load_items(course, _matching_blocks(block_ids), lazy=True, **kwargs)
 
         if 'category' in qualifiers:
             qualifiers['block_type'] = qualifiers.pop('category')
@@ -1013,9 +1040,14 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
         # don't expect caller to know that children are in fields
         if 'children' in qualifiers:
             settings['children'] = qualifiers.pop('children')
-        for block_id, value in course.structure['blocks'].iteritems():
-            if _block_matches_all(value):
-                items.append(block_id)
+
+        # narrow the search down with the structure's indexes where the criteria allow
+        candidates = None
+        if structure_index is not None:
+            candidates = structure_index.candidates(course.structure, qualifiers, settings)
+        if candidates is None:
+            candidates = course.structure['blocks'].keys()
+        items = _matching_blocks(candidates)
 
         if len(items) > 0:
             return self._load_items(course, items, 0, lazy=True, **kwargs)
@@ -1035,7 +1067,11 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             raise ItemNotFoundError(locator)
 
         course = self._lookup_course(locator.course_key)
-        parent_id = self._get_parent_from_structure(BlockKey.from_usage_key(locator), course.structure)
+        structure_index = self._get_structure_index(locator.course_key, course.structure)
+        if structure_index is None:
+            parent_id = self._get_parent_from_structure(BlockKey.from_usage_key(locator), course.structure)
+        else:
+            parent_id = structure_index.parent(course.structure, BlockKey.from_usage_key(locator))
         if parent_id is None:
             return None
         return BlockUsageLocator.make_relative(
@@ -2560,6 +2596,27 @@ class SplitMongoModuleStore(SplitBulkWriteMixin, ModuleStoreWriteBase):
             'schema_version': self.SCHEMA_VERSION,
         }
 
+    def _get_structure_index(self, course_key, structure):
+        """
+        Return the StructureIndex for `structure`, which is shared by every
+        copy of that version of the structure. Return None if the structure
+        is being edited by an active bulk operation, since its blocks may
+        still change.
+        """
+        bulk_write_record = self._get_bulk_ops_record(course_key)
+        if bulk_write_record.active and structure['_id'] not in bulk_write_record.structures_in_db:
+            return None
+
+        with self._structure_indexes_lock:
+            structure_index = self._structure_indexes.pop(structure['_id'], None)
+            if structure_index is None:
+                structure_index = StructureIndex()
+            # (Re-)insert the index as the most recently used
+            self._structure_indexes[structure['_id']] = structure_index
+            while len(self._structure_indexes) > self.STRUCTURE_INDEX_CACHE_SIZE:
+                self._structure_indexes.popitem(last=False)
+        return structure_index
+
     @contract(block_key=BlockKey)
     def _get_parent_from_structure(self, block_key, structure):
         """
@@ -16,6 +16,7 @@ from uuid import uuid4
 from datetime import datetime
 from pytz import UTC
 import unittest
+from mock import patch
 from xblock.core import XBlock
 
 from xblock.fields import Scope, Reference, ReferenceList, ReferenceValueDict
@@ -39,7 +40,7 @@ from nose.tools import assert_in
 from xmodule.exceptions import NotFoundError
 from git.test.lib.asserts import assert_not_none
 from xmodule.x_module import XModuleMixin
-from xmodule.modulestore.mongo.base import as_draft
+from xmodule.modulestore.mongo.base import as_draft, as_published
 from xmodule.modulestore.tests.mongo_connection import MONGO_PORT_NUM, MONGO_HOST
 from xmodule.modulestore.edit_info import EditInfoMixin
 
@@ -624,6 +625,56 @@ class TestMongoModuleStore(TestMongoModuleStoreBase):
         self.assertEqual(component.published_on, published_date)
         self.assertEqual(component.published_by, published_by)
 
+    def test_compute_metadata_inheritance_subtree(self):
+        """
+        Test that recomputing the inheritance of one container's subtree matches the full computation
+        """
+        course_key = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+        tree = self.draft_store._compute_metadata_inheritance_tree(course_key)
+        chapter_location = Location('edX', 'toy', '2012_Fall', 'chapter', 'vertical_container')
+        chapter_url = unicode(chapter_location)
+        subtree_urls = []
+        stack = [self.draft_store.get_item(chapter_location, depth=None)]
+        while stack:
+            block = stack.pop()
+            subtree_urls.append(unicode(as_published(block.location)))
+            stack.extend(block.get_children())
+        self.assertGreater(len(subtree_urls), 1)
+
+        # Recomputing the chapter's subtree in a tree with stale entries for it fixes them
+        stale_tree = dict(tree)
+        for url in subtree_urls:
+            stale_tree[url] = {'graded': 'stale'}
+        self.assertEqual(self.draft_store._compute_metadata_inheritance_subtree(chapter_location, stale_tree), tree)
+        # The given tree isn't changed
+        self.assertEqual(stale_tree[chapter_url], {'graded': 'stale'})
+
+        # Changes to the course's own metadata need the whole tree recomputing
+        self.assertIsNone(
+            self.draft_store._compute_metadata_inheritance_subtree(course_key.make_usage_key('course', '2012_Fall'), tree)
+        )
+
+    def test_prefetch_course_descendents(self):
+        """
+        Test that prefetching a course's descendents in one query finds the same items as querying each level
+        """
+        course_key = SlashSeparatedCourseKey('edX', 'toy', '2012_Fall')
+        course_son = course_key.make_usage_key('course', '2012_Fall').to_deprecated_son()
+
+        def cache_children():
+            """
+            Return the data cache for the course and all its descendents
+            """
+            course_item = self.draft_store.collection.find_one({'_id': course_son})
+            return self.draft_store._cache_children(course_key, [course_item], depth=None)
+
+        expected = cache_children()
+        with patch.object(self.draft_store, 'prefetch_course_descendents', True):
+            with patch.object(self.draft_store, '_query_children_for_cache_children') as mock_query:
+                prefetched = cache_children()
+        self.assertFalse(mock_query.called)
+        self.assertEqual(prefetched, expected)
+
     def test_export_course_with_peer_component(self):
         """
         Test export course when link_to_location is given in peer grading interface settings.
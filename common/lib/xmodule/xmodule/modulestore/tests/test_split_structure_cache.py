@@ -0,0 +1,151 @@
+"""
+Tests of the caches and indexes of immutable split modulestore structures.
+"""
+import re
+import unittest
+
+from bson.objectid import ObjectId
+from mock import MagicMock
+
+from xmodule.modulestore.split_mongo import BlockKey, StructureIndex
+from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection, StructureCache
+
+
+class DictCache(dict):
+    """
+    A minimal stand-in for a Django cache.
+    """
+    def set(self, key, value):  # pylint: disable=arguments-differ
+        self[key] = value
+
+    def delete(self, key):
+        self.pop(key, None)
+
+
+class TestStructureCache(unittest.TestCase):
+    """
+    Tests of StructureCache.
+    """
+    def setUp(self):
+        super(TestStructureCache, self).setUp()
+        self.structure_id = ObjectId()
+        self.structure = {
+            '_id': self.structure_id,
+            'root': BlockKey('course', 'course'),
+            'blocks': {BlockKey('course', 'course'): {'fields': {'children': []}}},
+        }
+
+    def test_get_returns_copies(self):
+        cache = StructureCache()
+        cache.set(self.structure_id, self.structure)
+        first = cache.get(self.structure_id)
+        self.assertEqual(first, self.structure)
+
+        # Changing one copy doesn't change the cached structure
+        first['blocks'].clear()
+        self.assertEqual(cache.get(self.structure_id), self.structure)
+
+    def test_lru_eviction(self):
+        cache = StructureCache(max_size=2)
+        ids = [ObjectId() for __ in range(3)]
+        cache.set(ids[0], self.structure)
+        cache.set(ids[1], self.structure)
+        # Reading the first structure makes the second the least recently used
+        cache.get(ids[0])
+        cache.set(ids[2], self.structure)
+
+        self.assertIsNotNone(cache.get(ids[0]))
+        self.assertIsNone(cache.get(ids[1]))
+        self.assertIsNotNone(cache.get(ids[2]))
+
+    def test_shared_tier(self):
+        shared = DictCache()
+        StructureCache(cache_subsystem=shared).set(self.structure_id, self.structure)
+        # Another process's cache finds the structure in the shared tier
+        self.assertEqual(StructureCache(cache_subsystem=shared).get(self.structure_id), self.structure)
+
+    def test_get_structure_uses_cache(self):
+        connection = MongoConnection.__new__(MongoConnection)
+        connection.structure_cache = StructureCache()
+        connection.structures = MagicMock()
+        connection.structures.find_one.side_effect = lambda query: {
+            '_id': query['_id'],
+            'root': ['course', 'course'],
+            'blocks': [{'block_type': 'course', 'block_id': 'course', 'fields': {'children': []}}],
+        }
+
+        first = connection.get_structure(self.structure_id)
+        second = connection.get_structure(self.structure_id)
+        self.assertEqual(connection.structures.find_one.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+
+
+class TestStructureIndex(unittest.TestCase):
+    """
+    Tests of StructureIndex.
+    """
+    def setUp(self):
+        super(TestStructureIndex, self).setUp()
+        self.course = BlockKey('course', 'course')
+        self.chapter = BlockKey('chapter', 'chapter')
+        self.problem = BlockKey('problem', 'problem')
+        self.structure = {
+            'blocks': {
+                self.course: {'fields': {'children': [list(self.chapter)]}},
+                self.chapter: {'fields': {'children': [list(self.problem)]}},
+                self.problem: {'fields': {'tags': ['a', 'b'], 'display_name': 'Problem'}},
+            },
+        }
+
+    def test_parent(self):
+        structure_index = StructureIndex()
+        self.assertEqual(structure_index.parent(self.structure, self.problem), self.chapter)
+        self.assertEqual(structure_index.parent(self.structure, self.chapter), self.course)
+        self.assertIsNone(structure_index.parent(self.structure, self.course))
+
+    def test_built_once(self):
+        structure_index = StructureIndex()
+        structure_index.parent(self.structure, self.problem)
+        # Later lookups don't look at the structure's blocks again
+        self.assertEqual(structure_index.parent({'blocks': {}}, self.problem), self.chapter)
+
+    def test_blocks_with_id(self):
+        structure_index = StructureIndex()
+        self.assertEqual(structure_index.blocks_with_id(self.structure, 'chapter'), [self.chapter])
+        self.assertEqual(structure_index.blocks_with_id(self.structure, 'missing'), [])
+
+    def test_candidates_by_block_type(self):
+        structure_index = StructureIndex()
+        self.assertEqual(
+            structure_index.candidates(self.structure, {'block_type': 'problem'}, {}),
+            [self.problem]
+        )
+        self.assertItemsEqual(
+            structure_index.candidates(self.structure, {'block_type': {'$in': ['problem', 'chapter']}}, {}),
+            [self.problem, self.chapter]
+        )
+        # Criteria that can't be looked up return every block
+        self.assertItemsEqual(
+            structure_index.candidates(self.structure, {'block_type': re.compile('^pro')}, {}),
+            self.structure['blocks'].keys()
+        )
+
+    def test_candidates_by_setting(self):
+        structure_index = StructureIndex()
+        # Blocks with list values are found under each element
+        self.assertEqual(structure_index.candidates(self.structure, {}, {'tags': 'b'}), [self.problem])
+        self.assertEqual(structure_index.candidates(self.structure, {}, {'tags': 'c'}), [])
+        # Criteria that can't be looked up return the blocks which have the field set
+        self.assertEqual(
+            structure_index.candidates(self.structure, {}, {'display_name': lambda name: name.startswith('P')}),
+            [self.problem]
+        )
+        # Unhashable values are always candidates
+        self.assertItemsEqual(
+            structure_index.candidates(self.structure, {}, {'children': self.problem}),
+            [self.course, self.chapter]
+        )
+
+    def test_no_candidates_without_criteria(self):
+        self.assertIsNone(StructureIndex().candidates(self.structure, {}, {}))
@@ -0,0 +1,137 @@
+"""
+Cache of per-student course grade summaries, as computed by courseware.grades.grade.
+
+Each student's summary is stored under a (course, user) key, together with
+the version of the course content and the submissions API scores that it
+was computed from. A cached summary is only returned if both still match,
+so a course publish or a new ORA score makes it stale without any explicit
+invalidation. Changes to a student's StudentModule scores must call
+`invalidate_grade_summary`.
+
+Inside a request's transaction, a concurrent grade calculation can still read
+the old scores and cache them again before the change is committed, so
+GradeSummaryInvalidationMiddleware invalidates the summaries once more after
+TransactionMiddleware has committed.
+
+Caching is enabled with FEATURES['ENABLE_GRADE_SUMMARY_CACHE'].
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from courseware.grading_structure import course_content_version
+
+
+# The keys invalidated in this thread's uncommitted transaction
+_PENDING = threading.local()
+
+
+def _pending_keys():
+    """
+    Return the set of keys to invalidate again after the current transaction.
+    """
+    if not hasattr(_PENDING, 'keys'):
+        _PENDING.keys = set()
+    return _PENDING.keys
+
+
+def _cache_key(course_key, user_id):
+    """
+    Return the cache key for the grade summary of `user_id` in `course_key`.
+    """
+    return u'courseware.grade_summary.{}.{}'.format(course_key, user_id)
+
+
+def _submissions_digest(submissions_scores):
+    """
+    Return a digest of the scores a student has in the submissions API.
+    """
+    return hashlib.sha1(repr(sorted(submissions_scores.items()))).hexdigest()
+
+
+def _enabled():
+    """
+    Return True if grade summaries should be cached.
+    """
+    return settings.FEATURES.get('ENABLE_GRADE_SUMMARY_CACHE', False)
+
+
+def get_cached_grade_summary(course, user_id, submissions_scores):
+    """
+    Return the cached grade summary for `user_id` in `course`, or None if
+    there isn't an up to date one.
+
+    course: A CourseDescriptor
+    user_id: The id of the student
+    submissions_scores: The student's current scores from the submissions API
+    """
+    if not _enabled():
+        return None
+
+    content_version = course_content_version(course)
+    if content_version is None:
+        return None
+
+    cached = cache.get(_cache_key(course.id, user_id))
+    if cached is None:
+        return None
+
+    if cached['content_version'] != content_version:
+        return None
+    if cached['submissions_digest'] != _submissions_digest(submissions_scores):
+        return None
+
+    return cached['grade_summary']
+
+
+def cache_grade_summary(course, user_id, submissions_scores, grade_summary):
+    """
+    Store `grade_summary` as the grade summary for `user_id` in `course`.
+
+    Arguments are as for `get_cached_grade_summary`.
+    """
+    if not _enabled():
+        return
+
+    content_version = course_content_version(course)
+    if content_version is None:
+        return
+
+    cache.set(
+        _cache_key(course.id, user_id),
+        {
+            'content_version': content_version,
+            'submissions_digest': _submissions_digest(submissions_scores),
+            'grade_summary': grade_summary,
+        },
+        settings.GRADE_SUMMARY_CACHE_TIMEOUT
+    )
+
+
+def invalidate_grade_summary(course_key, user_id):
+    """
+    Discard any cached grade summary for `user_id` in `course_key`.
+
+    This must be called whenever one of the student's scores changes.
+    """
+    if not _enabled():
+        return
+
+    key = _cache_key(course_key, user_id)
+    cache.delete(key)
+    if transaction.is_managed():
+        _pending_keys().add(key)
+
+
+def invalidate_pending_grade_summaries():
+    """
+    Discard the grade summaries invalidated during the transaction that has
+    just been committed, in case they were cached again before it was.
+    """
+    keys = _pending_keys()
+    if keys:
+        cache.delete_many(list(keys))
+        keys.clear()
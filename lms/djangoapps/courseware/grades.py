@@ -1,6 +1,7 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
-from collections import defaultdict
+from collections import Counter, defaultdict
+from itertools import islice
 import json
 import random
 import logging
@@ -13,7 +14,9 @@ from django.test.client import RequestFactory
 import dogstats_wrapper as dog_stats_api
 
 from courseware import courses
-from courseware.model_data import FieldDataCache
+from courseware.grade_summary_cache import cache_grade_summary, get_cached_grade_summary
+from courseware.grading_structure import get_grading_structure
+from courseware.model_data import FieldDataCache, ScoresClient
 from student.models import anonymous_id_for_user
 from xmodule import graders
 from xmodule.graders import Score
@@ -27,6 +30,13 @@ from opaque_keys import InvalidKeyError
 
 log = logging.getLogger("edx.courseware")
 
+# The number of students whose stored scores are fetched together by
+# iterate_grades_for.
+GRADING_BATCH_SIZE = 100
+
+# The number of StudentModule rows read at a time by answer_distributions.
+ANSWER_DISTRIBUTION_CHUNK_SIZE = 1000
+
 
 def yield_dynamic_descriptor_descendents(descriptor, module_creator):
     """
@@ -51,7 +61,27 @@ def yield_dynamic_descriptor_descendents(descriptor, module_creator):
         yield next_descriptor
 
 
-def answer_distributions(course_key):
+def _iter_submitted_problem_chunks(course_key, chunk_size):
+    """
+    Yield lists of up to `chunk_size` (id, module_state_key, state) tuples for
+    the submitted problems in `course_key`.
+
+    Rows are read in primary key order, one range of ids at a time, so that no
+    query has to sort or hold the whole course's state in memory.
+    """
+    queryset = StudentModule.all_submitted_problems_read_only(course_key).order_by('id')
+    last_id = None
+    while True:
+        chunk_queryset = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        chunk = list(chunk_queryset.values_list('id', 'module_state_key', 'state')[:chunk_size].iterator())
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1][0]
+
+
+def answer_distributions(course_key, chunk_size=ANSWER_DISTRIBUTION_CHUNK_SIZE):
     """
     Given a course_key, return answer distributions in the form of a dictionary
     mapping:
@@ -78,80 +108,84 @@ def answer_distributions(course_key):
     not be aware of problems that are not visible to the user being used to
     generate the report.
 
+    The records are streamed `chunk_size` at a time, and answers are counted
+    by the raw module_state_key of their problem, so each problem is only
+    looked up in the modulestore once, after all of the records are read.
+
     This method will try to use a read-replica database if one is available.
     """
-    # dict: { module.module_state_key : (url_name, display_name) }
-    state_keys_to_problem_info = {}  # For caching, used by url_and_display_name
-
-    def url_and_display_name(usage_key):
-        """
-        For a given usage_key, return the problem's url and display_name.
-        Handle modulestore access and caching. This method ignores permissions.
-
-        Raises:
-            InvalidKeyError: if the usage_key does not parse
-            ItemNotFoundError: if there is no content that corresponds
-                to this usage_key.
-        """
-        problem_store = modulestore()
-        if usage_key not in state_keys_to_problem_info:
-            problem = problem_store.get_item(usage_key)
-            problem_info = (problem.url_name, problem.display_name_with_default)
-            state_keys_to_problem_info[usage_key] = problem_info
-
-        return state_keys_to_problem_info[usage_key]
-
-    # Iterate through all problems submitted for this course in no particular
-    # order, and build up our answer_counts dict that we will eventually return
-    answer_counts = defaultdict(lambda: defaultdict(int))
-    for module in StudentModule.all_submitted_problems_read_only(course_key):
-        try:
-            state_dict = json.loads(module.state) if module.state else {}
-            raw_answers = state_dict.get("student_answers", {})
-        except ValueError:
-            log.error(
-                "Answer Distribution: Could not parse module state for " +
-                "StudentModule id={}, course={}".format(module.id, course_key)
-            )
-            continue
+    # Count each (raw module_state_key, problem part id, answer) in one flat
+    # Counter while reading, rather than building nested dicts per row
+    raw_answer_counts = Counter()
+    for chunk in _iter_submitted_problem_chunks(course_key, chunk_size):
+        for module_id, module_state_key, state in chunk:
+            try:
+                state_dict = json.loads(state) if state else {}
+                raw_answers = state_dict.get("student_answers", {})
+            except ValueError:
+                log.error(
+                    "Answer Distribution: Could not parse module state for " +
+                    "StudentModule id={}, course={}".format(module_id, course_key)
+                )
+                continue
 
-        try:
-            url, display_name = url_and_display_name(module.module_state_key.map_into_course(course_key))
             # Each problem part has an ID that is derived from the
             # module.module_state_key (with some suffix appended)
-            for problem_part_id, raw_answer in raw_answers.items():
+            for problem_part_id, raw_answer in raw_answers.iteritems():
                 # Convert whatever raw answers we have (numbers, unicode, None, etc.)
                 # to be unicode values. Note that if we get a string, it's always
                 # unicode and not str -- state comes from the json decoder, and that
                 # always returns unicode for strings.
-                answer = unicode(raw_answer)
-                answer_counts[(url, display_name, problem_part_id)][answer] += 1
-
-        except (ItemNotFoundError, InvalidKeyError):
-            msg = "Answer Distribution: Item {} referenced in StudentModule {} " + \
-                  "for user {} in course {} not found; " + \
-                  "This can happen if a student answered a question that " + \
-                  "was later deleted from the course. This answer will be " + \
-                  "omitted from the answer distribution CSV."
-            log.warning(
-                msg.format(module.module_state_key, module.id, module.student_id, course_key)
-            )
+                raw_answer_counts[(module_state_key, problem_part_id, unicode(raw_answer))] += 1
+
+    # dict: { raw module_state_key : (url_name, display_name), or None if not found }
+    state_keys_to_problem_info = {}
+
+    def url_and_display_name(raw_module_state_key):
+        """
+        For a given raw module_state_key, return the problem's url and
+        display_name, or None if it can't be found. Handle modulestore access
+        and caching. This method ignores permissions.
+        """
+        if raw_module_state_key not in state_keys_to_problem_info:
+            try:
+                usage_key = StudentModule._meta.get_field('module_state_key').to_python(raw_module_state_key)
+                problem = modulestore().get_item(usage_key.map_into_course(course_key))
+                problem_info = (problem.url_name, problem.display_name_with_default)
+            except (ItemNotFoundError, InvalidKeyError):
+                msg = "Answer Distribution: Item {} referenced in StudentModules " + \
+                      "in course {} not found; " + \
+                      "This can happen if a student answered a question that " + \
+                      "was later deleted from the course. These answers will be " + \
+                      "omitted from the answer distribution CSV."
+                log.warning(msg.format(raw_module_state_key, course_key))
+                problem_info = None
+            state_keys_to_problem_info[raw_module_state_key] = problem_info
+
+        return state_keys_to_problem_info[raw_module_state_key]
+
+    answer_counts = defaultdict(lambda: defaultdict(int))
+    for (module_state_key, problem_part_id, answer), count in raw_answer_counts.iteritems():
+        problem_info = url_and_display_name(module_state_key)
+        if problem_info is None:
             continue
+        url, display_name = problem_info
+        answer_counts[(url, display_name, problem_part_id)][answer] += count
 
     return answer_counts
 
 
 @transaction.commit_manually
-def grade(student, request, course, keep_raw_scores=False):
+def grade(student, request, course, keep_raw_scores=False, scores_client=None):
     """
     Wraps "_grade" with the manual_transaction context manager just in case
     there are unanticipated errors.
     """
     with manual_transaction():
-        return _grade(student, request, course, keep_raw_scores)
+        return _grade(student, request, course, keep_raw_scores, scores_client)
 
 
-def _grade(student, request, course, keep_raw_scores):
+def _grade(student, request, course, keep_raw_scores, scores_client=None):
     """
     Unwrapped version of "grade"
 
@@ -169,10 +203,21 @@ def _grade(student, request, course, keep_raw_scores):
       make up the final grade. (For display)
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
+    - scores_client : a ScoresClient with the student's scores for the course
+      already fetched. If None, one is created (with a single query).
+
+    Unless keep_raw_scores is True, the result is read from and stored in the
+    grade summary cache (see courseware.grade_summary_cache). Courses with
+    blocks that always have to be regraded aren't cached, and neither are
+    random profiling scores.
+
+    The course is walked using its cached GradingStructure (see
+    courseware.grading_structure), so descriptors are only loaded for the
+    problems whose scores can't be read from the student's stored scores.
 
     More information on the format is in the docstring for CourseGrader.
     """
-    grading_context = course.grading_context
+    grading_structure = get_grading_structure(course)
     raw_scores = []
 
     # Dict of item_ids -> (earned, possible) point tuples. This *only* grabs
@@ -182,20 +227,37 @@ def _grade(student, request, course, keep_raw_scores):
         course.id.to_deprecated_string(), anonymous_id_for_user(student, course.id)
     )
 
+    use_grade_summary_cache = (
+        student.is_authenticated() and
+        not keep_raw_scores and
+        not settings.GENERATE_PROFILE_SCORES and
+        not grading_structure.always_recalculate_grades
+    )
+    if use_grade_summary_cache:
+        grade_summary = get_cached_grade_summary(course, student.id, submissions_scores)
+        if grade_summary is not None:
+            return grade_summary
+
+    # Load all of the student's StudentModule scores for this course up front,
+    # so that grading doesn't have to query once per section and problem.
+    if scores_client is None:
+        with manual_transaction():
+            scores_client = ScoresClient.create_for_course(course.id, student.id)
+
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
     # passed to the grader
-    for section_format, sections in grading_context['graded_sections'].iteritems():
+    for section_format, section_keys in grading_structure.graded_sections.iteritems():
         format_scores = []
-        for section in sections:
-            section_descriptor = section['section_descriptor']
-            section_name = section_descriptor.display_name_with_default
+        for section_key in section_keys:
+            section_name = grading_structure.blocks[section_key]['display_name']
+            scorable_keys = grading_structure.scorable_descendants(section_key)
 
             # some problems have state that is updated independently of interaction
             # with the LMS, so they need to always be scored. (E.g. foldit.,
             # combinedopenended)
             should_grade_section = any(
-                descriptor.always_recalculate_grades for descriptor in section['xmoduledescriptors']
+                grading_structure.blocks[usage_key]['always_recalculate_grades'] for usage_key in scorable_keys
             )
 
             # If there are no problems that always have to be regraded, check to
@@ -203,18 +265,12 @@ def _grade(student, request, course, keep_raw_scores):
             # API. If scores exist, we have to calculate grades for this section.
             if not should_grade_section:
                 should_grade_section = any(
-                    descriptor.location.to_deprecated_string() in submissions_scores
-                    for descriptor in section['xmoduledescriptors']
+                    usage_key.to_deprecated_string() in submissions_scores
+                    for usage_key in scorable_keys
                 )
 
             if not should_grade_section:
-                with manual_transaction():
-                    should_grade_section = StudentModule.objects.filter(
-                        student=student,
-                        module_state_key__in=[
-                            descriptor.location for descriptor in section['xmoduledescriptors']
-                        ]
-                    ).exists()
+                should_grade_section = any(usage_key in scores_client for usage_key in scorable_keys)
 
             # If we haven't seen a single problem in the section, we don't have
             # to grade it at all! We can assume 0%
@@ -229,11 +285,11 @@ def _grade(student, request, course, keep_raw_scores):
                         field_data_cache = FieldDataCache([descriptor], course.id, student)
                     return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
 
-                for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
-
-                    (correct, total) = get_score(
-                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores
-                    )
+                section_scores = _yield_section_scores(
+                    course, student, grading_structure, section_key, create_module,
+                    submissions_scores, scores_client
+                )
+                for (correct, total, graded, display_name) in section_scores:
                     if correct is None and total is None:
                         continue
 
@@ -243,12 +299,11 @@ def _grade(student, request, course, keep_raw_scores):
                         else:
                             correct = total
 
-                    graded = module_descriptor.graded
                     if not total > 0:
                         #We simply cannot grade a problem that is 12/0, because we might need it as a percentage
                         graded = False
 
-                    scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+                    scores.append(Score(correct, total, graded, display_name))
 
                 _, graded_total = graders.aggregate_scores(scores, section_name)
                 if keep_raw_scores:
@@ -262,7 +317,7 @@ def _grade(student, request, course, keep_raw_scores):
             else:
                 log.info(
                     "Unable to grade a section with a total possible score of zero. " +
-                    str(section_descriptor.location)
+                    str(section_key)
                 )
 
         totaled_scores[section_format] = format_scores
@@ -280,6 +335,8 @@ def _grade(student, request, course, keep_raw_scores):
         # way to get all RAW scores out to instructor
         # so grader can be double-checked
         grade_summary['raw_scores'] = raw_scores
+    if use_grade_summary_cache:
+        cache_grade_summary(course, student.id, submissions_scores, grade_summary)
     return grade_summary
 
 
@@ -352,6 +409,9 @@ def _progress_summary(student, request, course):
 
     submissions_scores = sub_api.get_scores(course.id.to_deprecated_string(), anonymous_id_for_user(student, course.id))
 
+    with manual_transaction():
+        scores_client = ScoresClient.create_for_course(course.id, student.id)
+
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
     for chapter_module in course_module.get_display_items():
@@ -375,7 +435,8 @@ def _progress_summary(student, request, course):
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
                     course_id = course.id
                     (correct, total) = get_score(
-                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores
+                        course_id, student, module_descriptor, module_creator,
+                        scores_cache=submissions_scores, scores_client=scores_client
                     )
                     if correct is None and total is None:
                         continue
@@ -407,7 +468,7 @@ def _progress_summary(student, request, course):
     return chapters
 
 
-def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None):
+def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None, scores_client=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -421,6 +482,9 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
            Can return None if user doesn't have access, or if something else went wrong.
     scores_cache: A dict of location names to (earned, possible) point tuples.
            If an entry is found in this cache, it takes precedence.
+    scores_client: A ScoresClient with the user's scores for the course already
+           fetched. If provided, stored scores are read from it instead of
+           querying StudentModule for this problem.
     """
     scores_cache = scores_cache or {}
 
@@ -447,18 +511,23 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if scores_client is not None:
+        score = scores_client.get(problem_descriptor.location)
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+        except StudentModule.DoesNotExist:
+            score = None
+        else:
+            score = ScoresClient.Score(student_module.grade, student_module.max_grade)
 
-    if student_module is not None and student_module.max_grade is not None:
-        correct = student_module.grade if student_module.grade is not None else 0
-        total = student_module.max_grade
+    if score is not None and score.total is not None:
+        correct = score.correct if score.correct is not None else 0
+        total = score.total
     else:
         # If the problem was not in the cache, or hasn't been graded yet,
         # we need to instantiate the problem.
@@ -476,10 +545,17 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
             return (None, None)
 
     # Now we re-weight the problem, if specified
-    weight = problem_descriptor.weight
+    return _weighted_score(correct, total, problem_descriptor.weight, problem_descriptor.location)
+
+
+def _weighted_score(correct, total, weight, location):
+    """
+    Return (correct, total) re-weighted so that total is `weight`, unless
+    `weight` is None.
+    """
     if weight is not None:
         if total == 0:
-            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(student_module))
+            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(location))
             return (correct, total)
         correct = correct * weight / total
         total = weight
@@ -487,6 +563,71 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
     return (correct, total)
 
 
+def _yield_section_scores(course, student, grading_structure, section_key, module_creator,
+                          submissions_scores, scores_client):
+    """
+    Yield (correct, total, graded, display_name) for the section `section_key`
+    and each of its descendants, in the order yield_dynamic_descriptor_descendents
+    visits them. (correct, total) is as returned by get_score.
+
+    Only blocks with dynamic children, and blocks whose scores can't be found
+    from `grading_structure` and the student's stored scores, are loaded from
+    the modulestore.
+    """
+    stack = [section_key]
+
+    while len(stack) > 0:
+        usage_key = stack.pop()
+        block = grading_structure.blocks[usage_key]
+
+        if block['has_dynamic_children']:
+            descriptor = modulestore().get_item(usage_key)
+            for module_descriptor in yield_dynamic_descriptor_descendents(descriptor, module_creator):
+                (correct, total) = get_score(
+                    course.id, student, module_descriptor, module_creator,
+                    scores_cache=submissions_scores, scores_client=scores_client
+                )
+                yield (correct, total, module_descriptor.graded, module_descriptor.display_name_with_default)
+            continue
+
+        stack.extend(block['children'])
+        (correct, total) = _get_block_score(
+            course, student, usage_key, block, module_creator, submissions_scores, scores_client
+        )
+        yield (correct, total, block['graded'], block['display_name'])
+
+
+def _get_block_score(course, student, usage_key, block, module_creator, submissions_scores, scores_client):
+    """
+    Return the score of the block `usage_key` as get_score would, using the
+    `block` data from a GradingStructure instead of its descriptor wherever
+    possible.
+    """
+    if not student.is_authenticated():
+        return (None, None)
+
+    location_url = usage_key.to_deprecated_string()
+    if location_url in submissions_scores:
+        return submissions_scores[location_url]
+
+    if not block['always_recalculate_grades']:
+        if not block['has_score']:
+            # These are not problems, and do not have a score
+            return (None, None)
+
+        score = scores_client.get(usage_key)
+        if score is not None and score.total is not None:
+            correct = score.correct if score.correct is not None else 0
+            return _weighted_score(correct, score.total, block['weight'], usage_key)
+
+    # The score has to come from an instance of the problem.
+    descriptor = modulestore().get_item(usage_key)
+    return get_score(
+        course.id, student, descriptor, module_creator,
+        scores_cache=submissions_scores, scores_client=scores_client
+    )
+
+
 @contextmanager
 def manual_transaction():
     """A context manager for managing manual transactions"""
@@ -500,11 +641,30 @@ def manual_transaction():
         transaction.commit()
 
 
-def iterate_grades_for(course_id, students):
+def _batches(iterable, batch_size):
+    """
+    Yield lists of up to `batch_size` items from `iterable`, without
+    materializing the whole iterable at once.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iterate_grades_for(course_id, students, batch_size=GRADING_BATCH_SIZE):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
     (student, gradeset, err_msg) for every student enrolled in the course.
 
+    Students are graded in batches of `batch_size`. The stored scores for a
+    whole batch are fetched with a few chunked queries up front, so grading a
+    student only instantiates XModules for problems whose score can't be read
+    from StudentModule (e.g. always_recalculate_grades problems, or problems
+    that have no max_grade recorded yet).
+
     If an error occurred, gradeset will be an empty dict and err_msg will be an
     exception message. If there was no error, err_msg is an empty string.
 
@@ -525,25 +685,32 @@ def iterate_grades_for(course_id, students):
     # grading that student.
     request = RequestFactory().get('/')
 
-    for student in students:
-        with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=[u'action:{}'.format(course_id)]):
-            try:
-                request.user = student
-                # Grading calls problem rendering, which calls masquerading,
-                # which checks session vars -- thus the empty session dict below.
-                # It's not pretty, but untangling that is currently beyond the
-                # scope of this feature.
-                request.session = {}
-                gradeset = grade(student, request, course)
-                yield student, gradeset, ""
-            except Exception as exc:  # pylint: disable=broad-except
-                # Keep marching on even if this student couldn't be graded for
-                # some reason, but log it for future reference.
-                log.exception(
-                    'Cannot grade student %s (%s) in course %s because of exception: %s',
-                    student.username,
-                    student.id,
-                    course_id,
-                    exc.message
+    for student_batch in _batches(students, batch_size):
+        with dog_stats_api.timer('lms.grades.iterate_grades_for.fetch_scores', tags=[u'action:{}'.format(course_id)]):
+            with manual_transaction():
+                scores_clients = ScoresClient.create_for_students(
+                    course.id, [student.id for student in student_batch]
                 )
-                yield student, {}, exc.message
+
+        for student in student_batch:
+            with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=[u'action:{}'.format(course_id)]):
+                try:
+                    request.user = student
+                    # Grading calls problem rendering, which calls masquerading,
+                    # which checks session vars -- thus the empty session dict below.
+                    # It's not pretty, but untangling that is currently beyond the
+                    # scope of this feature.
+                    request.session = {}
+                    gradeset = grade(student, request, course, scores_client=scores_clients[student.id])
+                    yield student, gradeset, ""
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Keep marching on even if this student couldn't be graded for
+                    # some reason, but log it for future reference.
+                    log.exception(
+                        'Cannot grade student %s (%s) in course %s because of exception: %s',
+                        student.username,
+                        student.id,
+                        course_id,
+                        exc.message
+                    )
+                    yield student, {}, exc.message
@@ -0,0 +1,192 @@
+"""
+Serialisable snapshots of the parts of a course's structure that grading needs.
+
+Building a course's grading_context means walking (and so loading) every
+descriptor in every graded section. A GradingStructure records the result
+of that walk -- the graded sections and, for each block in them, its
+children, display name, graded flag, format, weight and scoring flags -- as
+plain data. It's computed once per published version of the course and
+stored in the Django cache, so grading can walk the course without loading
+any descriptors, and only loads the ones it has to instantiate.
+"""
+from django.core.cache import cache
+from opaque_keys.edx.keys import CourseKey, UsageKey
+
+# Snapshots are keyed by course content version, so they never go stale, and
+# only have to expire to free up space.
+GRADING_STRUCTURE_CACHE_TIMEOUT = 60 * 60 * 24 * 7  # seconds
+
+
+def course_content_version(course):
+    """
+    Return a value that changes whenever the published content of `course`
+    changes, or None if the course's modulestore doesn't record edit times.
+    """
+    try:
+        return course.subtree_edited_on
+    except AttributeError:
+        return None
+
+
+class GradingStructure(object):
+    """
+    The graded sections of the course `course_key`, and the blocks inside them.
+
+    `graded_sections` maps each section format to a list of the usage keys
+    of the graded sections with that format, and `blocks` maps the usage key
+    of each of those sections and their descendants to a dict with keys:
+
+        'display_name' : the block's display_name_with_default
+        'graded' : the block's (inherited) graded flag
+        'format' : the block's format
+        'weight' : the block's weight, or None
+        'has_score' : whether the block has a score
+        'always_recalculate_grades' : whether the block's score must always
+            come from an instance of the block
+        'has_dynamic_children' : whether the block's children can only be
+            found from an instance of the block
+        'children' : the usage keys of the block's children
+    """
+    def __init__(self, course_key, graded_sections, blocks):
+        self.course_key = course_key
+        self.graded_sections = graded_sections
+        self.blocks = blocks
+
+    @classmethod
+    def from_course(cls, course):
+        """
+        Build the GradingStructure for `course` by walking its descriptors.
+        """
+        graded_sections = {}
+        blocks = {}
+
+        def add_block(descriptor):
+            """
+            Record `descriptor` and all of its descendants in `blocks`.
+            """
+            children = descriptor.get_children()
+            blocks[descriptor.location] = {
+                'display_name': descriptor.display_name_with_default,
+                'graded': descriptor.graded,
+                'format': descriptor.format,
+                'weight': getattr(descriptor, 'weight', None),
+                'has_score': descriptor.has_score,
+                'always_recalculate_grades': descriptor.always_recalculate_grades,
+                'has_dynamic_children': descriptor.has_dynamic_children(),
+                'children': [child.location for child in children],
+            }
+            for child in children:
+                add_block(child)
+
+        for chapter in course.get_children():
+            for section in chapter.get_children():
+                if section.graded:
+                    add_block(section)
+                    section_format = section.format if section.format is not None else ''
+                    graded_sections.setdefault(section_format, []).append(section.location)
+
+        return cls(course.id, graded_sections, blocks)
+
+    def to_json(self):
+        """
+        Return a representation of this GradingStructure that only uses
+        basic types, for storage.
+        """
+        return {
+            'course_key': unicode(self.course_key),
+            'graded_sections': {
+                section_format: [unicode(section_key) for section_key in section_keys]
+                for section_format, section_keys in self.graded_sections.iteritems()
+            },
+            'blocks': {
+                unicode(usage_key): dict(block, children=[unicode(child) for child in block['children']])
+                for usage_key, block in self.blocks.iteritems()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, json_data):
+        """
+        Return the GradingStructure represented by `json_data`, the output of
+        `to_json()`.
+        """
+        course_key = CourseKey.from_string(json_data['course_key'])
+
+        def parse_usage_key(usage_key):
+            """
+            Parse `usage_key`, restoring the run that deprecated keys leave out
+            of their string form.
+            """
+            return UsageKey.from_string(usage_key).map_into_course(course_key)
+
+        return cls(
+            course_key,
+            {
+                section_format: [parse_usage_key(section_key) for section_key in section_keys]
+                for section_format, section_keys in json_data['graded_sections'].iteritems()
+            },
+            {
+                parse_usage_key(usage_key): dict(
+                    block, children=[parse_usage_key(child) for child in block['children']]
+                )
+                for usage_key, block in json_data['blocks'].iteritems()
+            },
+        )
+
+    @property
+    def always_recalculate_grades(self):
+        """
+        Whether any block's score must always come from an instance of the
+        block, because it can change without the LMS hearing about it.
+        """
+        return any(block['always_recalculate_grades'] for block in self.blocks.itervalues())
+
+    def scorable_descendants(self, section_key):
+        """
+        Return the usage keys of the blocks with scores in the section
+        `section_key`, including the section itself. These are the
+        equivalent of the grading_context's 'xmoduledescriptors'.
+        """
+        scorable = []
+        stack = [section_key]
+        while stack:
+            usage_key = stack.pop()
+            if self.blocks[usage_key]['has_score']:
+                scorable.append(usage_key)
+            stack.extend(self.blocks[usage_key]['children'])
+        return scorable
+
+
+def _cache_key(course_key, content_version):
+    """
+    Return the cache key for the GradingStructure of a version of a course.
+    """
+    return u'courseware.grading_structure.{}.{}'.format(course_key, content_version)
+
+
+def get_grading_structure(course):
+    """
+    Return the GradingStructure for `course`.
+
+    The structure is memoized on the course descriptor, and shared between
+    processes through the Django cache for each version of the course's
+    content. Courses without a content version are only memoized.
+    """
+    grading_structure = getattr(course, '_grading_structure', None)
+    if grading_structure is not None:
+        return grading_structure
+
+    content_version = course_content_version(course)
+    if content_version is None:
+        grading_structure = GradingStructure.from_course(course)
+    else:
+        cache_key = _cache_key(course.id, content_version)
+        json_data = cache.get(cache_key)
+        if json_data is not None:
+            grading_structure = GradingStructure.from_json(json_data)
+        else:
+            grading_structure = GradingStructure.from_course(course)
+            cache.set(cache_key, grading_structure.to_json(), GRADING_STRUCTURE_CACHE_TIMEOUT)
+
+    course._grading_structure = grading_structure  # pylint: disable=protected-access
+    return grading_structure
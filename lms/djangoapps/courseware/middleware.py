@@ -2,10 +2,20 @@
 Middleware for the courseware app
 """
 
+import logging
+
+from django.conf import settings
 from django.shortcuts import redirect
 from django.core.urlresolvers import reverse
 
+import dogstats_wrapper as dog_stats_api
+
 from courseware.courses import UserNotEnrolled
+from courseware.grade_summary_cache import invalidate_pending_grade_summaries
+from courseware.model_data import FieldDataCacheStats
+from request_cache.middleware import RequestCache
+
+log = logging.getLogger(__name__)
 
 
 class RedirectUnenrolledMiddleware(object):
@@ -22,3 +32,51 @@ class RedirectUnenrolledMiddleware(object):
                     args=[course_key.to_deprecated_string()]
                 )
             )
+
+
+class GradeSummaryInvalidationMiddleware(object):
+    """
+    Invalidate the grade summaries whose scores changed during the request
+    again, after the request's transaction has been committed.
+
+    This must come before TransactionMiddleware in MIDDLEWARE_CLASSES, so that
+    its process_response runs after the commit.
+    """
+    def process_request(self, request):
+        # Anything left pending by earlier work in this thread has been committed or rolled back by now
+        invalidate_pending_grade_summaries()
+
+    def process_response(self, request, response):
+        invalidate_pending_grade_summaries()
+        return response
+
+
+class FieldDataCacheStatsMiddleware(object):
+    """
+    Report the database work done by FieldDataCaches during each request to
+    datadog, and log a summary of it.
+
+    Enabled by FEATURES['ENABLE_FIELD_DATA_CACHE_METRICS']. This must come
+    after RequestCache in MIDDLEWARE_CLASSES, so that the request's stats
+    are reported before the request cache is cleared.
+    """
+    def process_response(self, request, response):
+        if not settings.FEATURES.get('ENABLE_FIELD_DATA_CACHE_METRICS', False):
+            return response
+
+        request_cache_data = getattr(RequestCache.get_request_cache(), 'data', {})
+        stats = request_cache_data.get(FieldDataCacheStats.REQUEST_CACHE_KEY)
+        if stats is None:
+            return response
+
+        for scope_name, queries in stats.queries.iteritems():
+            tags = [u'scope:{}'.format(scope_name)]
+            dog_stats_api.histogram('lms.field_data_cache.queries', queries, tags=tags)
+            dog_stats_api.histogram('lms.field_data_cache.rows', stats.rows[scope_name], tags=tags)
+        dog_stats_api.histogram('lms.field_data_cache.find_hits', stats.find_hits)
+        dog_stats_api.histogram('lms.field_data_cache.find_misses', stats.find_misses)
+        dog_stats_api.histogram('lms.field_data_cache.creates', stats.creates)
+        dog_stats_api.histogram('lms.field_data_cache.query_time', stats.query_time)
+
+        log.debug(u"FieldDataCache stats for %s: %s", request.path, stats.summary())
+        return response
@@ -3,7 +3,9 @@ Classes to provide the LMS runtime data storage to XBlocks
 """
 
 import json
-from collections import defaultdict
+import time
+from collections import defaultdict, namedtuple, OrderedDict
+from contextlib import contextmanager
 from itertools import chain
 from .models import (
     StudentModule,
@@ -16,8 +18,9 @@ from opaque_keys.edx.keys import CourseKey
 from opaque_keys.edx.block_types import BlockTypeKeyV1
 from opaque_keys.edx.asides import AsideUsageKeyV1
 
-from django.db import DatabaseError
+from django.db import DatabaseError, transaction
 
+from request_cache.middleware import RequestCache
 from xblock.runtime import KeyValueStore
 from xblock.exceptions import KeyValueMultiSaveError, InvalidScopeError
 from xblock.fields import Scope, UserScope
@@ -42,12 +45,79 @@ def chunks(items, chunk_size):
     return (items[i:i + chunk_size] for i in xrange(0, len(items), chunk_size))
 
 
+class FieldDataCacheStats(object):
+    """
+    Counters of the database work done by FieldDataCaches.
+
+    Each FieldDataCache keeps its own stats, and also adds them to the stats
+    for the current request (see `for_request`), which are reported by
+    courseware.middleware.FieldDataCacheStatsMiddleware.
+    """
+    REQUEST_CACHE_KEY = 'courseware.field_data_cache_stats'
+
+    def __init__(self):
+        self.queries = defaultdict(int)  # scope name -> number of queries
+        self.rows = defaultdict(int)  # scope name -> number of rows fetched
+        self.find_hits = 0
+        self.find_misses = 0
+        self.creates = 0
+        self.query_time = 0.0  # seconds
+
+    @classmethod
+    def for_request(cls):
+        """
+        Return the FieldDataCacheStats for the current request, or None if
+        there is no request cache in this thread (e.g. in a celery task).
+        """
+        request_cache_data = getattr(RequestCache.get_request_cache(), 'data', None)
+        if request_cache_data is None:
+            return None
+        return request_cache_data.setdefault(cls.REQUEST_CACHE_KEY, cls())
+
+    def record_query(self, scope, queries, rows, query_time):
+        """
+        Record that `queries` queries, taking `query_time` seconds in all,
+        fetched `rows` rows for fields in `scope`.
+        """
+        self.queries[scope.name] += queries
+        self.rows[scope.name] += rows
+        self.query_time += query_time
+
+    def record_find(self, hit):
+        """
+        Record a lookup in a FieldDataCache, which found an object if `hit`.
+        """
+        if hit:
+            self.find_hits += 1
+        else:
+            self.find_misses += 1
+
+    def record_create(self):
+        """
+        Record that `find_or_create` had to create (or fetch) an object.
+        """
+        self.creates += 1
+
+    def summary(self):
+        """
+        Return the counters as a dict of basic types.
+        """
+        return {
+            'queries': dict(self.queries),
+            'rows': dict(self.rows),
+            'find_hits': self.find_hits,
+            'find_misses': self.find_misses,
+            'creates': self.creates,
+            'query_time': self.query_time,
+        }
+
+
 class FieldDataCache(object):
     """
     A cache of django model objects needed to supply the data
     for a module and its decendants
     """
-    def __init__(self, descriptors, course_id, user, select_for_update=False, asides=None):
+    def __init__(self, descriptors, course_id, user, select_for_update=False, asides=None, lazy=False):
         '''
         Find any courseware.models objects that are needed by any descriptor
         in descriptors. Attempts to minimize the number of queries to the database.
@@ -60,10 +130,21 @@ class FieldDataCache(object):
         user: The user for which to cache data
         select_for_update: True if rows should be locked until end of transaction
         asides: The list of aside types to load, or None to prefetch no asides.
+        lazy: If True, each scope's objects are only queried for the first time
+            a field in that scope is looked up, rather than all up front
         '''
         self.cache = {}
         self.descriptors = descriptors
         self.select_for_update = select_for_update
+        self.stats = FieldDataCacheStats()
+        self._request_stats = FieldDataCacheStats.for_request()
+        self._query_count = 0
+        self._defer_writes = False
+        # id(field_object) -> (field_object, names of its fields that were set), for
+        # field objects whose saves are deferred
+        self._pending_writes = OrderedDict()
+        # functions to call once the deferred writes have been flushed
+        self._after_flush = []
 
         if asides is None:
             self.asides = []
@@ -74,15 +155,35 @@ class FieldDataCache(object):
         self.course_id = course_id
         self.user = user
 
+        # scope -> fields in that scope, for the scopes that haven't been loaded yet
+        self._unloaded_scopes = {}
         if user.is_authenticated():
-            for scope, fields in self._fields_to_cache().items():
-                for field_object in self._retrieve_fields(scope, fields):
-                    self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+            self._unloaded_scopes = self._fields_to_cache()
+            if not lazy:
+                for scope in self._unloaded_scopes.keys():
+                    self._load_scope(scope)
+
+    def _load_scope(self, scope):
+        """
+        Query for the objects in `scope` needed by this cache's descriptors,
+        unless that has already been done.
+        """
+        fields = self._unloaded_scopes.pop(scope, None)
+        if fields is None:
+            return
+
+        start_query_count, start_time, rows = self._query_count, time.time(), 0
+        for field_object in self._retrieve_fields(scope, fields):
+            self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+            rows += 1
+        self._record_stats(
+            'record_query', scope, self._query_count - start_query_count, rows, time.time() - start_time
+        )
 
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
                                          descriptor_filter=lambda descriptor: True,
-                                         select_for_update=False, asides=None):
+                                         select_for_update=False, asides=None, lazy=False):
         """
         course_id: the course in the context of which we want StudentModules.
         user: the django user for whom to load modules.
@@ -92,6 +193,7 @@ class FieldDataCache(object):
         descriptor_filter is a function that accepts a descriptor and return wether the StudentModule
             should be cached
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
+        lazy: If True, only query each scope the first time one of its fields is looked up
         """
 
         def get_child_descriptors(descriptor, depth, descriptor_filter):
@@ -120,13 +222,14 @@ class FieldDataCache(object):
         with modulestore().bulk_operations(descriptor.location.course_key):
             descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
 
-        return FieldDataCache(descriptors, course_id, user, select_for_update, asides=asides)
+        return FieldDataCache(descriptors, course_id, user, select_for_update, asides=asides, lazy=lazy)
 
     def _query(self, model_class, **kwargs):
         """
         Queries model_class with **kwargs, optionally adding select_for_update if
         self.select_for_update is set
         """
+        self._query_count += 1
         query = model_class.objects
         if self.select_for_update:
             query = query.select_for_update()
@@ -262,7 +365,10 @@ class FieldDataCache(object):
             # user we were constructed for.
             assert key.user_id == self.user.id
 
-        return self.cache.get(self._cache_key_from_kvs_key(key))
+        self._load_scope(key.scope)
+        field_object = self.cache.get(self._cache_key_from_kvs_key(key))
+        self._record_stats('record_find', field_object is not None)
+        return field_object
 
     def find_or_create(self, key):
         '''
@@ -274,6 +380,8 @@ class FieldDataCache(object):
         if field_object is not None:
             return field_object
 
+        self._record_stats('record_create')
+        start_time = time.time()
         if key.scope == Scope.user_state:
             field_object, __ = StudentModule.objects.get_or_create(
                 course_id=self.course_id,
@@ -301,10 +409,206 @@ class FieldDataCache(object):
                 student_id=key.user_id,
             )
 
+        self._record_stats('record_query', key.scope, 1, 1, time.time() - start_time)
+
         cache_key = self._cache_key_from_kvs_key(key)
         self.cache[cache_key] = field_object
         return field_object
 
+    def save(self, field_object, field_names=()):
+        """
+        Save `field_object`, one of the model objects in this cache, whose
+        fields `field_names` have been set.
+
+        While writes are deferred (see `deferred_writes`), the object is only
+        marked to be saved when the writes are flushed.
+        """
+        if self._defer_writes:
+            __, pending_names = self._pending_writes.setdefault(id(field_object), (field_object, []))
+            pending_names.extend(name for name in field_names if name not in pending_names)
+        else:
+            field_object.save()
+
+    def after_save(self, callback):
+        """
+        Call `callback` once the objects saved so far have been written: now,
+        or, while writes are deferred, after they have been flushed.
+        """
+        if self._defer_writes:
+            self._after_flush.append(callback)
+        else:
+            callback()
+
+    def delete(self, field_object):
+        """
+        Delete `field_object`, one of the model objects in this cache,
+        discarding any deferred save of it.
+        """
+        self._pending_writes.pop(id(field_object), None)
+        field_object.delete()
+
+    @contextmanager
+    def deferred_writes(self):
+        """
+        A context manager that defers saving the objects in this cache until
+        it exits, so that an object changed several times is only written
+        once. The deferred writes are flushed in a single transaction when
+        the body succeeds, and discarded if it raises an exception.
+        """
+        self._defer_writes = True
+        try:
+            yield
+        except Exception:
+            self._pending_writes.clear()
+            self._after_flush = []
+            raise
+        finally:
+            self._defer_writes = False
+        self.flush()
+
+    def flush(self):
+        """
+        Save all of the objects whose saves have been deferred, in a single
+        transaction.
+
+        Then call the functions passed to `after_save` while the writes were
+        deferred.
+
+        Raises KeyValueMultiSaveError if the transaction fails. Since it is
+        rolled back, none of the fields have been saved.
+        """
+        pending_writes = self._pending_writes.values()
+        self._pending_writes.clear()
+        after_flush, self._after_flush = self._after_flush, []
+        if pending_writes:
+            try:
+                with transaction.commit_on_success():
+                    for field_object, __ in pending_writes:
+                        field_object.save()
+            except DatabaseError:
+                log.exception(
+                    'Error saving fields %r', [name for __, field_names in pending_writes for name in field_names]
+                )
+                raise KeyValueMultiSaveError([])
+
+        for callback in after_flush:
+            callback()
+
+    def _record_stats(self, method_name, *args):
+        """
+        Call the FieldDataCacheStats method `method_name` with `*args` on the
+        stats for this cache and for the current request.
+        """
+        getattr(self.stats, method_name)(*args)
+        if self._request_stats is not None:
+            getattr(self._request_stats, method_name)(*args)
+
+
+class ScoresClient(object):
+    """
+    An in-memory index of a single user's scores for a course.
+
+    All of the user's StudentModule rows for the course are loaded with a
+    single query, so that grading code can look up the stored score for any
+    problem (or check whether the user has any state at all for a set of
+    problems) without going back to the database once per problem.
+    """
+    Score = namedtuple('Score', 'correct total')
+
+    def __init__(self, course_key, user_id):
+        """
+        course_key: The CourseKey of the course to load scores for
+        user_id: The id of the user to load scores for
+        """
+        assert isinstance(course_key, CourseKey)
+        self.course_key = course_key
+        self.user_id = user_id
+        self._locations_to_scores = {}
+        self._has_fetched = False
+
+    def __contains__(self, location):
+        """
+        Return True if the user has a StudentModule for `location`, whether
+        or not it has been graded.
+        """
+        return self._normalize(location) in self._locations_to_scores
+
+    def fetch_scores(self):
+        """
+        Load all of the user's StudentModule grades for the course.
+
+        Only the key and grade columns are read, so problem state blobs are
+        never pulled out of the database.
+        """
+        student_modules = StudentModule.objects.filter(
+            student=self.user_id,
+            course_id=self.course_key,
+        ).only('module_state_key', 'grade', 'max_grade')
+
+        self._locations_to_scores = {
+            student_module.module_state_key.map_into_course(self.course_key): self.Score(
+                student_module.grade, student_module.max_grade
+            )
+            for student_module in student_modules
+        }
+        self._has_fetched = True
+
+    def get(self, location):
+        """
+        Return the Score for `location`, or None if the user has no
+        StudentModule for it.
+
+        Raises a ValueError if `fetch_scores` has not been called yet.
+        """
+        if not self._has_fetched:
+            raise ValueError(
+                "Tried to fetch location {} from ScoresClient before fetch_scores() has run.".format(location)
+            )
+        return self._locations_to_scores.get(self._normalize(location))
+
+    def _normalize(self, location):
+        """
+        Return `location` in the form used as a key in the score index.
+        """
+        return location.map_into_course(self.course_key)
+
+    @classmethod
+    def create_for_course(cls, course_key, user_id):
+        """
+        Return a ScoresClient with all of the user's scores for the course
+        already fetched.
+        """
+        client = cls(course_key, user_id)
+        client.fetch_scores()
+        return client
+
+    @classmethod
+    def create_for_students(cls, course_key, user_ids, chunk_size=500):
+        """
+        Return a dict mapping each of `user_ids` to a ScoresClient with that
+        user's scores for the course already fetched.
+
+        Rows are loaded with one `student_id__in` query per `chunk_size` users,
+        rather than one query per user.
+        """
+        clients = {user_id: cls(course_key, user_id) for user_id in user_ids}
+        for user_id_chunk in chunks(clients.keys(), chunk_size):
+            student_modules = StudentModule.objects.filter(
+                student_id__in=user_id_chunk,
+                course_id=course_key,
+            ).only('student', 'module_state_key', 'grade', 'max_grade')
+
+            for student_module in student_modules:
+                client = clients[student_module.student_id]
+                location = student_module.module_state_key.map_into_course(course_key)
+                client._locations_to_scores[location] = cls.Score(
+                    student_module.grade, student_module.max_grade
+                )
+
+        for client in clients.values():
+            client._has_fetched = True
+        return clients
+
 
 class DjangoKeyValueStore(KeyValueStore):
     """
@@ -360,6 +664,8 @@ class DjangoKeyValueStore(KeyValueStore):
         `kv_dict`: A dictionary of dirty fields that maps
           xblock.KvsFieldData._key : value
 
+        While the FieldDataCache defers writes, nothing is saved yet, and any
+        KeyValueMultiSaveError is raised when the writes are flushed instead.
         """
         saved_fields = []
         # field_objects maps a field_object to a list of associated fields
@@ -388,8 +694,11 @@ class DjangoKeyValueStore(KeyValueStore):
 
         for field_object in field_objects:
             try:
-                # Save the field object that we made above
-                field_object.save()
+                # Save the field object that we made above (or, if writes are
+                # deferred, mark it to be saved later)
+                self._field_data_cache.save(
+                    field_object, [field.field_name for field in field_objects[field_object]]
+                )
                 # If save is successful on this scope, add the saved fields to
                 # the list of successful saves
                 saved_fields.extend([field.field_name for field in field_objects[field_object]])
@@ -409,9 +718,9 @@ class DjangoKeyValueStore(KeyValueStore):
             state = json.loads(field_object.state)
             del state[key.field_name]
             field_object.state = json.dumps(state)
-            field_object.save()
+            self._field_data_cache.save(field_object, [key.field_name])
         else:
-            field_object.delete()
+            self._field_data_cache.delete(field_object)
 
     def has(self, key):
         if key.scope not in self._allowed_scopes:
@@ -17,8 +17,10 @@ from django.core.urlresolvers import reverse
 from django.http import Http404, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from capa.safe_exec import LocalCache, configure_sandbox_pool
 from capa.xqueue_interface import XQueueInterface
 from courseware.access import has_access, get_user_role
+from courseware.grade_summary_cache import invalidate_grade_summary
 from courseware.masquerade import setup_masquerade
 from courseware.model_data import FieldDataCache, DjangoKeyValueStore
 from lms.djangoapps.lms_xblock.field_data import LmsFieldData
@@ -69,6 +71,16 @@ XQUEUE_INTERFACE = XQueueInterface(
     REQUESTS_AUTH,
 )
 
+# The cache of sandboxed code results, with a local tier if one is configured
+if settings.SAFE_EXEC_LOCAL_CACHE_SIZE:
+    SAFE_EXEC_CACHE = LocalCache(cache, settings.SAFE_EXEC_LOCAL_CACHE_SIZE)
+else:
+    SAFE_EXEC_CACHE = cache
+
+# Sandboxes are only started when they're first needed, so each worker process has its own
+if settings.SAFE_EXEC_SANDBOX_POOL:
+    configure_sandbox_pool(settings.SAFE_EXEC_SANDBOX_POOL['SIZE'], settings.SAFE_EXEC_SANDBOX_POOL['MAX_RUNS'])
+
 # TODO: course_id and course_key are used interchangeably in this file, which is wrong.
 # Some brave person should make the variable names consistently someday, but the code's
 # coupled enough that it's kind of tricky--you've been warned!
@@ -360,8 +372,10 @@ def get_module_system_for_user(user, field_data_cache,
         # Update the grades
         student_module.grade = event.get('value')
         student_module.max_grade = event.get('max_value')
-        # Save all changes to the underlying KeyValueStore
-        student_module.save()
+        # Save all changes to the underlying KeyValueStore (or, if the handler
+        # defers its writes, along with its other changes once it's done)
+        field_data_cache.save(student_module, ['grade', 'max_grade'])
+        field_data_cache.after_save(partial(invalidate_grade_summary, course_id, user_id))
 
         # Bin score into range and increment stats
         score_bucket = get_score_bucket(student_module.grade, student_module.max_grade)
@@ -535,7 +549,7 @@ def get_module_system_for_user(user, field_data_cache,
         course_id=course_id,
         open_ended_grading_interface=open_ended_grading_interface,
         s3_interface=s3_interface,
-        cache=cache,
+        cache=SAFE_EXEC_CACHE,
         can_execute_unsafe_code=(lambda: can_execute_unsafe_code(course_id)),
         get_python_lib_zip=(lambda: get_python_lib_zip(contentstore, course_id)),
         # TODO: When we merge the descriptor and module systems, we can stop reaching into the mixologist (cpennington)
@@ -786,7 +800,13 @@ def _invoke_xblock_handler(request, course_id, usage_id, handler, suffix, user):
     req = django_to_webob_request(request)
     try:
         with tracker.get_tracker().context(tracking_context_name, tracking_context):
-            resp = instance.handle(handler, req, suffix)
+            if settings.FEATURES.get('ENABLE_XBLOCK_HANDLER_WRITE_BEHIND', False):
+                # Write each changed StudentModule (etc.) once, at the end of
+                # the handler, instead of every time its fields are saved
+                with field_data_cache.deferred_writes():
+                    resp = instance.handle(handler, req, suffix)
+            else:
+                resp = instance.handle(handler, req, suffix)
 
     except NoSuchHandlerError:
         log.exception("XBlock %s attempted to access missing handler %r", instance, handler)
@@ -0,0 +1,72 @@
+"""
+Tests for the per-student grade summary cache.
+"""
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from mock import Mock, patch
+
+from courseware.grade_summary_cache import (
+    cache_grade_summary,
+    get_cached_grade_summary,
+    invalidate_grade_summary,
+)
+from courseware.middleware import GradeSummaryInvalidationMiddleware
+from courseware.tests.factories import course_id
+
+
+class GradeSummaryCacheTest(TestCase):
+    """
+    Test reading, writing and invalidating cached grade summaries.
+    """
+    USER_ID = 7
+
+    def setUp(self):
+        patcher = patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_SUMMARY_CACHE': True})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        self.course = Mock(id=course_id, subtree_edited_on=datetime(2014, 12, 1))
+        self.grade_summary = {'percent': 0.5, 'grade': 'Pass'}
+        self.submissions_scores = {'i4x://edX/test_course/openassessment/ora': (1, 2)}
+        cache_grade_summary(self.course, self.USER_ID, self.submissions_scores, self.grade_summary)
+
+    def test_cache_hit(self):
+        self.assertEqual(
+            get_cached_grade_summary(self.course, self.USER_ID, self.submissions_scores),
+            self.grade_summary
+        )
+
+    def test_other_user(self):
+        self.assertIsNone(get_cached_grade_summary(self.course, self.USER_ID + 1, self.submissions_scores))
+
+    def test_invalidate(self):
+        invalidate_grade_summary(course_id, self.USER_ID)
+        self.assertIsNone(get_cached_grade_summary(self.course, self.USER_ID, self.submissions_scores))
+
+    def test_invalidate_after_commit(self):
+        with patch('courseware.grade_summary_cache.transaction.is_managed', return_value=True):
+            invalidate_grade_summary(course_id, self.USER_ID)
+        # A concurrent grade calculation re-caches the old grade before the change is committed
+        cache_grade_summary(self.course, self.USER_ID, self.submissions_scores, self.grade_summary)
+
+        GradeSummaryInvalidationMiddleware().process_response(Mock(), Mock())
+        self.assertIsNone(get_cached_grade_summary(self.course, self.USER_ID, self.submissions_scores))
+
+    def test_course_content_changed(self):
+        self.course.subtree_edited_on += timedelta(minutes=1)
+        self.assertIsNone(get_cached_grade_summary(self.course, self.USER_ID, self.submissions_scores))
+
+    def test_submissions_scores_changed(self):
+        self.submissions_scores['i4x://edX/test_course/openassessment/ora'] = (2, 2)
+        self.assertIsNone(get_cached_grade_summary(self.course, self.USER_ID, self.submissions_scores))
+
+    def test_no_content_version(self):
+        course = Mock(spec=['id'], id=course_id)
+        cache_grade_summary(course, self.USER_ID, {}, self.grade_summary)
+        self.assertIsNone(get_cached_grade_summary(course, self.USER_ID, {}))
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_SUMMARY_CACHE': False})
+    def test_disabled(self):
+        self.assertIsNone(get_cached_grade_summary(self.course, self.USER_ID, self.submissions_scores))
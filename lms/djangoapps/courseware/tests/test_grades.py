@@ -1,19 +1,22 @@
 """
 Test grade calculation.
 """
+from django.core.cache import cache
 from django.http import Http404
 from django.test.utils import override_settings
 from mock import patch
 from opaque_keys.edx.locations import SlashSeparatedCourseKey
 
 from courseware.grades import grade, iterate_grades_for
+from courseware.grading_structure import get_grading_structure
+from courseware.tests.factories import StudentModuleFactory
 from xmodule.modulestore.tests.django_utils import TEST_DATA_MOCK_MODULESTORE
 from student.tests.factories import UserFactory
-from xmodule.modulestore.tests.factories import CourseFactory
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
 
-def _grade_with_errors(student, request, course, keep_raw_scores=False):
+def _grade_with_errors(student, request, course, keep_raw_scores=False, scores_client=None):
     """This fake grade method will throw exceptions for student3 and
     student4, but allow any other students to go through normal grading.
 
@@ -24,7 +27,7 @@ def _grade_with_errors(student, request, course, keep_raw_scores=False):
     if student.username in ['student3', 'student4']:
         raise Exception("I don't like {}".format(student.username))
 
-    return grade(student, request, course, keep_raw_scores=keep_raw_scores)
+    return grade(student, request, course, keep_raw_scores=keep_raw_scores, scores_client=scores_client)
 
 
 @override_settings(MODULESTORE=TEST_DATA_MOCK_MODULESTORE)
@@ -73,7 +76,69 @@ class TestGradeIteration(ModuleStoreTestCase):
             self.assertIsNone(gradeset['grade'])
             self.assertEqual(gradeset['percent'], 0.0)
 
+    def test_batched_stored_scores(self):
+        """Stored scores for every student in a batch are fetched together and
+        used to compute the course grade."""
+        chapter = ItemFactory.create(parent=self.course, category='chapter')
+        sequential = ItemFactory.create(
+            parent=chapter, category='sequential', metadata={'graded': True, 'format': 'Homework'}
+        )
+        problem = ItemFactory.create(parent=sequential, category='problem')
+        student1, student2 = self.students[:2]
+        StudentModuleFactory.create(
+            student=student1, course_id=self.course.id, module_state_key=problem.location, grade=1, max_grade=1
+        )
+
+        all_gradesets, all_errors = self._gradesets_and_errors_for(self.course.id, self.students, batch_size=2)
+        self.assertEqual(len(all_errors), 0)
+        self.assertGreater(all_gradesets[student1]['percent'], 0)
+        self.assertEqual(all_gradesets[student2]['percent'], 0.0)
+
+    def test_cached_structure_uses_stored_scores(self):
+        """A course graded from a cached grading structure finds the stored
+        scores of its problems without loading them."""
+        cache.clear()
+        chapter = ItemFactory.create(parent=self.course, category='chapter')
+        sequential = ItemFactory.create(
+            parent=chapter, category='sequential', metadata={'graded': True, 'format': 'Homework'}
+        )
+        problem = ItemFactory.create(parent=sequential, category='problem')
+        StudentModuleFactory.create(
+            student=self.students[0], course_id=self.course.id, module_state_key=problem.location,
+            grade=1, max_grade=1
+        )
+        get_grading_structure(self.store.get_course(self.course.id))
+
+        # A fresh instance of the course reads its grading structure from the cache
+        course = self.store.get_course(self.course.id)
+        with patch.object(self.store, 'get_item', wraps=self.store.get_item) as mock_get_item:
+            gradeset = grade(self.students[0], None, course)
+        self.assertNotIn(problem.location, [args[0] for args, __ in mock_get_item.call_args_list if args])
+        self.assertGreater(gradeset['percent'], 0)
+
     @patch('courseware.grades.grade', _grade_with_errors)
+    @override_settings(GENERATE_PROFILE_SCORES=True)
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_SUMMARY_CACHE': True})
+    def test_profile_scores_not_cached(self):
+        """Random profiling scores are neither read from nor stored in the
+        grade summary cache."""
+        with patch('courseware.grades.get_cached_grade_summary') as mock_get:
+            with patch('courseware.grades.cache_grade_summary') as mock_set:
+                grade(self.students[0], None, self.course)
+        self.assertFalse(mock_get.called)
+        self.assertFalse(mock_set.called)
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_GRADE_SUMMARY_CACHE': True})
+    def test_always_recalculated_grades_not_cached(self):
+        """Courses with blocks whose scores change outside of the LMS aren't
+        cached."""
+        with patch('courseware.grading_structure.GradingStructure.always_recalculate_grades', True):
+            with patch('courseware.grades.get_cached_grade_summary') as mock_get:
+                with patch('courseware.grades.cache_grade_summary') as mock_set:
+                    grade(self.students[0], None, self.course)
+        self.assertFalse(mock_get.called)
+        self.assertFalse(mock_set.called)
+
     def test_grading_exception(self):
         """Test that we correctly capture exception messages that bubble up from
         grading. Note that we only see errors at this level if the grading
@@ -106,7 +171,7 @@ class TestGradeIteration(ModuleStoreTestCase):
         self.assertTrue(all_gradesets[student5])
 
     ################################# Helpers #################################
-    def _gradesets_and_errors_for(self, course_id, students):
+    def _gradesets_and_errors_for(self, course_id, students, **kwargs):
         """Simple helper method to iterate through student grades and give us
         two dictionaries -- one that has all students and their respective
         gradesets, and one that has only students that could not be graded and
@@ -114,7 +179,7 @@ class TestGradeIteration(ModuleStoreTestCase):
         students_to_gradesets = {}
         students_to_errors = {}
 
-        for student, gradeset, err_msg in iterate_grades_for(course_id, students):
+        for student, gradeset, err_msg in iterate_grades_for(course_id, students, **kwargs):
             students_to_gradesets[student] = gradeset
             if err_msg:
                 students_to_errors[student] = err_msg
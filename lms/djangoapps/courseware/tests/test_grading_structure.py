@@ -0,0 +1,66 @@
+"""
+Tests for cached course grading structures.
+"""
+from django.core.cache import cache
+from django.test.utils import override_settings
+from mock import patch
+
+from courseware.grading_structure import GradingStructure, get_grading_structure
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase, TEST_DATA_MOCK_MODULESTORE
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+
+
+@override_settings(MODULESTORE=TEST_DATA_MOCK_MODULESTORE)
+class TestGradingStructure(ModuleStoreTestCase):
+    """
+    Test building, serialising and caching GradingStructures.
+    """
+    def setUp(self):
+        cache.clear()
+        self.course = CourseFactory.create()
+        chapter = ItemFactory.create(parent=self.course, category='chapter')
+        self.graded_section = ItemFactory.create(
+            parent=chapter, category='sequential', metadata={'graded': True, 'format': 'Homework'}
+        )
+        self.ungraded_section = ItemFactory.create(parent=chapter, category='sequential')
+        vertical = ItemFactory.create(parent=self.graded_section, category='vertical')
+        self.problem = ItemFactory.create(parent=vertical, category='problem', metadata={'weight': 2})
+        ItemFactory.create(parent=self.ungraded_section, category='problem')
+        self.course = self.store.get_course(self.course.id)
+
+    def test_from_course(self):
+        structure = GradingStructure.from_course(self.course)
+        self.assertEqual(structure.graded_sections, {'Homework': [self.graded_section.location]})
+        # Only graded sections and their descendants are recorded
+        self.assertNotIn(self.ungraded_section.location, structure.blocks)
+
+        problem_block = structure.blocks[self.problem.location]
+        self.assertTrue(problem_block['has_score'])
+        self.assertTrue(problem_block['graded'])
+        self.assertEqual(problem_block['weight'], 2)
+        self.assertEqual(problem_block['children'], [])
+        self.assertEqual(
+            structure.scorable_descendants(self.graded_section.location),
+            [self.problem.location]
+        )
+
+    def test_json_round_trip(self):
+        structure = GradingStructure.from_course(self.course)
+        round_tripped = GradingStructure.from_json(structure.to_json())
+        self.assertEqual(round_tripped.course_key, self.course.id)
+        self.assertEqual(round_tripped.graded_sections, structure.graded_sections)
+        self.assertEqual(round_tripped.blocks, structure.blocks)
+
+    def test_always_recalculate_grades(self):
+        structure = GradingStructure.from_course(self.course)
+        self.assertFalse(structure.always_recalculate_grades)
+        structure.blocks[self.problem.location]['always_recalculate_grades'] = True
+        self.assertTrue(structure.always_recalculate_grades)
+
+    def test_cached_between_course_instances(self):
+        get_grading_structure(self.course)
+        course = self.store.get_course(self.course.id)
+        with patch.object(GradingStructure, 'from_course') as mock_from_course:
+            structure = get_grading_structure(course)
+        self.assertFalse(mock_from_course.called)
+        self.assertEqual(structure.graded_sections, {'Homework': [self.graded_section.location]})
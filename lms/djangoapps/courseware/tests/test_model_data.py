@@ -6,10 +6,11 @@ from mock import Mock, patch
 from functools import partial
 
 from courseware.model_data import DjangoKeyValueStore
-from courseware.model_data import InvalidScopeError, FieldDataCache
+from courseware.model_data import InvalidScopeError, FieldDataCache, FieldDataCacheStats, ScoresClient
 from courseware.models import StudentModule
 from courseware.models import XModuleStudentInfoField, XModuleStudentPrefsField
 
+from request_cache.middleware import RequestCache
 from student.tests.factories import UserFactory
 from courseware.tests.factories import StudentModuleFactory as cmfStudentModuleFactory, location, course_id
 from courseware.tests.factories import UserStateSummaryFactory
@@ -127,6 +128,40 @@ class TestStudentModuleStorage(OtherUserFailureTestMixin, TestCase):
         self.assertEquals(1, StudentModule.objects.all().count())
         self.assertEquals({'b_field': 'b_value', 'a_field': 'a_value', 'not_a_field': 'new_value'}, json.loads(StudentModule.objects.all()[0].state))
 
+    def test_deferred_writes(self):
+        "Test that while writes are deferred, several sets of the StudentModule are saved once at the end"
+        with self.field_data_cache.deferred_writes():
+            with self.assertNumQueries(0):
+                self.kvs.set(user_state_key('a_field'), 'new_value')
+                self.kvs.set(user_state_key('b_field'), 'other_value')
+            self.assertEquals({'b_field': 'b_value', 'a_field': 'a_value'}, json.loads(StudentModule.objects.all()[0].state))
+        self.assertEquals({'b_field': 'other_value', 'a_field': 'new_value'}, json.loads(StudentModule.objects.all()[0].state))
+
+    def test_after_save_deferred(self):
+        "Test that functions waiting on deferred writes are called once the writes are flushed"
+        callback = Mock()
+        with self.field_data_cache.deferred_writes():
+            self.kvs.set(user_state_key('a_field'), 'new_value')
+            self.field_data_cache.after_save(callback)
+            self.assertFalse(callback.called)
+        callback.assert_called_once_with()
+
+    def test_deferred_writes_discarded_on_error(self):
+        "Test that deferred writes aren't saved if the code that made them raises an exception"
+        with self.assertRaises(ValueError):
+            with self.field_data_cache.deferred_writes():
+                self.kvs.set(user_state_key('a_field'), 'new_value')
+                raise ValueError
+        self.assertEquals({'b_field': 'b_value', 'a_field': 'a_value'}, json.loads(StudentModule.objects.all()[0].state))
+
+    def test_deferred_writes_failure(self):
+        "Test that a failure to flush deferred writes reports that no fields were saved"
+        with patch('django.db.models.Model.save', side_effect=DatabaseError):
+            with self.assertRaises(KeyValueMultiSaveError) as exception_context:
+                with self.field_data_cache.deferred_writes():
+                    self.kvs.set(user_state_key('a_field'), 'new_value')
+        self.assertEquals(exception_context.exception.saved_field_names, [])
+
     def test_delete_existing_field(self):
         "Test that deleting an existing field removes it from the StudentModule"
         self.kvs.delete(user_state_key('a_field'))
@@ -213,6 +248,99 @@ class TestMissingStudentModule(TestCase):
         self.assertFalse(self.kvs.has(user_state_key('a_field')))
 
 
+class TestLazyFieldDataCache(TestCase):
+    """Tests for FieldDataCaches that only query each scope when it is first read"""
+    def setUp(self):
+        student_module = StudentModuleFactory(state=json.dumps({'a_field': 'a_value'}))
+        self.user = student_module.student
+        self.descriptor = mock_descriptor([
+            mock_field(Scope.user_state, 'a_field'),
+            mock_field(Scope.preferences, 'a_pref'),
+        ])
+
+    def test_scopes_loaded_on_first_read(self):
+        "Test that a lazy cache doesn't query until a scope is read, and then only queries that scope once"
+        with self.assertNumQueries(0):
+            field_data_cache = FieldDataCache([self.descriptor], course_id, self.user, lazy=True)
+        kvs = DjangoKeyValueStore(field_data_cache)
+
+        with self.assertNumQueries(1):
+            self.assertEquals('a_value', kvs.get(user_state_key('a_field')))
+        with self.assertNumQueries(0):
+            self.assertEquals('a_value', kvs.get(user_state_key('a_field')))
+        self.assertEquals({'user_state': 1}, field_data_cache.stats.queries)
+
+    def test_eager_cache(self):
+        "Test that a cache that isn't lazy queries every scope up front"
+        with self.assertNumQueries(2):
+            FieldDataCache([self.descriptor], course_id, self.user)
+
+
+class TestScoresClient(TestCase):
+    """Tests for ScoresClient"""
+    def setUp(self):
+        self.user = UserFactory.create(username='user')
+
+    def test_fetch_scores_single_query(self):
+        "Test that all of a user's scores for a course are loaded with one query"
+        StudentModuleFactory(student=self.user, module_state_key=location('graded'), grade=2, max_grade=3)
+        StudentModuleFactory(student=self.user, module_state_key=location('ungraded'), grade=None, max_grade=None)
+        other_user = UserFactory.create(username='other_user')
+        StudentModuleFactory(student=other_user, module_state_key=location('other'), grade=1, max_grade=1)
+
+        scores_client = ScoresClient(course_id, self.user.id)
+        with self.assertNumQueries(1):
+            scores_client.fetch_scores()
+
+        with self.assertNumQueries(0):
+            self.assertEquals(ScoresClient.Score(2, 3), scores_client.get(location('graded')))
+            self.assertEquals(ScoresClient.Score(None, None), scores_client.get(location('ungraded')))
+            self.assertIsNone(scores_client.get(location('other')))
+            self.assertIn(location('ungraded'), scores_client)
+            self.assertNotIn(location('other'), scores_client)
+
+    def test_get_before_fetch(self):
+        "Test that reading from a ScoresClient that hasn't fetched its scores fails"
+        scores_client = ScoresClient(course_id, self.user.id)
+        self.assertRaises(ValueError, scores_client.get, location('graded'))
+
+
+class TestFieldDataCacheStats(TestCase):
+    """Tests for the FieldDataCache query instrumentation"""
+    def setUp(self):
+        RequestCache().clear_request_cache()
+        self.addCleanup(RequestCache().clear_request_cache)
+        student_module = StudentModuleFactory(state=json.dumps({'a_field': 'a_value'}))
+        self.user = student_module.student
+        self.field_data_cache = FieldDataCache(
+            [mock_descriptor([mock_field(Scope.user_state, 'a_field')])], course_id, self.user
+        )
+
+    def test_retrieval_stats(self):
+        "Test that queries and rows fetched while filling the cache are counted per scope"
+        self.assertEquals({'user_state': 1}, self.field_data_cache.stats.queries)
+        self.assertEquals({'user_state': 1}, self.field_data_cache.stats.rows)
+
+    def test_find_stats(self):
+        "Test that hits, misses and creates are counted by find and find_or_create"
+        kvs = DjangoKeyValueStore(self.field_data_cache)
+        kvs.get(user_state_key('a_field'))
+        kvs.set(prefs_key('a_pref'), 'value')
+
+        summary = self.field_data_cache.stats.summary()
+        self.assertEquals(1, summary['find_hits'])
+        self.assertEquals(1, summary['find_misses'])
+        self.assertEquals(1, summary['creates'])
+        self.assertEquals({'user_state': 1, 'preferences': 1}, summary['queries'])
+
+    def test_request_stats(self):
+        "Test that the stats of all of the caches in a request are summed"
+        FieldDataCache([mock_descriptor([mock_field(Scope.user_state, 'a_field')])], course_id, self.user)
+        request_stats = FieldDataCacheStats.for_request()
+        self.assertEquals({'user_state': 2}, request_stats.queries)
+        self.assertEquals({'user_state': 2}, request_stats.rows)
+
+
 class StorageTestBase(object):
     """
     A base class for that gets subclassed when testing each of the scopes.
@@ -8,6 +8,7 @@ import ddt
 from django.http import Http404, HttpResponse
 from django.core.urlresolvers import reverse
 from django.conf import settings
+from django.db import connection
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from django.contrib.auth.models import AnonymousUser
@@ -954,6 +955,55 @@ class TestModuleTrackingContext(ModuleStoreTestCase):
         self.assertTrue(actual_display_name.startswith('problem'))
 
 
+@override_settings(MODULESTORE=TEST_DATA_MOCK_MODULESTORE)
+@patch('track.views.tracker', Mock())
+class TestHandlerWriteBehind(ModuleStoreTestCase):
+    """
+    Test that XBlock handlers write each changed StudentModule once when write-behind is enabled.
+    """
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = {}
+        self.course = CourseFactory.create()
+        self.descriptor = ItemFactory.create(
+            category='problem',
+            data=OptionResponseXMLFactory().build_xml(
+                question_text='The correct answer is Correct',
+                options=['Correct', 'Incorrect'],
+                correct_option='Correct'
+            )
+        )
+
+        # Record the queries made, as DEBUG would
+        connection.use_debug_cursor = True
+        self.addCleanup(setattr, connection, 'use_debug_cursor', None)
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_XBLOCK_HANDLER_WRITE_BEHIND': True})
+    @patch('courseware.module_render.invalidate_grade_summary')
+    def test_graded_check_updates_once(self, mock_invalidate):
+        del connection.queries[:]
+        render.handle_xblock_callback(
+            self.request,
+            self.course.id.to_deprecated_string(),
+            quote_slashes(self.descriptor.location.to_deprecated_string()),
+            'xmodule_handler',
+            'problem_check',
+        )
+
+        # The grade and the problem's state are written together
+        updates = [
+            query for query in connection.queries
+            if query['sql'].startswith('UPDATE "courseware_studentmodule" ')
+        ]
+        self.assertEqual(len(updates), 1)
+        student_module = StudentModule.objects.get(student=self.user, module_state_key=self.descriptor.location)
+        self.assertIsNotNone(student_module.max_grade)
+        self.assertTrue(mock_invalidate.called)
+
+
 class TestXmoduleRuntimeEvent(TestSubmittingProblems):
     """
     Inherit from TestSubmittingProblems to get functionality that set up a course and problems structure
@@ -974,6 +974,17 @@ class TestAnswerDistributions(TestSubmittingProblems):
             }
         )
 
+    def test_chunked_reads(self):
+        # Reading StudentModule rows in small chunks gives the same distribution
+        # as reading them all at once
+        self.submit_question_answer('p1', {'2_1': u'Correct'})
+        self.submit_question_answer('p2', {'2_1': u'Incorrect'})
+        self.submit_question_answer('p3', {'2_1': u'Correct'})
+
+        distribution = grades.answer_distributions(self.course.id)
+        for chunk_size in (1, 2, 3):
+            self.assertEqual(grades.answer_distributions(self.course.id, chunk_size=chunk_size), distribution)
+
     def test_other_data_types(self):
         # We'll submit one problem, and then muck with the student_answers
         # dict inside its state to try different data types (str, int, float,
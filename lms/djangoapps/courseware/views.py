@@ -352,7 +352,7 @@ def _index_bulk_op(request, course_key, chapter, section, position):
 
     try:
         field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
-            course_key, user, course, depth=2)
+            course_key, user, course, depth=2, lazy=True)
 
         course_module = get_module_for_descriptor(user, request, course, field_data_cache, course_key)
         if course_module is None:
@@ -445,8 +445,10 @@ def _index_bulk_op(request, course_key, chapter, section, position):
 
             # Load all descendants of the section, because we're going to display its
             # html, which in general will need all of its children
+            # Only query the scopes that rendering the section actually reads
             section_field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
-                course_key, user, section_descriptor, depth=None, asides=XBlockAsidesConfig.possible_asides()
+                course_key, user, section_descriptor, depth=None, asides=XBlockAsidesConfig.possible_asides(),
+                lazy=True
             )
 
             # Verify that position a string is in fact an int
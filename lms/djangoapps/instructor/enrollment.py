@@ -11,6 +11,7 @@ from django.core.urlresolvers import reverse
 from django.core.mail import send_mail
 
 from student.models import CourseEnrollment, CourseEnrollmentAllowed
+from courseware.grade_summary_cache import invalidate_grade_summary
 from courseware.models import StudentModule
 from edxmako.shortcuts import render_to_string
 
@@ -202,6 +203,7 @@ def reset_student_attempts(course_id, student, module_state_key, delete_module=F
 
     if delete_module:
         module_to_reset.delete()
+        invalidate_grade_summary(course_id, student.id)
     else:
         _reset_module_attempts(module_to_reset)
 
@@ -71,6 +71,12 @@ REPORTS_DATA = (
         'task_api_endpoint': 'instructor_task.api.submit_calculate_grades_csv',
         'extra_instructor_api_kwargs': {}
     },
+    {
+        'report_type': 'answer distribution',
+        'instructor_api_endpoint': 'calculate_answer_distribution_csv',
+        'task_api_endpoint': 'instructor_task.api.submit_calculate_answer_distribution_csv',
+        'extra_instructor_api_kwargs': {}
+    },
     {
         'report_type': 'enrolled student profile',
         'instructor_api_endpoint': 'get_students_features',
@@ -180,6 +186,7 @@ class TestInstructorAPIDenyLevels(ModuleStoreTestCase, LoginEnrollmentTestCase):
             ('list_background_email_tasks', {}),
             ('list_report_downloads', {}),
             ('calculate_grades_csv', {}),
+            ('calculate_answer_distribution_csv', {}),
             ('get_students_features', {}),
         ]
         # Endpoints that only Instructors can access
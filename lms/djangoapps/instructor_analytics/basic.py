@@ -172,6 +172,17 @@ def enrolled_students_features(course_key, features):
         {'username': 'username3', 'first_name': 'firstname3'}
     ]
     """
+    return list(iter_enrolled_students_features(course_key, features))
+
+
+def iter_enrolled_students_features(course_key, features, chunk_size=1000):
+    """
+    Yield student features as dictionaries, as for `enrolled_students_features`.
+
+    Students are read `chunk_size` at a time (ordered by username), so that
+    callers that write the features out as they go don't have to hold every
+    enrolled student in memory.
+    """
     include_cohort_column = 'cohort' in features
 
     students = User.objects.filter(
@@ -205,7 +216,16 @@ def enrolled_students_features(course_key, features):
             )
         return student_dict
 
-    return [extract_student(student, features) for student in students]
+    last_username = None
+    while True:
+        chunk = students if last_username is None else students.filter(username__gt=last_username)
+        chunk = list(chunk[:chunk_size])
+        for student in chunk:
+            yield extract_student(student, features)
+
+        if len(chunk) < chunk_size:
+            return
+        last_username = chunk[-1].username
 
 
 def coupon_codes_features(features, coupons_list):
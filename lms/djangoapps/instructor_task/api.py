@@ -20,6 +20,7 @@ from instructor_task.tasks import (
     send_bulk_course_email,
     calculate_grades_csv,
     calculate_students_features_csv,
+    calculate_answer_distribution_csv,
     cohort_students,
 )
 
@@ -238,6 +239,21 @@ def submit_calculate_students_features_csv(request, course_key, features):
     return submit_task(request, task_type, task_class, course_key, task_input, task_key)
 
 
+def submit_calculate_answer_distribution_csv(request, course_key):
+    """
+    Submits a task to generate a CSV containing the answer distribution of
+    every submitted problem in the course.
+
+    Raises AlreadyRunningError if said CSV is already being updated.
+    """
+    task_type = 'answer_distribution_csv'
+    task_class = calculate_answer_distribution_csv
+    task_input = {}
+    task_key = ""
+
+    return submit_task(request, task_type, task_class, course_key, task_input, task_key)
+
+
 def submit_cohort_students(request, course_key, file_name):
     """
     Request to have students cohorted in bulk.
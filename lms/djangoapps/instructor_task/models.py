@@ -12,13 +12,14 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
-from cStringIO import StringIO
 from gzip import GzipFile
 from uuid import uuid4
 import csv
 import json
 import hashlib
+import os
 import os.path
+import tempfile
 import urllib
 
 from boto.s3.connection import S3Connection
@@ -193,9 +194,14 @@ class InstructorTask(models.Model):
 class ReportStore(object):
     """
     Simple abstraction layer that can fetch and store CSV files for reports
-    download. Should probably refactor later to create a ReportFile object that
-    can simply be appended to for the sake of memory efficiency, rather than
-    passing in the whole dataset. Doing that for now just because it's simpler.
+    download. `store_rows` accepts any iterable of rows (including a
+    generator) and writes them out as they are produced, so the whole report
+    never has to be held in memory. Only complete reports are ever visible.
+
+    Reports built by several subtasks are stored in pieces with
+    `store_partial_rows`, which are not listed by `links_for`, and are then
+    read back with `iter_partial_rows` to be combined into a single report.
+    `partial_names` finds the partial reports stored so far.
     """
     @classmethod
     def from_config(cls):
@@ -305,22 +311,99 @@ class S3ReportStore(ReportStore):
             }
         )
 
+    def partial_key_for(self, course_id, filename):
+        """Return the S3 key we would use to store and retrieve the data for the
+        given partial report filename. Partial reports are kept outside of the
+        course's directory, so that `links_for()` doesn't list them."""
+        hashed_course_id = hashlib.sha1(course_id.to_deprecated_string())
+
+        key = Key(self.bucket)
+        key.key = "{}/partial/{}/{}".format(
+            self.root_path,
+            hashed_course_id.hexdigest(),
+            filename
+        )
+
+        return key
+
+    def _store_rows_in_key(self, key, rows):
+        """
+        Write `rows` as a gzip'd csv file, and upload it to `key`.
+
+        Rows are written to a temporary file as they are produced, so `rows`
+        can be a generator and memory use doesn't grow with the size of the
+        report. The S3 object only becomes visible once the whole upload
+        succeeds.
+        """
+        with tempfile.TemporaryFile() as output_file:
+            gzip_file = GzipFile(fileobj=output_file, mode="wb")
+            csvwriter = csv.writer(gzip_file)
+            csvwriter.writerows(self._get_utf8_encoded_rows(rows))
+            gzip_file.close()
+
+            size = output_file.tell()
+            key.content_encoding = "gzip"
+            key.content_type = "text/csv"
+
+            key.set_contents_from_file(
+                output_file,
+                headers={
+                    "Content-Encoding": "gzip",
+                    "Content-Length": size,
+                    "Content-Type": "text/csv",
+                },
+                rewind=True,
+            )
+
     def store_rows(self, course_id, filename, rows):
         """
         Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        strings), write a gzip'd csv file, and then upload it.
+
+        `rows` can be a generator; see `_store_rows_in_key`.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csvwriter = csv.writer(gzip_file)
-        csvwriter.writerows(self._get_utf8_encoded_rows(rows))
-        gzip_file.close()
+        self._store_rows_in_key(self.key_for(course_id, filename), rows)
+
+    def store_partial_rows(self, course_id, filename, rows):
+        """
+        Like `store_rows()`, but store the file as a partial report, which
+        isn't listed by `links_for()`.
+        """
+        self._store_rows_in_key(self.partial_key_for(course_id, filename), rows)
+
+    def iter_partial_rows(self, course_id, filename):
+        """
+        Yield the rows of a partial report stored with `store_partial_rows()`,
+        as lists of unicode strings. Yields nothing if there is no such report.
+        """
+        key = self.partial_key_for(course_id, filename)
+        if not key.exists():
+            return
+
+        with tempfile.TemporaryFile() as compressed_file:
+            key.get_contents_to_file(compressed_file)
+            compressed_file.seek(0)
+            for row in csv.reader(GzipFile(fileobj=compressed_file, mode="rb")):
+                yield [cell.decode('utf-8') for cell in row]
 
-        self.store(course_id, filename, output_buffer)
+    def delete_partial(self, course_id, filename):
+        """
+        Delete a partial report stored with `store_partial_rows()`, if it exists.
+        """
+        self.bucket.delete_key(self.partial_key_for(course_id, filename).key)
+
+    def partial_names(self, course_id, prefix):
+        """
+        Return the filenames of the partial reports stored with
+        `store_partial_rows()` whose names start with `prefix`.
+        """
+        return [
+            key.key.split("/")[-1]
+            for key in self.bucket.list(prefix=self.partial_key_for(course_id, prefix).key)
+        ]
 
     def links_for(self, course_id):
         """
@@ -378,10 +461,7 @@ class LocalFSReportStore(ReportStore):
         assumed to be a StringIO objecd (or anything that can flush its contents
         to string using `.getvalue()`).
         """
-        full_path = self.path_to(course_id, filename)
-        directory = os.path.dirname(full_path)
-        if not os.path.exists(directory):
-            os.mkdir(directory)
+        full_path = self._prepare_path(self.path_to(course_id, filename))
 
         with open(full_path, "wb") as f:
             f.write(buff.getvalue())
@@ -390,12 +470,86 @@ class LocalFSReportStore(ReportStore):
         """
         Given a course_id, filename, and rows (each row is an iterable of strings),
         write this data out.
+
+        `rows` can be a generator; see `_store_rows_at`.
+        """
+        self._store_rows_at(self._prepare_path(self.path_to(course_id, filename)), rows)
+
+    def partial_path_to(self, course_id, filename):
+        """Return the full path to a given partial report file for a given
+        course. Partial reports are kept outside of the course's directory, so
+        that `links_for()` doesn't list them."""
+        return os.path.join(
+            self.root_path, '.partial', urllib.quote(course_id.to_deprecated_string(), safe=''), filename
+        )
+
+    def store_partial_rows(self, course_id, filename, rows):
+        """
+        Like `store_rows()`, but store the file as a partial report, which
+        isn't listed by `links_for()`.
         """
-        output_buffer = StringIO()
-        csvwriter = csv.writer(output_buffer)
-        csvwriter.writerows(self._get_utf8_encoded_rows(rows))
+        self._store_rows_at(self._prepare_path(self.partial_path_to(course_id, filename)), rows)
 
-        self.store(course_id, filename, output_buffer)
+    def iter_partial_rows(self, course_id, filename):
+        """
+        Yield the rows of a partial report stored with `store_partial_rows()`,
+        as lists of unicode strings. Yields nothing if there is no such report.
+        """
+        full_path = self.partial_path_to(course_id, filename)
+        if not os.path.exists(full_path):
+            return
+
+        with open(full_path, "rb") as partial_file:
+            for row in csv.reader(partial_file):
+                yield [cell.decode('utf-8') for cell in row]
+
+    def delete_partial(self, course_id, filename):
+        """
+        Delete a partial report stored with `store_partial_rows()`, if it exists.
+        """
+        full_path = self.partial_path_to(course_id, filename)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+
+    def partial_names(self, course_id, prefix):
+        """
+        Return the filenames of the partial reports stored with
+        `store_partial_rows()` whose names start with `prefix`.
+        """
+        partial_dir = self.partial_path_to(course_id, '')
+        if not os.path.isdir(partial_dir):
+            return []
+        return [filename for filename in os.listdir(partial_dir) if filename.startswith(prefix)]
+
+    def _store_rows_at(self, full_path, rows):
+        """
+        Write `rows` out as a csv file at `full_path`.
+
+        Rows are appended to a temporary file as they are produced, which is
+        renamed into place once it is complete, so `rows` can be a generator
+        and a partially written report is never visible.
+        """
+        # The temporary file lives directly under root_path, outside of any
+        # course directory, so that links_for() never lists it.
+        output_file = tempfile.NamedTemporaryFile(dir=self.root_path, suffix='.tmp', delete=False)
+        try:
+            with output_file:
+                csvwriter = csv.writer(output_file)
+                csvwriter.writerows(self._get_utf8_encoded_rows(rows))
+            os.rename(output_file.name, full_path)
+        except Exception:
+            os.remove(output_file.name)
+            raise
+
+    def _prepare_path(self, full_path):
+        """
+        Create the directory that will contain `full_path` if necessary, and
+        return `full_path`.
+        """
+        directory = os.path.dirname(full_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        return full_path
 
     def links_for(self, course_id):
         """
@@ -31,7 +31,10 @@ from instructor_task.tasks_helper import (
     reset_attempts_module_state,
     delete_problem_module_state,
     upload_grades_csv,
+    queue_grades_csv_subtasks,
+    upload_grades_csv_partial,
     upload_students_csv,
+    upload_answer_distribution_csv,
     cohort_students_and_upload
 )
 from bulk_email.tasks import perform_delegate_email_batches
@@ -137,13 +140,43 @@ def send_bulk_course_email(entry_id, _xmodule_instance_args):
 def calculate_grades_csv(entry_id, xmodule_instance_args):
     """
     Grade a course and push the results to an S3 bucket for download.
+
+    If settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK is set, the students are
+    graded in parallel by `calculate_grades_csv_partial` subtasks.
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('graded')
-    task_fn = partial(upload_grades_csv, xmodule_instance_args)
+    if settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK:
+        task_fn = partial(queue_grades_csv_subtasks, _create_grades_csv_subtask)
+    else:
+        task_fn = partial(upload_grades_csv, xmodule_instance_args)
     return run_main_task(entry_id, task_fn, action_name)
 
 
+def _create_grades_csv_subtask(entry_id, student_list, initial_subtask_status):
+    """Creates a subtask to grade the range of students in `student_list`."""
+    return calculate_grades_csv_partial.subtask(
+        (
+            entry_id,
+            student_list[0]['pk'],
+            student_list[-1]['pk'],
+            initial_subtask_status.to_dict(),
+        ),
+        task_id=initial_subtask_status.task_id,
+        routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+    )
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=not-callable
+def calculate_grades_csv_partial(entry_id, first_student_id, last_student_id, subtask_status_dict):
+    """
+    Grade the enrolled students with ids from `first_student_id` to
+    `last_student_id` as part of a grade report, storing a partial report.
+    The last of these subtasks to finish combines the partial reports.
+    """
+    return upload_grades_csv_partial(entry_id, first_student_id, last_student_id, subtask_status_dict)
+
+
 @task(base=BaseInstructorTask, routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=not-callable
 def calculate_students_features_csv(entry_id, xmodule_instance_args):
     """
@@ -156,6 +189,18 @@ def calculate_students_features_csv(entry_id, xmodule_instance_args):
     return run_main_task(entry_id, task_fn, action_name)
 
 
+@task(base=BaseInstructorTask)  # pylint: disable=E1102
+def calculate_answer_distribution_csv(entry_id, xmodule_instance_args):
+    """
+    Compute the distribution of answers to each problem in a course and
+    upload the CSV for download.
+    """
+    # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
+    action_name = ugettext_noop('generated')
+    task_fn = partial(upload_answer_distribution_csv, xmodule_instance_args)
+    return run_main_task(entry_id, task_fn, action_name)
+
+
 @task(base=BaseInstructorTask)  # pylint: disable=E1102
 def cohort_students(entry_id, xmodule_instance_args):
     """
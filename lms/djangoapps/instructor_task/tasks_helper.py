@@ -6,13 +6,17 @@ running state of a course.
 import json
 import urllib
 from datetime import datetime
+from functools import partial
+from itertools import chain
 from time import time
 import unicodecsv
 
 from celery import Task, current_task
 from celery.utils.log import get_task_logger
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.files.storage import DefaultStorage
 from django.db import transaction, reset_queries
 import dogstats_wrapper as dog_stats_api
@@ -24,13 +28,19 @@ from xmodule.modulestore.django import modulestore
 
 from openedx.core.djangoapps.course_groups.models import CourseUserGroup
 from openedx.core.djangoapps.course_groups.cohorts import add_user_to_cohort
-from courseware.grades import iterate_grades_for
+from courseware.grade_summary_cache import invalidate_grade_summary
+from courseware.grades import answer_distributions, iterate_grades_for
 from courseware.models import StudentModule
 from courseware.model_data import FieldDataCache
 from courseware.module_render import get_module_for_descriptor_internal
-from instructor_analytics.basic import enrolled_students_features
-from instructor_analytics.csvs import format_dictlist
+from instructor_analytics.basic import iter_enrolled_students_features
 from instructor_task.models import ReportStore, InstructorTask, PROGRESS
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    check_subtask_is_valid,
+    queue_subtasks_for_query,
+    update_subtask_status,
+)
 from student.models import CourseEnrollment
 
 # define different loggers for use within tasks and on client side
@@ -44,6 +54,10 @@ UPDATE_STATUS_SUCCEEDED = 'succeeded'
 UPDATE_STATUS_FAILED = 'failed'
 UPDATE_STATUS_SKIPPED = 'skipped'
 
+# The lock that makes sure only one subtask merges a sharded grade report
+# should outlast any merge.
+GRADE_REPORT_MERGE_LOCK_EXPIRE = 60 * 60  # Lock expires in an hour
+
 
 class BaseInstructorTask(Task):
     """
@@ -445,6 +459,7 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
 
     result = instance.rescore_problem()
     instance.save()
+    invalidate_grade_summary(course_id, student.id)
     if 'success' not in result:
         # don't consider these fatal, but false means that the individual call didn't complete:
         TASK_LOG.warning(u"error processing rescore call for course {course}, problem {loc} and student {student}: "
@@ -495,6 +510,7 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
     Always returns UPDATE_STATUS_SUCCEEDED, indicating success, if it doesn't raise an exception due to database error.
     """
     student_module.delete()
+    invalidate_grade_summary(student_module.course_id, student_module.student_id)
     # get request-related tracking information from args passthrough,
     # and supplement with task-specific information:
     track_function = _get_track_function_for_task(student_module.student, xmodule_instance_args)
@@ -513,6 +529,8 @@ def upload_csv_to_report_store(rows, csv_name, course_id, timestamp):
                 [row1_colum1, row1_colum2, ...],
                 ...
             ]
+            This may be any iterable of rows, such as a generator; rows
+            are written out as they are produced.
         csv_name: Name of the resulting CSV
         course_id: ID of the course
     """
@@ -528,31 +546,18 @@ def upload_csv_to_report_store(rows, csv_name, course_id, timestamp):
     )
 
 
-def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
+def _grade_report_rows(course_id, students, task_progress, err_rows):
     """
-    For a given `course_id`, generate a grades CSV file for all students that
-    are enrolled, and store using a `ReportStore`. Once created, the files can
-    be accessed by instantiating another `ReportStore` (via
-    `ReportStore.from_config()`) and calling `link_for()` on it. Writes are
-    buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
-    that are visible in ReportStore will be complete ones.
+    Grade each of `students`, yielding their grade report CSV row as it's
+    computed. The header row is yielded just before the first student's row.
 
-    As we start to add more CSV downloads, it will probably be worthwhile to
-    make a more general CSVDoc class instead of building out the rows like we
-    do here.
+    Progress is recorded in `task_progress`, and a row is appended to
+    `err_rows` for each student that couldn't be graded.
     """
-    start_time = time()
-    start_date = datetime.now(UTC)
     status_interval = 100
-    enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
-    task_progress = TaskProgress(action_name, enrolled_students.count(), start_time)
-
-    # Loop over all our students and build our CSV lists in memory
-    header = None
-    rows = []
-    err_rows = [["id", "username", "error_msg"]]
     current_step = {'step': 'Calculating Grades'}
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
+    header = None
+    for student, gradeset, err_msg in iterate_grades_for(course_id, students):
         # Periodically update task status (this is a cache write)
         if task_progress.attempted % status_interval == 0:
             task_progress.update_task_state(extra_meta=current_step)
@@ -564,7 +569,7 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
             if not header:
                 # Encode the header row in utf-8 encoding in case there are unicode characters
                 header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
-                rows.append(["id", "email", "username", "grade"] + header)
+                yield ["id", "email", "username", "grade"] + header
 
             percents = {
                 section['label']: section.get('percent', 0.0)
@@ -579,19 +584,43 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
             # possible for a student to have a 0.0 show up in their row but
             # still have 100% for the course.
             row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
+            yield [student.id, student.email, student.username, gradeset['percent']] + row_percents
         else:
             # An empty gradeset means we failed to grade a student.
             task_progress.failed += 1
             err_rows.append([student.id, student.username, err_msg])
 
-    # By this point, we've got the rows we're going to stuff into our CSV files.
+
+def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
+    """
+    For a given `course_id`, generate a grades CSV file for all students that
+    are enrolled, and store using a `ReportStore`. Once created, the files can
+    be accessed by instantiating another `ReportStore` (via
+    `ReportStore.from_config()`) and calling `link_for()` on it. Rows are
+    streamed to the `ReportStore` as students are graded, but it only makes
+    a file visible once it has been completely written -- i.e. any files
+    that are visible in ReportStore will be complete ones.
+    """
+    start_time = time()
+    start_date = datetime.now(UTC)
+    enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
+    task_progress = TaskProgress(action_name, enrolled_students.count(), start_time)
+
+    # Students that couldn't be graded are collected separately; there are
+    # normally few enough of them to keep in memory.
+    err_rows = [["id", "username", "error_msg"]]
+
+    # Grade students and write their rows out as we go.
+    upload_csv_to_report_store(
+        _grade_report_rows(course_id, enrolled_students, task_progress, err_rows),
+        'grade_report',
+        course_id,
+        start_date
+    )
+
     current_step = {'step': 'Uploading CSVs'}
     task_progress.update_task_state(extra_meta=current_step)
 
-    # Perform the actual upload
-    upload_csv_to_report_store(rows, 'grade_report', course_id, start_date)
-
     # If there are any error rows (don't count the header), write them out as well
     if len(err_rows) > 1:
         upload_csv_to_report_store(err_rows, 'grade_report_err', course_id, start_date)
@@ -600,6 +629,212 @@ def upload_grades_csv(_xmodule_instance_args, _entry_id, course_id, _task_input,
     return task_progress.update_task_state(extra_meta=current_step)
 
 
+def queue_grades_csv_subtasks(create_subtask_fcn, entry_id, course_id, task_input, action_name):
+    """
+    For a given `course_id`, split the enrolled students into ranges of
+    student ids of no more than settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK
+    students, and queue a subtask to grade each range.
+
+    `create_subtask_fcn` takes the `entry_id`, the list of student dicts for
+    the subtask (ordered by 'pk'), and its initial SubtaskStatus, and returns
+    the subtask to run. Each subtask stores a partial report, and the subtask
+    that finishes last combines them into the final report (see
+    `upload_grades_csv_partial`).
+
+    Courses small enough to need only one subtask are graded directly by
+    `upload_grades_csv`.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+
+    # As in bulk email, if subtasks have already been defined then this task
+    # has been requeued, and there's no need to queue them again.
+    if len(entry.subtasks) > 0 and len(entry.task_output) > 0:
+        TASK_LOG.warning(u"Task %s has already queued its grade report subtasks", entry.task_id)
+        return json.loads(entry.task_output)
+
+    students_per_task = settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK
+    enrolled_students = CourseEnrollment.users_enrolled_in(course_id).order_by('pk')
+    if enrolled_students.count() <= students_per_task:
+        return upload_grades_csv(None, entry_id, course_id, task_input, action_name)
+
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        partial(create_subtask_fcn, entry_id),
+        enrolled_students,
+        [],
+        students_per_task,
+    )
+
+
+def _partial_report_prefix(report_name, entry_id):
+    """
+    Return the start of the filenames of the partial reports named
+    `report_name` that are stored by the subtasks of InstructorTask `entry_id`.
+    """
+    return u"{report_name}_{entry_id}_".format(report_name=report_name, entry_id=entry_id)
+
+
+def _partial_report_name(report_name, entry_id, first_student_id):
+    """
+    Return the filename of the partial report named `report_name` that is
+    stored by the subtask of InstructorTask `entry_id` whose students' ids
+    start at `first_student_id`.
+    """
+    return u"{prefix}{first_student_id}.csv".format(
+        prefix=_partial_report_prefix(report_name, entry_id), first_student_id=first_student_id
+    )
+
+
+def _sorted_partial_names(report_store, course_id, report_name, entry_id):
+    """
+    Return the filenames of the partial reports named `report_name` that the
+    subtasks of InstructorTask `entry_id` have stored, in the order of their
+    students' ids.
+    """
+    prefix = _partial_report_prefix(report_name, entry_id)
+    return sorted(
+        report_store.partial_names(course_id, prefix),
+        key=lambda partial_name: int(partial_name[len(prefix):-len('.csv')])
+    )
+
+
+def upload_grades_csv_partial(entry_id, first_student_id, last_student_id, subtask_status_dict):
+    """
+    Grade the students enrolled in the course of the InstructorTask `entry_id`
+    whose ids are between `first_student_id` and `last_student_id` (inclusive),
+    and store their rows as partial reports.
+
+    Progress is recorded in the parent InstructorTask as for bulk email
+    subtasks. Once every subtask has finished, the last one combines the
+    partial reports into the final grade report.
+
+    Returns the subtask's status, as a dict.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+
+    # Make sure this subtask is known to the InstructorTask and hasn't
+    # already been run, as in bulk email's send_course_email.
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    entry = InstructorTask.objects.get(pk=entry_id)
+    course_id = entry.course_id
+    students = CourseEnrollment.users_enrolled_in(course_id).filter(
+        pk__gte=first_student_id,
+        pk__lte=last_student_id,
+    ).order_by('pk')
+    action_name = json.loads(entry.task_output)['action_name']
+    task_progress = TaskProgress(action_name, students.count(), time())
+    err_rows = [["id", "username", "error_msg"]]
+
+    report_store = ReportStore.from_config()
+    try:
+        with dog_stats_api.timer('instructor_tasks.grade_report.subtask.time'):
+            report_store.store_partial_rows(
+                course_id,
+                _partial_report_name('grade_report', entry_id, first_student_id),
+                _grade_report_rows(course_id, students, task_progress, err_rows),
+            )
+            if len(err_rows) > 1:
+                report_store.store_partial_rows(
+                    course_id, _partial_report_name('grade_report_err', entry_id, first_student_id), err_rows
+                )
+    except Exception:
+        TASK_LOG.exception(u"Grade report subtask %s for instructor task %d failed unexpectedly!", current_task_id, entry_id)
+        # We don't know how many of the students' rows were stored, so count
+        # all of them as having failed.
+        subtask_status.increment(failed=task_progress.total, state=FAILURE)
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        _merge_grades_csv_partials_if_complete(entry_id)
+        raise
+
+    subtask_status.increment(succeeded=task_progress.succeeded, failed=task_progress.failed, state=SUCCESS)
+    update_subtask_status(entry_id, current_task_id, subtask_status)
+    _merge_grades_csv_partials_if_complete(entry_id)
+    return subtask_status.to_dict()
+
+
+def _merged_partial_rows(report_store, course_id, partial_names):
+    """
+    Yield the rows of each of the partial reports `partial_names` in turn.
+    Every partial report starts with the same header row, which is only
+    yielded once.
+    """
+    header_yielded = False
+    for partial_name in partial_names:
+        rows = report_store.iter_partial_rows(course_id, partial_name)
+        header = next(rows, None)
+        if header is None:
+            continue
+        if not header_yielded:
+            yield header
+            header_yielded = True
+        for row in rows:
+            yield row
+
+
+def _merge_grades_csv_partials_if_complete(entry_id):
+    """
+    If every grade report subtask of InstructorTask `entry_id` has finished,
+    combine their partial reports into the final grade report (and error
+    report, if any students couldn't be graded), then delete the partials.
+
+    Only one subtask performs the merge, even if several see the
+    InstructorTask complete at once. Nothing retries a merge that fails, so
+    the partials are deleted whether or not it succeeds.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    if entry.task_state != SUCCESS:
+        return
+
+    lock_key = "grade-report-merge-{}".format(entry_id)
+    merged_key = "grade-report-merged-{}".format(entry_id)
+    # cache.add fails if the key already exists
+    if not cache.add(lock_key, 'true', GRADE_REPORT_MERGE_LOCK_EXPIRE):
+        return
+
+    course_id = entry.course_id
+    report_store = ReportStore.from_config()
+    partial_names = {}
+
+    try:
+        # another subtask may have merged the partials before this one took the lock
+        if cache.get(merged_key):
+            return
+
+        # Each subtask graded a range of students, so combining the partials in
+        # order of their ranges keeps the rows in the order of students' ids
+        for report_name in ('grade_report', 'grade_report_err'):
+            partial_names[report_name] = _sorted_partial_names(report_store, course_id, report_name, entry_id)
+
+        with dog_stats_api.timer('instructor_tasks.grade_report.merge.time'):
+            for report_name in ('grade_report', 'grade_report_err'):
+                rows = _merged_partial_rows(report_store, course_id, partial_names[report_name])
+
+                # The error report is only written if there were any errors, but
+                # the grade report is always written.
+                first_row = next(rows, None)
+                if first_row is not None:
+                    upload_csv_to_report_store(chain([first_row], rows), report_name, course_id, entry.created)
+                elif report_name == 'grade_report':
+                    upload_csv_to_report_store([], report_name, course_id, entry.created)
+    except Exception:
+        TASK_LOG.exception(u"Merging the grade report of instructor task %d failed unexpectedly!", entry_id)
+        raise
+    finally:
+        # Once the partials are gone, merging them again would only write an empty report
+        cache.set(merged_key, 'true', GRADE_REPORT_MERGE_LOCK_EXPIRE)
+        cache.delete(lock_key)
+        for partial_name in chain.from_iterable(partial_names.itervalues()):
+            try:
+                report_store.delete_partial(course_id, partial_name)
+            except Exception:  # pylint: disable=broad-except
+                TASK_LOG.exception(
+                    u"Couldn't delete partial grade report %s of instructor task %d", partial_name, entry_id
+                )
+
+
 def upload_students_csv(_xmodule_instance_args, _entry_id, course_id, task_input, action_name):
     """
     For a given `course_id`, generate a CSV file containing profile
@@ -612,22 +847,58 @@ def upload_students_csv(_xmodule_instance_args, _entry_id, course_id, task_input
     current_step = {'step': 'Calculating Profile Info'}
     task_progress.update_task_state(extra_meta=current_step)
 
-    # compute the student features table and format it
     query_features = task_input.get('features')
-    student_data = enrolled_students_features(course_id, query_features)
-    header, rows = format_dictlist(student_data, query_features)
 
-    task_progress.attempted = task_progress.succeeded = len(rows)
-    task_progress.skipped = task_progress.total - task_progress.attempted
+    def profile_rows():
+        """
+        Yield the header row, then one row of profile information for each
+        enrolled student as it's read from the database.
+        """
+        yield query_features
+        for student_dict in iter_enrolled_students_features(course_id, query_features):
+            task_progress.attempted += 1
+            task_progress.succeeded += 1
+            yield [student_dict[feature] for feature in query_features if feature in student_dict]
+
+    # Compute the student features table, writing it out as we go
+    upload_csv_to_report_store(profile_rows(), 'student_profile_info', course_id, start_date)
 
-    rows.insert(0, header)
+    task_progress.skipped = task_progress.total - task_progress.attempted
 
     current_step = {'step': 'Uploading CSV'}
+    return task_progress.update_task_state(extra_meta=current_step)
+
+
+def upload_answer_distribution_csv(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
+    """
+    For a given `course_id`, generate a CSV file containing the number of
+    times each answer was given to each submitted problem part, and store
+    using a `ReportStore`.
+    """
+    start_time = time()
+    start_date = datetime.now(UTC)
+    task_progress = TaskProgress(action_name, 1, start_time)
+    current_step = {'step': 'Calculating Answer Distribution'}
     task_progress.update_task_state(extra_meta=current_step)
 
-    # Perform the upload
-    upload_csv_to_report_store(rows, 'student_profile_info', course_id, start_date)
+    timer_tags = [u'course_id:{}'.format(course_id)]
+    with dog_stats_api.timer('instructor_task.answer_distribution.time.overall', tags=timer_tags):
+        distribution = answer_distributions(course_id)
+
+    def distribution_rows():
+        """
+        Yield the header row, then one row for each answer to each problem part.
+        """
+        yield ['url_name', 'display name', 'answer id', 'answer', 'count']
+        for (url_name, display_name, answer_id), answers in sorted(distribution.items()):
+            for answer, count in sorted(answers.items()):
+                yield [url_name, display_name, answer_id, answer, count]
+
+    current_step = {'step': 'Uploading CSV'}
+    task_progress.update_task_state(extra_meta=current_step)
+    upload_csv_to_report_store(distribution_rows(), 'answer_distribution', course_id, start_date)
 
+    task_progress.attempted = task_progress.succeeded = 1
     return task_progress.update_task_state(extra_meta=current_step)
 
 
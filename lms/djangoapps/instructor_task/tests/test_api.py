@@ -14,6 +14,7 @@ from instructor_task.api import (
     submit_delete_problem_state_for_all_students,
     submit_bulk_course_email,
     submit_calculate_students_features_csv,
+    submit_calculate_answer_distribution_csv,
     submit_cohort_students,
 )
 
@@ -203,6 +204,13 @@ class InstructorTaskCourseSubmitTest(TestReportMixin, InstructorTaskCourseTestCa
         )
         self._test_resubmission(api_call)
 
+    def test_submit_calculate_answer_distribution(self):
+        api_call = lambda: submit_calculate_answer_distribution_csv(
+            self.create_task_request(self.instructor),
+            self.course.id
+        )
+        self._test_resubmission(api_call)
+
     def test_submit_cohort_students(self):
         api_call = lambda: submit_cohort_students(
             self.create_task_request(self.instructor),
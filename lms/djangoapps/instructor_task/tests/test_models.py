@@ -4,6 +4,7 @@ Tests for instructor_task/models.py.
 
 from cStringIO import StringIO
 import mock
+import os
 import time
 from datetime import datetime
 from unittest import TestCase
@@ -25,6 +26,10 @@ class MockKey(object):
         """ Expected method on a Key object. """
         self.bucket.store_key(self)
 
+    def set_contents_from_file(self, fp, headers, rewind):  # pylint: disable=unused-argument
+        """ Expected method on a Key object. """
+        self.bucket.store_key(self)
+
     def generate_url(self, expires_in):  # pylint: disable=unused-argument
         """ Expected method on a Key object. """
         return "http://fake-edx-s3.edx.org/"
@@ -84,6 +89,16 @@ class ReportStoreTestMixin(object):
             ['new_file', 'middle_file', 'old_file']
         )
 
+    def test_store_rows_from_generator(self):
+        """
+        Test that ReportStore.store_rows() accepts rows from a generator.
+        """
+        report_store = self.create_report_store()
+        rows = ([u'row{}'.format(i), i] for i in xrange(1000))
+        report_store.store_rows(self.course_id, 'report.csv', rows)
+
+        self.assertEqual([link[0] for link in report_store.links_for(self.course_id)], ['report.csv'])
+
 
 class LocalFSReportStoreTestCase(ReportStoreTestMixin, TestReportMixin, TestCase):
     """
@@ -93,6 +108,51 @@ class LocalFSReportStoreTestCase(ReportStoreTestMixin, TestReportMixin, TestCase
         """ Create and return a LocalFSReportStore. """
         return LocalFSReportStore.from_config()
 
+    def test_store_rows_contents(self):
+        """
+        Test that store_rows() writes every row, and leaves no temporary
+        files behind.
+        """
+        report_store = self.create_report_store()
+        report_store.store_rows(self.course_id, 'report.csv', ([u'row{}'.format(i), i] for i in xrange(3)))
+
+        with open(report_store.path_to(self.course_id, 'report.csv')) as report_file:
+            self.assertEqual(report_file.read(), 'row0,0\r\nrow1,1\r\nrow2,2\r\n')
+        self.assertFalse([name for name in os.listdir(report_store.root_path) if name.endswith('.tmp')])
+
+    def test_partial_rows(self):
+        """
+        Test that partial reports can be read back, aren't listed as
+        downloadable reports, and can be deleted.
+        """
+        report_store = self.create_report_store()
+        report_store.store_partial_rows(self.course_id, 'partial.csv', [[u'ni\xf1o', 1], [u'row1', 2]])
+
+        self.assertEqual(report_store.links_for(self.course_id), [])
+        self.assertEqual(
+            list(report_store.iter_partial_rows(self.course_id, 'partial.csv')),
+            [[u'ni\xf1o', u'1'], [u'row1', u'2']]
+        )
+
+        report_store.delete_partial(self.course_id, 'partial.csv')
+        self.assertEqual(list(report_store.iter_partial_rows(self.course_id, 'partial.csv')), [])
+
+    def test_store_rows_failure(self):
+        """
+        Test that a report isn't made visible if producing its rows fails.
+        """
+        def failing_rows():
+            """ Yield a row, then fail. """
+            yield ['row0', 0]
+            raise ValueError()
+
+        report_store = self.create_report_store()
+        with self.assertRaises(ValueError):
+            report_store.store_rows(self.course_id, 'report.csv', failing_rows())
+
+        self.assertEqual(report_store.links_for(self.course_id), [])
+        self.assertFalse([name for name in os.listdir(report_store.root_path) if name.endswith('.tmp')])
+
 
 @mock.patch('instructor_task.models.S3Connection', new=MockS3Connection)
 @mock.patch('instructor_task.models.Key', new=MockKey)
@@ -5,14 +5,32 @@ Tests that CSV grade report generation works with unicode emails.
 
 """
 import ddt
+from functools import partial
+import json
 from mock import Mock, patch
 import tempfile
+import unicodecsv
+from uuid import uuid4
+
+from celery.states import SUCCESS
+from django.core.cache import cache
+from django.test.utils import override_settings
 
 from xmodule.modulestore.tests.factories import CourseFactory
 
 from openedx.core.djangoapps.course_groups.tests.helpers import CohortFactory
-from instructor_task.models import ReportStore
-from instructor_task.tasks_helper import cohort_students_and_upload, upload_grades_csv, upload_students_csv
+from instructor_task.models import InstructorTask, ReportStore
+from instructor_task.tasks_helper import (
+    _merge_grades_csv_partials_if_complete,
+    _partial_report_name,
+    cohort_students_and_upload,
+    queue_grades_csv_subtasks,
+    upload_answer_distribution_csv,
+    upload_grades_csv,
+    upload_grades_csv_partial,
+    upload_students_csv,
+)
+from instructor_task.tests.factories import InstructorTaskFactory
 from instructor_task.tests.test_base import InstructorTaskCourseTestCase, TestReportMixin
 
 
@@ -57,6 +75,104 @@ class TestInstructorGradeReport(TestReportMixin, InstructorTaskCourseTestCase):
         report_store = ReportStore.from_config()
         self.assertTrue(any('grade_report_err' in item[0] for item in report_store.links_for(self.course.id)))
 
+    @override_settings(GRADES_DOWNLOAD_STUDENTS_PER_TASK=2)
+    @patch('instructor_task.tasks_helper._get_current_task')
+    def test_grade_report_subtasks(self, _mock_current_task):
+        """
+        Test that a grade report split across subtasks is merged into a
+        single report containing every student.
+        """
+        usernames = set('student{0}'.format(i) for i in xrange(5))
+        for username in usernames:
+            self.create_student(username, '{0}@example.com'.format(username))
+        entry = InstructorTaskFactory.create(course_id=self.course.id, task_id=str(uuid4()), task_type='grade_course')
+        self.addCleanup(cache.delete, "grade-report-merged-{}".format(entry.id))
+
+        def create_subtask(entry_id, student_list, initial_subtask_status):
+            """Creates a fake subtask that grades its students as soon as it is queued."""
+            return Mock(apply_async=partial(
+                upload_grades_csv_partial,
+                entry_id,
+                student_list[0]['pk'],
+                student_list[-1]['pk'],
+                initial_subtask_status.to_dict(),
+            ))
+
+        queue_grades_csv_subtasks(create_subtask, entry.id, self.course.id, {}, 'graded')
+
+        entry = InstructorTask.objects.get(pk=entry.id)
+        self.assertEqual(json.loads(entry.subtasks)['total'], 3)
+        self.assertDictContainsSubset({'attempted': 5, 'succeeded': 5, 'failed': 0}, json.loads(entry.task_output))
+
+        report_store = ReportStore.from_config()
+        links = report_store.links_for(self.course.id)
+        self.assertEqual(len(links), 1)
+        with open(report_store.path_to(self.course.id, links[0][0])) as csv_file:
+            self.assertEqual(set(row['username'] for row in unicodecsv.DictReader(csv_file)), usernames)
+
+    @override_settings(GRADES_DOWNLOAD_STUDENTS_PER_TASK=2)
+    @patch('instructor_task.tasks_helper._get_current_task')
+    def test_grade_report_subtasks_order(self, _mock_current_task):
+        """
+        Test that the rows of a grade report split across subtasks are in
+        order of the students' ids, whatever order the subtasks ran in.
+        """
+        student_ids = [
+            self.create_student('student{0}'.format(i), 'student{0}@example.com'.format(i)).id
+            for i in xrange(5)
+        ]
+        entry = InstructorTaskFactory.create(course_id=self.course.id, task_id=str(uuid4()), task_type='grade_course')
+        self.addCleanup(cache.delete, "grade-report-merged-{}".format(entry.id))
+        subtasks = []
+
+        def create_subtask(entry_id, student_list, initial_subtask_status):
+            """Creates a fake subtask that is only run once every subtask has been queued."""
+            subtask = partial(
+                upload_grades_csv_partial,
+                entry_id,
+                student_list[0]['pk'],
+                student_list[-1]['pk'],
+                initial_subtask_status.to_dict(),
+            )
+            return Mock(apply_async=partial(subtasks.append, subtask))
+
+        queue_grades_csv_subtasks(create_subtask, entry.id, self.course.id, {}, 'graded')
+        self.assertEqual(len(subtasks), 3)
+        for subtask in reversed(subtasks):
+            subtask()
+
+        report_store = ReportStore.from_config()
+        links = report_store.links_for(self.course.id)
+        self.assertEqual(len(links), 1)
+        with open(report_store.path_to(self.course.id, links[0][0])) as csv_file:
+            self.assertEqual([int(row['id']) for row in unicodecsv.DictReader(csv_file)], student_ids)
+
+    @patch('instructor_task.tasks_helper.upload_csv_to_report_store', Mock(side_effect=IOError))
+    def test_grade_report_merge_failure(self):
+        """
+        Test that a failed merge of a grade report's partial reports releases
+        its lock and deletes the partials.
+        """
+        entry = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_type='grade_course',
+            task_state=SUCCESS,
+            subtasks=json.dumps({'status': {'subtask': {}}}),
+        )
+        # ids are reused between tests, so don't leave this entry's merge marked as done
+        self.addCleanup(cache.delete, "grade-report-merged-{}".format(entry.id))
+        report_store = ReportStore.from_config()
+        partial_name = _partial_report_name('grade_report', entry.id, 1)
+        report_store.store_partial_rows(self.course.id, partial_name, [['id', 'username'], [1, 'student']])
+
+        with self.assertRaises(IOError):
+            _merge_grades_csv_partials_if_complete(entry.id)
+
+        self.assertTrue(cache.add("grade-report-merge-{}".format(entry.id), 'true'))
+        cache.delete("grade-report-merge-{}".format(entry.id))
+        self.assertEqual(list(report_store.iter_partial_rows(self.course.id, partial_name)), [])
+
 
 @ddt.ddt
 class TestStudentReport(TestReportMixin, InstructorTaskCourseTestCase):
@@ -103,6 +219,36 @@ class TestStudentReport(TestReportMixin, InstructorTaskCourseTestCase):
         self.assertDictContainsSubset({'attempted': num_students, 'succeeded': num_students, 'failed': 0}, result)
 
 
+class TestAnswerDistributionReport(TestReportMixin, InstructorTaskCourseTestCase):
+    """
+    Tests that CSV answer distribution report generation works.
+    """
+    def setUp(self):
+        self.course = CourseFactory.create()
+
+    @patch('instructor_task.tasks_helper._get_current_task')
+    @patch('instructor_task.tasks_helper.answer_distributions')
+    def test_success(self, mock_answer_distributions, _mock_current_task):
+        mock_answer_distributions.return_value = {
+            ('p1', u'Problem \xf1', 'i4x-org-course-problem-p1_2_1'): {u'Correct': 3, u'Wr\xf6ng': 1},
+        }
+        result = upload_answer_distribution_csv(None, None, self.course.id, {}, 'generated')
+        self.assertDictContainsSubset({'attempted': 1, 'succeeded': 1, 'failed': 0}, result)
+
+        report_store = ReportStore.from_config()
+        report_csv_filename = report_store.links_for(self.course.id)[0][0]
+        with open(report_store.path_to(self.course.id, report_csv_filename)) as csv_file:
+            rows = list(unicodecsv.reader(csv_file, encoding='utf-8'))
+        self.assertEqual(
+            rows,
+            [
+                [u'url_name', u'display name', u'answer id', u'answer', u'count'],
+                [u'p1', u'Problem \xf1', u'i4x-org-course-problem-p1_2_1', u'Correct', u'3'],
+                [u'p1', u'Problem \xf1', u'i4x-org-course-problem-p1_2_1', u'Wr\xf6ng', u'1'],
+            ]
+        )
+
+
 class MockDefaultStorage(object):
     """Mock django's DefaultStorage"""
     def __init__(self):
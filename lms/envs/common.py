@@ -304,6 +304,18 @@ FEATURES = {
 
     # Separate the verification flow from the payment flow
     'SEPARATE_VERIFICATION_FROM_PAYMENT': False,
+
+    # Cache each student's course grade summary, so that the progress page and
+    # certificate checks don't regrade the whole course on every request
+    'ENABLE_GRADE_SUMMARY_CACHE': False,
+
+    # Report the number of queries, rows and time that FieldDataCaches spend
+    # per request to datadog
+    'ENABLE_FIELD_DATA_CACHE_METRICS': False,
+
+    # Defer saving the student state that an XBlock handler changes until the
+    # handler returns, and then save each changed row once
+    'ENABLE_XBLOCK_HANDLER_WRITE_BEHIND': False,
 }
 
 # Ignore static asset files on import which match this pattern
@@ -315,6 +327,9 @@ DEFAULT_GROUPS = []
 # If this is true, random scores will be generated for the purpose of debugging the profile graphs
 GENERATE_PROFILE_SCORES = False
 
+# How long a cached grade summary is kept (see FEATURES['ENABLE_GRADE_SUMMARY_CACHE'])
+GRADE_SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24  # seconds
+
 # Used with XQueue
 XQUEUE_WAITTIME_BETWEEN_REQUESTS = 5  # seconds
 
@@ -581,6 +596,20 @@ XBLOCK_SELECT_FUNCTION = prefer_xmodules
 
 MODULESTORE_BRANCH = 'published-only'
 CONTENTSTORE = None
+
+# Local on-disk cache of assets too large for the Django cache, served by
+# contentserver.middleware.StaticContentServer. None disables it; otherwise a
+# dict like {'DIRECTORY': '/var/cache/edx/assets', 'MAX_SIZE': <bytes>}
+STATIC_CONTENT_DISK_CACHE = None
+
+# Cache-Control headers sent with course assets, for locked assets (which only
+# enrolled users may see) and unlocked ones. Responses also carry an ETag, so
+# clients can revalidate cheaply once these expire.
+STATIC_CONTENT_CACHE_CONTROL = {
+    'locked': 'private, no-cache',
+    'unlocked': 'public, max-age=300',
+}
+
 DOC_STORE_CONFIG = {
     'host': 'localhost',
     'db': 'xmodule',
@@ -653,6 +682,19 @@ CODE_JAIL = {
 #   ]
 COURSES_WITH_UNSAFE_CODE = []
 
+# How many results of sandboxed code to also keep in each process, in front of
+# the shared cache. 0 means only use the shared cache.
+SAFE_EXEC_LOCAL_CACHE_SIZE = 0
+
+# Run sandboxed code in a pool of warm sandboxes rather than starting a new one
+# each time, e.g.
+#
+#   SAFE_EXEC_SANDBOX_POOL = {
+#       'SIZE': 4,          # sandboxes per process
+#       'MAX_RUNS': 100,    # runs before a sandbox is replaced
+#   }
+SAFE_EXEC_SANDBOX_POOL = None
+
 ############################### DJANGO BUILT-INS ###############################
 # Change DEBUG/TEMPLATE_DEBUG in your environment settings files, not here
 DEBUG = False
@@ -956,6 +998,8 @@ MIDDLEWARE_CLASSES = (
     # Detects user-requested locale from 'accept-language' header in http request
     'django.middleware.locale.LocaleMiddleware',
 
+    # Must come before TransactionMiddleware, to act after it commits
+    'courseware.middleware.GradeSummaryInvalidationMiddleware',
     'django.middleware.transaction.TransactionMiddleware',
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
 
@@ -976,6 +1020,9 @@ MIDDLEWARE_CLASSES = (
     # to redirected unenrolled students to the course info page
     'courseware.middleware.RedirectUnenrolledMiddleware',
 
+    # Reports FieldDataCache query counts (see FEATURES['ENABLE_FIELD_DATA_CACHE_METRICS'])
+    'courseware.middleware.FieldDataCacheStatsMiddleware',
+
     'course_wiki.middleware.WikiAccessMiddleware',
 )
 
@@ -1594,6 +1641,10 @@ GRADES_DOWNLOAD = {
     'ROOT_PATH': '/tmp/edx-s3/grades',
 }
 
+# If set, grade reports are split into subtasks that each grade at most this
+# many students, so that large courses are graded in parallel.
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = None
+
 ######################## PROGRESS SUCCESS BUTTON ##############################
 # The following fields are available in the URL: {course_id} {student_id}
 PROGRESS_SUCCESS_BUTTON_URL = 'http://<domain>/<path>/{course_id}'